@@ -1,7 +1,14 @@
-import appdaemon.plugins.hass.hassapi as hass
+import importlib
 
+try:
+    ProfiledHass = importlib.import_module("utils.profiling").ProfiledHass
+    TimeWindows = importlib.import_module("utils.time_windows").TimeWindows
+except ModuleNotFoundError:
+    ProfiledHass = importlib.import_module("profiling").ProfiledHass
+    TimeWindows = importlib.import_module("time_windows").TimeWindows
 
-class BedroomLighting(hass.Hass):
+
+class BedroomLighting(ProfiledHass):
     """
     Bedroom lighting automations.
     """
@@ -9,6 +16,7 @@ class BedroomLighting(hass.Hass):
     bedroom_button_device_id: str
     bedroom_lamps: str
     bedroom_lights: str
+    windows: TimeWindows
 
     def initialize(self):
         """
@@ -16,12 +24,14 @@ class BedroomLighting(hass.Hass):
         """
 
         self.utils = self.get_app("utils")
+        self.zha_router = self.get_app("zha_router")
         self.bedroom_button_device_id = self.args["bedroom_button_device_id"]
         self.bedroom_lamps = self.args["bedroom_lamps"]
         self.bedroom_lights = self.args["bedroom_lights"]
+        self.windows = TimeWindows(self)
+        self.windows.add("late", "21:00:00", "00:00:00")
 
-        self.listen_event(self.on_bedside_button_click, "zha_event", device_id=self.bedroom_button_device_id,
-                          command="single")
+        self.zha_router.subscribe(self, self.on_bedside_button_click, self.bedroom_button_device_id, "single")
         self.listen_state(self.activate_night_lighting, self.bedroom_lights, old="on", new="off")
         self.listen_state(self.activate_night_lighting, self.bedroom_lamps, old="off", new="on")
 
@@ -52,4 +62,4 @@ class BedroomLighting(hass.Hass):
         Returns if it's late at night.
         """
 
-        return self.now_is_between("21:00:00", "23:59:59")
+        return self.windows.is_active("late")
@@ -1,7 +1,16 @@
-import appdaemon.plugins.hass.hassapi as hass
+import importlib
 
+try:
+    Person = importlib.import_module("utils.person").Person
+    PresenceChange = importlib.import_module("utils.presence").PresenceChange
+    ProfiledHass = importlib.import_module("utils.profiling").ProfiledHass
+except ModuleNotFoundError:
+    Person = importlib.import_module("person").Person
+    PresenceChange = importlib.import_module("presence").PresenceChange
+    ProfiledHass = importlib.import_module("profiling").ProfiledHass
 
-class Cameras(hass.Hass):
+
+class Cameras(ProfiledHass):
     """
     Camera automation depending on people being home or not.
     """
@@ -16,14 +25,16 @@ class Cameras(hass.Hass):
         Sets up the automation.
         """
 
+        self.notification_utils = self.get_app("notification_utils")
+        self.presence = self.get_app("presence")
         self.utils = self.get_app("utils")
         self.allison = self.args["allison"]
         self.cameras = self.args["cameras"]
         self.cameras_on = self.args["cameras_on"]
         self.owen = self.args["owen"]
 
-        self.listen_state(self.turn_off_cameras, self.allison, new="home")
-        self.listen_state(self.turn_off_cameras, self.owen, new="home")
+        self.presence.subscribe(self, self.turn_off_cameras, self.allison, new="home")
+        self.presence.subscribe(self, self.turn_off_cameras, self.owen, new="home")
         self.listen_state(self.turn_on_cameras, self.cameras_on, new="on")
 
     def turn_on_cameras(self, entity: str, attribute: str, old: str, new: str, kwargs):
@@ -31,17 +42,17 @@ class Cameras(hass.Hass):
         Turns on the cameras if nobody is home and the triggered is moving away.
         """
 
-        if self.anyone_home(person=True):
+        if self.presence.anyone_home():
             return
         
         self.turn_off_on_cameras(True)
 
-    def turn_off_cameras(self, entity: str, attribute: str, old: str, new: str, kwargs):
+    def turn_off_cameras(self, change: PresenceChange):
         """
         Turns off the cameras if someone is home.
         """
 
-        if not self.anyone_home(person=True):
+        if not change.anyone_home:
             return
 
         self.turn_off_on_cameras(False)
@@ -57,25 +68,15 @@ class Cameras(hass.Hass):
 
         camera_state_log_message = "on" if turn_on else "off"
 
-        cameras_updated = False
-        for camera in self.cameras:
-            cameras_updated = self.turn_off_on_camera(camera, turn_on) or cameras_updated
+        # Cameras already in the requested state are skipped by the batch.
+        with self.utils.batch() as batch:
+            for camera in self.cameras:
+                if turn_on:
+                    batch.turn_on(camera)
+                else:
+                    batch.turn_off(camera)
 
-        if cameras_updated:
+        if batch.dispatched:
             message = "Cameras turned {}.".format(camera_state_log_message)
             self.log(message)
-            self.notify(message, name="owen")
-
-    def turn_off_on_camera(self, entity: str, turn_on: bool) -> bool:
-        """
-        Turns off or on the camera, depending on input and current state.
-        """
-
-        if turn_on and not self.utils.is_entity_on(entity):
-            self.turn_on(entity)
-            return True
-        elif not turn_on and self.utils.is_entity_on(entity):
-            self.turn_off(entity)
-            return True
-        
-        return False
+            self.notification_utils.notify_users(message, Person.Owen)
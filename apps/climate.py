@@ -1,12 +1,24 @@
 import appdaemon.plugins.hass.hassapi as hass
-from datetime import time
+from datetime import datetime, time, timedelta
 from enum import Enum, auto
 import importlib
 
 try:
     Person = importlib.import_module("utils.person").Person
+    PresenceChange = importlib.import_module("utils.presence").PresenceChange
+    ProfiledHass = importlib.import_module("utils.profiling").ProfiledHass
+    RollingWindow = importlib.import_module("utils.rolling").RollingWindow
+    SetpointWriter = importlib.import_module("utils.setpoints").SetpointWriter
+    TimeWindows = importlib.import_module("utils.time_windows").TimeWindows
+    TimerRegistry = importlib.import_module("utils.timers").TimerRegistry
 except ModuleNotFoundError:
     Person = importlib.import_module("person").Person
+    PresenceChange = importlib.import_module("presence").PresenceChange
+    ProfiledHass = importlib.import_module("profiling").ProfiledHass
+    RollingWindow = importlib.import_module("rolling").RollingWindow
+    SetpointWriter = importlib.import_module("setpoints").SetpointWriter
+    TimeWindows = importlib.import_module("time_windows").TimeWindows
+    TimerRegistry = importlib.import_module("timers").TimerRegistry
 
 
 class ThermostatState(Enum):
@@ -65,7 +77,67 @@ class ClimateEntities:
         self.bedroom_temperature = hass_instance.args["bedroom_temperature"]
 
 
-class Climate(hass.Hass):
+class ClimateState:
+    """
+    Local, pre-parsed copy of the state of the climate entities. Kept up to date by state
+    listeners, so temperature decisions never need to read state from HASS. Who is home
+    comes from the presence app.
+    Example: day_temperature: 70 (from input_number.climate_day_temp = "70.0")
+    """
+
+    day_time: time = None
+    night_time: time = None
+    day_temperature: int = None
+    night_offset: int = None
+    away_minutes: int = None
+    away_offset: int = None
+    gone_offset: int = None
+    vacation_mode: bool = False
+    heat_mode: bool = False
+    set_temperature: int = None
+    current_temperature: float = None
+    thermostat_state: ThermostatState = ThermostatState.Home
+    zone_home: int = 0
+    zone_near_home: int = 0
+    notify_time: bool = False
+    notify_location: bool = False
+    bedroom_fan: bool = False
+    bedroom_temperature: float = None
+
+
+class RecoveryModel:
+    """
+    How fast the house heats (or cools) towards a new setpoint, in degrees per hour. Fit from
+    observed recoveries: the degrees the house had to move after a setpoint change over the hours
+    it took to get there. Each recovery updates a running mean over the last `window` recoveries,
+    so fitting is O(1) and the model follows the seasons.
+    Example: rate: 1.5 (heating from 66 to 70 takes about 2:40)
+    """
+
+    rate: float
+    samples: int
+
+    def __init__(self, rate: float = 2.0, samples: int = 0, window: int = 20) -> None:
+        self.rate = rate
+        self.samples = samples
+        self.window = window
+
+    def add(self, degrees: float, hours: float) -> None:
+        self.samples += 1
+        self.rate += (degrees / hours - self.rate) / min(self.samples, self.window)
+
+    def get_hours(self, degrees: float) -> float:
+        """
+        Returns the hours the house is expected to take to move the degrees.
+        """
+
+        return max(0.0, degrees) / self.rate
+
+    def to_dict(self) -> dict:
+        return {"rate": self.rate, "samples": self.samples}
+
+
+class Climate(ProfiledHass):
     """
     Due to AppDaemon limitations, we can't listen for zone enter/exit events within this file. To get around
     this, we use helper functions in HomeAssistant's built-in Automations area. These automations trigger on
@@ -74,11 +146,13 @@ class Climate(hass.Hass):
     """
 
     entities: ClimateEntities
-    day_time: time
-    day_time_handler: str = None
-    night_time: time
-    night_time_handler: str = None
-    away_state_handler: str = None
+    state: ClimateState
+    setpoints: SetpointWriter
+    trends: dict
+    recovery_models: dict
+    timers: TimerRegistry
+    windows: TimeWindows
+    away_state_handler: int = None
 
     def initialize(self) -> None:
         """
@@ -86,12 +160,20 @@ class Climate(hass.Hass):
         """
 
         self.notification_utils = self.get_app("notification_utils")
+        self.presence = self.get_app("presence")
+        self.state_store = self.get_app("state_store")
         self.utils = self.get_app("utils")
         self.entities = ClimateEntities(self)
-        self.day_time = self.parse_time(self.get_state(self.entities.day_time))
-        self.night_time = self.parse_time(self.get_state(self.entities.night_time))
+        self.state = ClimateState()
+        self.set_up_trends()
+        self.timers = TimerRegistry(self)
+        self.windows = TimeWindows(self, self.timers)
+        self.set_up_state_mirror()
+        self.setpoints = SetpointWriter(self, self.entities.thermostat, self.args.get("setpoint_settle_seconds", 5),
+                                        self.state.set_temperature,
+                                        confirm_timeout=self.args.get("setpoint_confirm_seconds", 120))
         entity_update_duration: int = 15
-        away_duration_seconds: int = self.get_away_duration_seconds(self.get_state(self.entities.away_minutes))
+        away_duration_seconds: int = self.get_away_minutes() * 60
         # Property updates
         self.listen_state(self.on_day_time_updated, self.entities.day_time, duration=entity_update_duration)
         self.listen_state(self.on_night_time_updated, self.entities.night_time, duration=entity_update_duration)
@@ -100,33 +182,144 @@ class Climate(hass.Hass):
 
         # Temperature update events
         self.listen_state(self.on_thermostat_state_updated, self.entities.thermostat_state)
-        self.listen_state(self.on_person_state_updated, self.entities.allison, new="home")
-        self.listen_state(self.on_person_state_updated, self.entities.owen, new="home")
-        self.away_state_handler = self.listen_state(self.on_person_state_updated, self.entities.owen,
-                                                    old="home", duration=away_duration_seconds)
-        self.day_time_handler = self.run_daily(self.on_schedule_time, self.day_time)
-        self.night_time_handler = self.run_daily(self.on_schedule_time, self.night_time)
-        self.listen_state(self.on_current_temperature_updated, self.entities.thermostat,
-                          attribute="current_temperature", duration=300)
+        self.presence.subscribe(self, self.on_person_state_updated, self.entities.allison, new="home")
+        self.presence.subscribe(self, self.on_person_state_updated, self.entities.owen, new="home")
+        self.away_state_handler = self.presence.subscribe(self, self.on_person_state_updated, self.entities.owen,
+                                                          old="home", duration=away_duration_seconds)
+        self.windows.add("day", self.state.day_time, self.state.night_time)
+        self.timers.daily("day_time", self.on_schedule_time, self.state.day_time)
+        self.timers.daily("night_time", self.on_schedule_time, self.state.night_time)
+        self.set_up_preconditioning()
+
+    def set_up_trends(self) -> None:
+        """
+        Keeps a rolling window of recent samples of the current and bedroom temperatures, so
+        decisions can use the trend instead of a single sample.
+        """
+
+        samples = int(self.args.get("trend_samples", 30))
+        ewma_seconds = float(self.args.get("trend_ewma_minutes", 10)) * 60
+        self.trends = {field: RollingWindow(samples, ewma_seconds)
+                       for field in ("current_temperature", "bedroom_temperature")}
+        self.alert_seconds = float(self.args.get("alert_minutes", 15)) * 60
+        self.deviated_since = None  # When the current temperature started deviating from the setpoint.
+        self.deviation_alerted = False
+
+    def set_up_preconditioning(self) -> None:
+        """
+        Loads the saved recovery models and schedules checks ahead of the day and night times, so
+        the setpoint can be changed early enough for the house to reach it on time.
+        """
+
+        self.precondition_seconds = float(self.args.get("precondition_max_minutes", 120)) * 60
+        self.recovery_models = {mode: RecoveryModel(**self.state_store.get(self.name, f"recovery_{mode}", {}))
+                                for mode in ("heat", "cool")}
+        self.recovery = None  # The recovery being observed: when it started, from and to what temperature.
+        self.preconditioned = None  # Whether the setpoint was changed early for the day (or night), until it starts.
+        self.precondition_handlers = {}  # is_day -> handle of the pending re-check.
+        self.timers.daily("day_precondition", self.on_precondition_time, self.get_precondition_time(True),
+                          is_day=True)
+        self.timers.daily("night_precondition", self.on_precondition_time, self.get_precondition_time(False),
+                          is_day=False)
+
+    def get_mirrored_fields(self) -> dict:
+        """
+        Maps each `ClimateState` field to the entity (and attribute) it mirrors and the
+        parser used to convert the raw state string.
+        """
+
+        is_on = lambda state: state == "on"
+        input_number = self.utils.get_input_number_integer
+
+        return {
+            "day_time": (self.entities.day_time, None, self.parse_time),
+            "night_time": (self.entities.night_time, None, self.parse_time),
+            "day_temperature": (self.entities.day_temperature, None, input_number),
+            "night_offset": (self.entities.night_offset, None, input_number),
+            "away_minutes": (self.entities.away_minutes, None, input_number),
+            "away_offset": (self.entities.away_offset, None, input_number),
+            "gone_offset": (self.entities.gone_offset, None, input_number),
+            "vacation_mode": (self.entities.vacation_mode, None, is_on),
+            "heat_mode": (self.entities.thermostat, None, lambda state: state == "heat"),
+            "set_temperature": (self.entities.thermostat, "temperature", int),
+            "current_temperature": (self.entities.thermostat, "current_temperature", float),
+            "thermostat_state": (self.entities.thermostat_state, None, lambda state: ThermostatState[state]),
+            "zone_home": (self.entities.zone_home, None, int),
+            "zone_near_home": (self.entities.zone_near_home, None, int),
+            "notify_time": (self.entities.notify_time, None, is_on),
+            "notify_location": (self.entities.notify_location, None, is_on),
+            "bedroom_fan": (self.entities.bedroom_fan, None, is_on),
+            "bedroom_temperature": (self.entities.bedroom_temperature, None, float),
+        }
+
+    def set_up_state_mirror(self) -> None:
+        """
+        Loads every mirrored field with one bulk read and listens for changes to keep them up to date.
+        """
+
+        fields = self.get_mirrored_fields()
+        with self.utils.snapshot(*{entity for entity, attribute, parser in fields.values()}):
+            for field, (entity, attribute, parser) in fields.items():
+                self.update_mirrored_field(field, parser, self.utils.get_entity_state(entity, attribute=attribute))
+
+        for field, (entity, attribute, parser) in fields.items():
+            if attribute is None:
+                self.listen_state(self.on_mirrored_entity_updated, entity, field=field, parser=parser)
+            else:
+                self.listen_state(self.on_mirrored_entity_updated, entity, attribute=attribute, field=field,
+                                  parser=parser)
+
+    def on_mirrored_entity_updated(self, entity: str, attribute: str, old: str, new: str, args) -> None:
+        """
+        On a mirrored entity updated, update the local copy of its state. Temperatures are added to
+        their trend, and the current temperature is checked against the setpoint.
+        """
+
+        self.update_mirrored_field(args["field"], args["parser"], new)
+        if args["field"] in self.trends:
+            self.add_trend_sample(args["field"])
+        if args["field"] == "current_temperature":
+            self.check_current_temperature()
+            self.check_recovery()
+        elif args["field"] == "set_temperature":
+            self.start_recovery()
+
+    def update_mirrored_field(self, field: str, parser, value: str) -> None:
+        """
+        Parses the value and stores it on the state mirror. If the value can't be parsed (such as
+        when the entity is unavailable), the last known value is kept.
+        """
+
+        try:
+            setattr(self.state, field, parser(value))
+        except (KeyError, TypeError, ValueError):
+            self.log(f"Unable to parse {value} for {field}. Keeping {getattr(self.state, field)}.")
+
+    def add_trend_sample(self, field: str) -> None:
+        value = getattr(self.state, field)
+        if value is not None:
+            self.trends[field].add(self.datetime().timestamp(), value)
 
     def on_day_time_updated(self, entity: str, attribute: str, old: str, new: str, args) -> None:
         """
-        On climate day time set, cancel previous timer and set up a new one for the new time.
+        On climate day time set, move the day timer to the new time.
         """
 
-        self.cancel_timer(self.day_time_handler)
-        self.day_time = self.parse_time(new)
-        self.day_time_handler = self.run_daily(self.on_schedule_time, self.day_time)
+        self.windows.add("day", new, self.state.night_time)
+        self.timers.reschedule("day_time", new)
+        self.timers.reschedule("day_precondition", self.get_precondition_time(True))
+        self.cancel_precondition_check(True)
         self.log(f"day_time updated from {old} to {new}.")
 
     def on_night_time_updated(self, entity: str, attribute: str, old: str, new: str, args) -> None:
         """
-        On climate nighttime set, cancel previous timer and set up a new one for the new time.
+        On climate nighttime set, move the night timer to the new time.
         """
 
-        self.cancel_timer(self.night_time_handler)
-        self.night_time = self.parse_time(new)
-        self.night_time_handler = self.run_daily(self.on_schedule_time, self.night_time)
+        self.windows.add("day", self.state.day_time, new)
+        self.timers.reschedule("night_time", new)
+        self.timers.reschedule("night_precondition", self.get_precondition_time(False))
+        self.cancel_precondition_check(False)
         self.log(f"night_time updated from {old} to {new}.")
 
     def on_away_minutes_updated(self, entity: str, attribute: str, old: str, new: str, args) -> None:
@@ -134,10 +327,10 @@ class Climate(hass.Hass):
         On away minutes updated, cancel away state listeners and set up new ones with new time.
         """
 
-        self.cancel_listen_state(self.away_state_handler)
+        self.presence.unsubscribe(self.away_state_handler)
         away_duration_seconds = self.get_away_duration_seconds(new)
-        self.away_state_handler = self.listen_state(self.on_person_state_updated, self.entities.owen, new="away",
-                                                    duration=away_duration_seconds)
+        self.away_state_handler = self.presence.subscribe(self, self.on_person_state_updated, self.entities.owen,
+                                                          old="home", duration=away_duration_seconds)
         self.log(f"away_minutes updated from {old} to {new}.")
 
     def on_schedule_time(self, args) -> None:
@@ -145,21 +338,131 @@ class Climate(hass.Hass):
         On climate day time or nighttime, update temperature.
         """
 
-        state: ThermostatState = ThermostatState[self.get_state(self.entities.thermostat_state)]
-        temperature: int = self.set_temperature(state)
+        self.preconditioned = None
+        temperature: int = self.set_temperature(self.state.thermostat_state, "schedule")
         self.notify_time_based(f"Climate: Temperature set to {temperature}")
 
         if not self.is_day():
             self.turn_on_bedroom_fan()
 
-    def on_person_state_updated(self, entity: str, attribute: str, old: str, new: str, args) -> None:
+    def get_precondition_time(self, is_day: bool) -> time:
+        """
+        Returns when to start checking if the setpoint for the day (or night) needs to change
+        early: `precondition_max_minutes` before it.
+        """
+
+        at = self.state.day_time if is_day else self.state.night_time
+        seconds = (at.hour * 3600 + at.minute * 60 + at.second - self.precondition_seconds) % 86400
+        return (datetime.min + timedelta(seconds=seconds)).time()
+
+    def on_precondition_time(self, args) -> None:
+        """
+        Ahead of the day or night time, changes the setpoint now if the house needs at least the
+        time left to reach it. Otherwise, checks again when it's expected to.
+        """
+
+        self.cancel_precondition_check(args["is_day"])
+        at = self.state.day_time if args["is_day"] else self.state.night_time
+        seconds_left = (self.timers.get_next_fire_at(at) - self.datetime()).total_seconds()
+        if seconds_left > self.precondition_seconds:
+            return  # The time was moved while waiting.
+
+        temperature = self.get_new_temperature(self.state.thermostat_state, args["is_day"])
+        if temperature == self.state.set_temperature or self.state.current_temperature is None:
+            return
+        mode = self.get_mode()
+        seconds_needed = self.recovery_models[mode].get_hours(
+            self.get_degrees_to(temperature, self.state.current_temperature)) * 3600
+        if seconds_needed <= 0:
+            return  # Coasting there, such as cooling off for the night while heating.
+
+        if seconds_needed < seconds_left:
+            self.precondition_handlers[args["is_day"]] = self.run_in(
+                self.on_precondition_check, seconds_left - seconds_needed, is_day=args["is_day"])
+            return
+
+        self.log(f"Pre-conditioning to {temperature} {seconds_left / 60:.0f} minutes early "
+                 f"(about {seconds_needed / 60:.0f} minutes needed).")
+        self.preconditioned = args["is_day"]
+        self.set_temperature(self.state.thermostat_state, "precondition", args["is_day"])
+        self.notify_time_based(f"Climate: Temperature set to {temperature} early to be ready on time")
+
+    def on_precondition_check(self, args) -> None:
+        """
+        Checks again if the setpoint for the day (or night) needs to change early.
+        """
+
+        self.precondition_handlers.pop(args["is_day"], None)
+        self.on_precondition_time(args)
+
+    def cancel_precondition_check(self, is_day: bool) -> None:
+        """
+        Cancels the pending re-check for the day (or night), if there is one.
+        """
+
+        handler = self.precondition_handlers.pop(is_day, None)
+        if handler is not None:
+            self.cancel_timer(handler)
+
+    def get_mode(self) -> str:
+        return "heat" if self.is_heat_mode() else "cool"
+
+    def get_degrees_to(self, target: float, temperature: float) -> float:
+        """
+        Returns the degrees the house needs to heat (or cool) to reach the target. Negative if it
+        doesn't need to, because it's already past it.
+        """
+
+        return target - temperature if self.is_heat_mode() else temperature - target
+
+    def start_recovery(self) -> None:
+        """
+        On the setpoint changed, starts observing how long the house takes to reach it, if it
+        needs to heat (or cool) by at least a degree.
+        """
+
+        self.recovery = None
+        target, temperature = self.state.set_temperature, self.state.current_temperature
+        if target is None or temperature is None or self.get_degrees_to(target, temperature) < 1:
+            return
+
+        mode = self.get_mode()
+        self.recovery = {"started": self.datetime(), "temperature": temperature, "target": target, "mode": mode}
+        hours = self.recovery_models[mode].get_hours(self.get_degrees_to(target, temperature))
+        self.log(f"Recovering from {temperature} to {target}. Expected to take {hours * 60:.0f} minutes.")
+
+    def check_recovery(self) -> None:
+        """
+        On the current temperature updated, fits the recovery model if the setpoint has been reached.
+        Recoveries that take over 12 hours (such as the thermostat being off) are dropped.
+        """
+
+        if self.recovery is None:
+            return
+
+        hours = (self.datetime() - self.recovery["started"]).total_seconds() / 3600
+        if hours > 12 or self.recovery["mode"] != self.get_mode():
+            self.recovery = None
+            return
+        if hours <= 0 or self.get_degrees_to(self.recovery["target"], self.state.current_temperature) > 0:
+            return
+
+        mode = self.recovery["mode"]
+        model = self.recovery_models[mode]
+        model.add(abs(self.state.current_temperature - self.recovery["temperature"]), hours)
+        self.state_store.put(self.name, f"recovery_{mode}", model.to_dict())
+        self.log(f"Reached {self.recovery['target']} in {hours * 60:.0f} minutes. "
+                 f"Recovery rate ({mode}) is now {model.rate:.2f} degrees an hour.")
+        self.recovery = None
+
+    def on_person_state_updated(self, change: PresenceChange) -> None:
         """
         If someone is home or away, set state based on if anybody else is home or not.
         """
 
-        existing_state = ThermostatState[self.get_state(self.entities.thermostat_state)]
+        existing_state = self.state.thermostat_state
         new_state = ThermostatState.Home
-        anyone_home = self.anyone_home(person=True)
+        anyone_home = self.presence.anyone_home()
 
         if existing_state == ThermostatState.Gone and not anyone_home:
             new_state = ThermostatState.Gone
@@ -170,80 +473,91 @@ class Climate(hass.Hass):
 
     def on_thermostat_state_updated(self, entity: str, attribute: str, old: str, new: str, args) -> None:
         """
-        On state updated, set temperature based on state.
+        On state updated, set temperature based on state. If the setpoint was changed early for
+        the day (or night), it's kept for that until it starts.
         """
 
         new_state = ThermostatState[new]
-        temperature: int = self.set_temperature(new_state)
+        temperature: int = self.set_temperature(new_state, new, self.preconditioned)
         self.notify_location_based(f"Climate: Temperature set to {temperature}")
 
         if new_state == ThermostatState.Home and not self.is_day():
             self.turn_on_bedroom_fan()
 
-    def on_current_temperature_updated(self, entity: str, attribute: str, old: str, new: str, args) -> None:
+    def check_current_temperature(self) -> None:
         """
         On the current temperature of the thermostat changed, check if it's deviated too much
-        from what's currently set at.
+        from what's currently set at. Alerts once the smoothed temperature has been 2 degrees
+        past the setpoint for `alert_minutes` while still heading the wrong way, and only once
+        until it's back within a degree.
         """
 
-        # If nobody is home, there's no need to notify anyone, because the
-        # temperature is expected to be deviating.
-        if not self.anyone_home(person=True):
+        trend = self.trends["current_temperature"]
+        set_temperature = self.get_set_temperature()
+        if trend.ewma is None or set_temperature is None:
             return
 
-        previous_temperature = int(old)
-        current_temperature = int(new)
-        set_temperature = self.get_set_temperature()
         is_heat_mode = self.is_heat_mode()
-        temperature_difference = current_temperature - set_temperature
+        temperature_difference = trend.ewma - set_temperature
+        if not is_heat_mode:
+            temperature_difference = -temperature_difference
+        # Once deviating, it takes getting back within a degree to end it, so hovering around
+        # 2 degrees doesn't alert again.
+        if temperature_difference < (1 if self.deviated_since else 2):
+            self.deviated_since = None
+            self.deviation_alerted = False
+            return
+        self.deviated_since = self.deviated_since or self.datetime()
 
-        # Don't notify if the temperature is not going in a concerning direction.
-        if is_heat_mode and current_temperature <= previous_temperature:
+        # If nobody is home, there's no need to notify anyone, because the
+        # temperature is expected to be deviating.
+        if self.deviation_alerted or not self.presence.anyone_home():
             return
-        elif not is_heat_mode and current_temperature >= previous_temperature:
+        if (self.datetime() - self.deviated_since).total_seconds() < self.alert_seconds:
             return
 
-        if is_heat_mode and temperature_difference >= 2:
+        # Don't notify if the temperature is not going in a concerning direction.
+        slope = trend.slope()
+        if (is_heat_mode and slope <= 0) or (not is_heat_mode and slope >= 0):
+            return
+
+        self.deviation_alerted = True
+        current_temperature = round(trend.ewma)
+        if is_heat_mode:
             self.notification_utils.notify_users(
                 f"House is too hot! (Current: {current_temperature} Set: {set_temperature})", Person.Owen)
-        elif not is_heat_mode and temperature_difference <= -2:
+        else:
             self.notification_utils.notify_users(
                 f"House is too cold! (Current: {current_temperature} Set: {set_temperature})", Person.Owen)
 
-    def set_temperature(self, state: ThermostatState) -> int:
+    def set_temperature(self, state: ThermostatState, reason: str = None, is_day: bool = None) -> int:
         """
-        Sets the temperature of the thermostat based on the state.
+        Sets the temperature of the thermostat based on the state. Requests within a few seconds
+        of each other are coalesced by the setpoint writer, so only the last is written.
         """
 
-        current_temperature: int = self.get_set_temperature()
-        new_temperature = self.get_new_temperature(state)
+        current_temperature: int = self.state.set_temperature
+        new_temperature = self.get_new_temperature(state, is_day)
         self.log(f"Temperature update requested. Old: {current_temperature} New: {new_temperature}")
-
-        if current_temperature != new_temperature:
-            self.call_service(
-                "climate/set_temperature",
-                entity_id=self.entities.thermostat,
-                temperature=new_temperature,
-            )
+        self.setpoints.request(new_temperature, reason)
 
         return new_temperature
 
-    def get_new_temperature(self, state: ThermostatState) -> int:
+    def get_new_temperature(self, state: ThermostatState, is_day: bool = None) -> int:
         """
-        Updates the correct temperature to set based on the current state.
+        Updates the correct temperature to set based on the current state, and whether it's day
+        (now, unless given).
         """
 
-        day_temperature = self.get_input_number_from_state(self.entities.day_temperature)
-        night_offset = self.get_input_number_from_state(self.entities.night_offset)
+        day_temperature = self.state.day_temperature
+        is_day = self.is_day() if is_day is None else is_day
 
         if state == ThermostatState.Gone:
-            gone_offset = self.get_input_number_from_state(self.entities.gone_offset)
-            return day_temperature + self.get_offset(gone_offset)
+            return day_temperature + self.get_offset(self.state.gone_offset)
 
-        temperature = day_temperature if self.is_day() else day_temperature - night_offset
+        temperature = day_temperature if is_day else day_temperature - self.state.night_offset
         if state == ThermostatState.Away:
-            away_offset = self.get_input_number_from_state(self.entities.away_offset)
-            return temperature + self.get_offset(away_offset)
+            return temperature + self.get_offset(self.state.away_offset)
 
         return temperature
 
@@ -253,10 +567,7 @@ class Climate(hass.Hass):
         and the start time of the night temperature.
         """
 
-        # Subtract 5 seconds from the user set day time to get rid of an edge case where
-        # the automation running fast could result in `now_is_between` returning false.
-        day_time = self.utils.add_seconds(self.day_time, -5)
-        return self.now_is_between(str(day_time), str(self.night_time))
+        return self.windows.is_active("day")
 
     def get_offset(self, offset: int) -> int:
         """
@@ -275,14 +586,14 @@ class Climate(hass.Hass):
         Whether on not the thermostat is currently heating or cooling.
         """
 
-        return bool(self.get_state(self.entities.thermostat) == "heat")
+        return self.state.heat_mode
 
     def notify_time_based(self, message: str) -> None:
         """
         Notify user if notify user (time based) boolean is set.
         """
 
-        if self.utils.is_entity_on(self.entities.notify_time):
+        if self.state.notify_time:
             self.notification_utils.notify_users(message, Person.Owen, True)
 
     def notify_location_based(self, message: str) -> None:
@@ -290,9 +601,22 @@ class Climate(hass.Hass):
         Notify user if notify user (location based) boolean is set.
         """
         
-        if self.utils.is_entity_on(self.entities.notify_location):
+        if self.state.notify_location:
             self.notification_utils.notify_users(message, Person.Owen)
 
+    def get_away_minutes(self) -> int:
+        """
+        Gets the minutes Owen must be away before the away setpoint is used. Falls back to the
+        configured `away_minutes` if the input number couldn't be read.
+        """
+
+        if self.state.away_minutes is not None:
+            return self.state.away_minutes
+
+        away_minutes = int(self.args.get("away_minutes", 30))
+        self.log(f"Unable to read away_minutes. Using {away_minutes}.", level="WARNING")
+        return away_minutes
+
     def get_away_duration_seconds(self, state: str) -> int:
         """
         Converts state string to an integer (minutes) and multiplies to get seconds
@@ -301,26 +625,23 @@ class Climate(hass.Hass):
         
         return self.utils.get_input_number_integer(state) * 60
 
-    def get_input_number_from_state(self, entity_id: str) -> int:
-        """
-        Gets the integer representation of the state of the input entity.
-        """
-
-        return self.utils.get_input_number_integer(self.get_state(entity_id))
-
     def get_set_temperature(self) -> int:
         """
         Gets the currently set temperature for the thermostat.
         """
 
-        return int(self.get_state(self.entities.thermostat, attribute="temperature"))
+        return self.state.set_temperature
 
     def turn_on_bedroom_fan(self) -> None:
         """
-        Checks if the bedroom is currently warmer than the set temperature. If it's too
-        hot, the bedroom fan is turned on.
+        Checks if the bedroom will still be warmer than the set temperature in half an hour, from
+        its smoothed temperature and trend. If it's too hot, the bedroom fan is turned on.
         """
 
-        if float(self.get_state(self.entities.bedroom_temperature)) > float(self.get_set_temperature()):
+        trend = self.trends["bedroom_temperature"]
+        if trend.ewma is None:
+            return
+        bedroom_temperature = trend.ewma + trend.slope() * 30 * 60
+        if bedroom_temperature > float(self.get_set_temperature()):
             self.log("Turning on bedroom fan.")
             self.turn_on(self.entities.bedroom_fan)
@@ -1,12 +1,56 @@
-import appdaemon.plugins.hass.hassapi as hass
+import importlib
 
+try:
+    Debouncer = importlib.import_module("utils.debounce").Debouncer
+    ProfiledHass = importlib.import_module("utils.profiling").ProfiledHass
+except ModuleNotFoundError:
+    Debouncer = importlib.import_module("debounce").Debouncer
+    ProfiledHass = importlib.import_module("profiling").ProfiledHass
 
-class DownstairsSunLighting(hass.Hass):
+# (elevation, brightness, color temperature in kelvin). Levels between points are interpolated.
+DEFAULT_CURVE = [
+    [-6, 102, 2200],  # Civil twilight and darker: 40%, warm.
+    [0, 128, 2700],  # Sunset: 50%.
+    [10, 200, 3500],
+    [30, 255, 4500],  # Full daylight: 100%, neutral.
+]
+
+
+def build_table(curve: list) -> list:
     """
-    Sets downstairs light level depending on the elevation of the sun.
+    Precomputes the (brightness, kelvin) for every whole degree of elevation from -90 to 90.
     """
 
-    downstairs_lights: str
+    curve = sorted(curve)
+    table = []
+    for elevation in range(-90, 91):
+        if elevation <= curve[0][0]:
+            table.append((curve[0][1], curve[0][2]))
+            continue
+        if elevation >= curve[-1][0]:
+            table.append((curve[-1][1], curve[-1][2]))
+            continue
+
+        for (start, start_brightness, start_kelvin), (end, end_brightness, end_kelvin) in zip(curve, curve[1:]):
+            if start <= elevation <= end:
+                fraction = (elevation - start) / (end - start)
+                table.append((round(start_brightness + (end_brightness - start_brightness) * fraction),
+                              round(start_kelvin + (end_kelvin - start_kelvin) * fraction)))
+                break
+    return table
+
+
+class DownstairsSunLighting(ProfiledHass):
+    """
+    Sets the downstairs lights' brightness and color temperature from the elevation of the sun,
+    following `curve` (brighter and cooler as the sun rises). Levels are looked up in a table
+    precomputed at startup, so each elevation update costs a lookup and a comparison per light.
+    A light is only sent a new level when it's on and the level differs from the last one sent
+    by more than `brightness_delta` (or `kelvin_delta`), and at most once every
+    `min_update_seconds`, so dimming is gradual with a few calls a day.
+    """
+
+    downstairs_lights: list
     sun: str
 
     def initialize(self):
@@ -14,34 +58,82 @@ class DownstairsSunLighting(hass.Hass):
         Sets up the automation.
         """
 
-        self.downstairs_lights = self.args["downstairs_lights"]
+        lights = self.args["downstairs_lights"]
+        self.downstairs_lights = [lights] if isinstance(lights, str) else lights
         self.sun = self.args["sun"]
+        self.table = build_table(self.args.get("curve", DEFAULT_CURVE))
+        self.brightness_delta = int(self.args.get("brightness_delta", 25))
+        self.kelvin_delta = int(self.args.get("kelvin_delta", 300))
+        self.rate_limit = Debouncer(self, int(self.args.get("min_update_seconds", 900)))
+        self.light_states = {}  # light -> state, once known
+        self.sent = {}  # light -> (brightness, kelvin) last sent (or found) while it's been on
 
-        # Wait 5 seconds to make sure brightness is available as an attribute.
-        self.listen_state(self.set_downstairs_light_level, self.downstairs_lights, new="on", duration=5)
-        self.listen_state(self.set_downstairs_light_level, self.sun, attribute="elevation",
-                          old=lambda x: int(x) >= 10,
-                          new=lambda x: int(x) < 10)  # Around sunset
-        self.listen_state(self.set_downstairs_light_level, self.sun, attribute="elevation",
-                          old=lambda x: int(x) < 10,
-                          new=lambda x: int(x) >= 10)  # Around sunrise
+        for light in self.downstairs_lights:
+            # Wait 5 seconds to make sure brightness is available as an attribute.
+            self.listen_state(self.set_downstairs_light_level, light, new="on", duration=5)
+            self.listen_state(self.on_light_updated, light)
+        self.listen_state(self.on_elevation_updated, self.sun, attribute="elevation")
 
-    """
-    Sets downstairs light level depending on the elevation of the sun.
-    If sun is at or above 10 degrees, set lights to 100% if not already.
-    If sun is below 10 degrees, set lights to 50% if not already.
-    """
+    def get_level(self, elevation: float) -> tuple:
+        """
+        Returns the (brightness, kelvin) for the elevation.
+        """
+
+        return self.table[min(180, max(0, round(elevation) + 90))]
 
     def set_downstairs_light_level(self, entity: str, attribute: str, old: str, new: str, cb_args):
-        brightness_str = self.get_state(self.downstairs_lights, attribute="brightness")
+        """
+        On a light turned on, sets it to the level for the sun's elevation.
+        """
+
+        brightness_str = self.get_state(entity, attribute="brightness")
         if brightness_str is None:  # Light is most likely off
             return
 
-        elevation = int(self.get_state(self.sun, attribute="elevation"))
-        brightness = int(brightness_str)
-        if elevation >= 10 and brightness != 255:  # 100% brightness
-            self.log("Setting downstairs lights to 100% brightness")
-            self.set_state(self.downstairs_lights, state="on", attributes={"brightness": "255"})
-        elif elevation < 10 and brightness != 128:  # 50% brightness
-            self.log("Setting downstairs lights to 50% brightness")
-            self.set_state(self.downstairs_lights, state="on", attributes={"brightness": "128"})
+        self.light_states[entity] = "on"
+        self.sent.pop(entity, None)
+        self.update_light(entity, self.get_level(float(self.get_state(self.sun, attribute="elevation"))), True)
+
+    def on_light_updated(self, entity: str, attribute: str, old: str, new: str, kwargs) -> None:
+        """
+        On a light switched, forgets the level last sent to it once it's off.
+        """
+
+        self.light_states[entity] = new
+        if new != "on":
+            self.sent.pop(entity, None)
+
+    def on_elevation_updated(self, entity: str, attribute: str, old: str, new: str, kwargs) -> None:
+        """
+        On the sun's elevation updated, moves the lights that are on towards the new level.
+        """
+
+        try:
+            level = self.get_level(float(new))
+        except (TypeError, ValueError):
+            return
+
+        for light in self.downstairs_lights:
+            if light not in self.light_states:  # Only read once, after startup.
+                self.light_states[light] = self.get_state(light)
+            if self.light_states[light] == "on":
+                self.update_light(light, level)
+
+    def update_light(self, light: str, level: tuple, immediate: bool = False) -> None:
+        """
+        Sends the level to the light if it's changed enough since the last one sent (and, unless
+        immediate, the light hasn't been updated within `min_update_seconds`).
+        """
+
+        brightness, kelvin = level
+        sent_brightness, sent_kelvin = self.sent.get(light, (None, None))
+        if (sent_brightness is not None and abs(brightness - sent_brightness) <= self.brightness_delta and
+                sent_kelvin is not None and abs(kelvin - sent_kelvin) <= self.kelvin_delta):
+            return
+        if not immediate and self.rate_limit.recently_triggered(light):
+            return
+
+        self.log(f"Setting {light} to brightness {brightness} at {kelvin}K.")
+        self.turn_on(light, brightness=brightness, color_temp_kelvin=kelvin)
+        self.sent[light] = level
+        self.rate_limit.touch(light)
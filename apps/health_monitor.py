@@ -0,0 +1,235 @@
+import asyncio
+import importlib
+import random
+
+try:
+    AsyncHass = importlib.import_module("utils.async_hass").AsyncHass
+    Person = importlib.import_module("utils.person").Person
+except ModuleNotFoundError:
+    AsyncHass = importlib.import_module("async_hass").AsyncHass
+    Person = importlib.import_module("person").Person
+
+
+class WatchedEntity:
+    """
+    An entity the health monitor watches, and how to bring it back.
+    """
+
+    entity: str
+    ping: str
+    sync_entity: str
+    state: str
+    task: asyncio.Task
+
+    def __init__(self, entity: str, ping: str = None, sync_entity: str = None) -> None:
+        self.entity = entity
+        self.ping = ping
+        self.sync_entity = sync_entity
+        self.state = None
+        self.task = None  # Pinging (or waiting to alert on) the entity while it's unavailable.
+
+    @property
+    def unavailable(self) -> bool:
+        return self.state == "unavailable"
+
+
+class HealthMonitor(AsyncHass):
+    """
+    Watches entities (such as Zigbee and Wi-Fi devices) for becoming unavailable:
+    - Entities with a ping button are pinged, backing off exponentially (with jitter) between
+      tries. Every entity is pinged concurrently, and pinging stops as soon as it's back.
+    - Entities still unavailable after their pings (or after `alert_delay` seconds, if they
+      can't be pinged) are down. Entities going down within `outage_window` seconds of each
+      other are sent as one alert per outage.
+    - A summary of every entity's health is kept on `sensor`.
+    State changes are received by one listener and filtered by membership in the registry, so
+    watching more entities doesn't add listeners.
+    """
+
+    sensor: str
+    alert_delay: int
+    outage_window: int
+    max_tries: int
+    backoff: int
+    backoff_max: int
+    jitter: float
+
+    async def initialize(self) -> None:
+        """
+        Builds the registry from `entities` and starts watching any that are already unavailable.
+        """
+
+        self.state_store = self.get_app("state_store")
+        self.sensor = self.args.get("sensor", "sensor.entity_health")
+        self.alert_delay = int(self.args.get("alert_delay", 30))
+        self.outage_window = int(self.args.get("outage_window", 60))
+        self.max_tries = int(self.args.get("max_tries", 4))
+        self.backoff = int(self.args.get("backoff", 60))
+        self.backoff_max = int(self.args.get("backoff_max", 900))
+        self.jitter = float(self.args.get("jitter", 0.2))
+
+        self.watched = {}  # entity -> WatchedEntity
+        for entity in self.args["entities"]:
+            if isinstance(entity, str):
+                entity = {"entity": entity}
+            self.watched[entity["entity"]] = WatchedEntity(entity["entity"], entity.get("ping"),
+                                                           entity.get("sync_entity"))
+        self.unavailable = set()
+        self.down = set()
+        self.outage = None  # Entities down in the current outage, and the task alerting on them.
+
+        all_states = await self.get_state() or {}
+        await self.listen_state(self.on_state_updated)
+        for watched in self.watched.values():
+            watched.state = (all_states.get(watched.entity) or {}).get("state")
+            if watched.unavailable:
+                self.on_unavailable(watched)
+            else:
+                self.state_store.put(self.name, watched.entity, None)
+        await self.publish_health()
+
+    async def on_state_updated(self, entity: str, attribute: str, old: str, new: str, kwargs) -> None:
+        """
+        On any entity updated, tracks the watched ones becoming unavailable and coming back.
+        """
+
+        watched = self.watched.get(entity)
+        if watched is None or new == watched.state:
+            return
+
+        was_unavailable = watched.unavailable
+        watched.state = new
+        if watched.unavailable:
+            self.on_unavailable(watched)
+        elif was_unavailable:
+            await self.on_available(watched)
+        else:
+            return
+        await self.publish_health()
+
+    def on_unavailable(self, watched: WatchedEntity) -> None:
+        """
+        Starts pinging (or waiting to alert on) the entity. Resumes from the try saved before a restart.
+        """
+
+        self.unavailable.add(watched.entity)
+        if watched.task is None:
+            first_try = (self.state_store.get(self.name, watched.entity) or {}).get("try", 1)
+            watched.task = self.create_task(self.watch_unavailable(watched, first_try))
+
+    async def on_available(self, watched: WatchedEntity) -> None:
+        """
+        Stops pinging the entity, ends the outage once everything is back, and syncs the entity
+        with `sync_entity`, if it has one.
+        """
+
+        self.unavailable.discard(watched.entity)
+        if watched.task is not None:
+            watched.task.cancel()
+            watched.task = None
+        self.state_store.put(self.name, watched.entity, None)
+
+        if watched.entity in self.down:
+            self.log("{} is available again.".format(watched.entity))
+            self.down.discard(watched.entity)
+            if self.outage is not None and not self.outage["entities"] & self.down:
+                self.end_outage()
+
+        if watched.sync_entity is not None:
+            await self.sync_entities(watched.sync_entity, watched.entity)
+
+    async def watch_unavailable(self, watched: WatchedEntity, first_try: int = 1) -> None:
+        """
+        Pings the entity until it's back or out of tries, then marks it down. Each try waits up to
+        the backoff for the entity to come back, so it returns as soon as the entity responds. The
+        try in progress is saved, so it resumes if AppDaemon restarts.
+        """
+
+        if watched.ping is None:
+            await self.sleep(self.alert_delay)
+        else:
+            for count in range(first_try, self.max_tries + 1):
+                self.state_store.put(self.name, watched.entity, {"try": count})
+                self.log("Pinging {} because it's unavailable. (Try: {})".format(watched.entity, count))
+                if await self.command_and_confirm(watched.entity, "button/press",
+                                                  lambda state: state != "unavailable", self.get_backoff(count),
+                                                  entity_id=watched.ping):
+                    return
+
+        watched.task = None
+        self.state_store.put(self.name, watched.entity, None)
+        if watched.unavailable:
+            self.log("{} is still unavailable. Marking down.".format(watched.entity))
+            self.mark_down(watched)
+            await self.publish_health()
+
+    def get_backoff(self, count: int) -> float:
+        """
+        Seconds to wait after the try before the next one. Doubles each try (up to `backoff_max`),
+        with jitter so entities that went unavailable together aren't pinged together.
+        """
+
+        backoff = min(self.backoff * 2 ** (count - 1), self.backoff_max)
+        return backoff * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def mark_down(self, watched: WatchedEntity) -> None:
+        """
+        Adds the entity to the current outage, starting one (and its alert) if there isn't one.
+        """
+
+        self.down.add(watched.entity)
+        if self.outage is None:
+            self.outage = {"entities": set(), "task": self.create_task(self.alert_outage())}
+        self.outage["entities"].add(watched.entity)
+
+    async def alert_outage(self) -> None:
+        """
+        Once the outage window has passed, sends one alert for every entity in the outage that's
+        still down, and closes the outage. Entities going down after that start a new one.
+        """
+
+        await self.sleep(self.outage_window)
+        if self.outage is None:
+            return
+
+        entities = sorted(self.outage["entities"] & self.down)
+        self.outage = None
+        self.log("Outage: {} unavailable. Notifying.".format(entities))
+        if len(entities) == 1:
+            message = "{} is unavailable.".format(entities[0])
+        else:
+            message = "{} entities are unavailable: {}.".format(len(entities), ", ".join(entities))
+        await self.notify_users(message, Person.Owen)
+
+    def end_outage(self) -> None:
+        """
+        Ends the outage once every entity in it is back.
+        """
+
+        self.log("Outage over. {} are available again.".format(sorted(self.outage["entities"])))
+        if not self.outage["task"].done():
+            self.outage["task"].cancel()
+        self.outage = None
+
+    def get_health(self) -> dict:
+        """
+        Returns a summary of the health of every watched entity.
+        """
+
+        return {
+            "watched": len(self.watched),
+            "available": len(self.watched) - len(self.unavailable),
+            "unavailable": sorted(self.unavailable),
+            "pinging": sorted(watched.entity for watched in self.watched.values()
+                              if watched.task is not None and watched.ping is not None),
+            "down": sorted(self.down),
+            "outage": self.outage is not None,
+        }
+
+    async def publish_health(self) -> None:
+        """
+        Sets the health summary on the sensor. The state is the number of unavailable entities.
+        """
+
+        health = self.get_health()
+        await self.set_state(self.sensor, state=len(health["unavailable"]), attributes=health)
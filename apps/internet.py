@@ -1,7 +1,17 @@
-import appdaemon.plugins.hass.hassapi as hass
+from datetime import datetime
+import importlib
 
+try:
+    AsyncHass = importlib.import_module("utils.async_hass").AsyncHass
+    Debouncer = importlib.import_module("utils.debounce").Debouncer
+    Person = importlib.import_module("utils.person").Person
+except ModuleNotFoundError:
+    AsyncHass = importlib.import_module("async_hass").AsyncHass
+    Debouncer = importlib.import_module("debounce").Debouncer
+    Person = importlib.import_module("person").Person
 
-class Internet(hass.Hass):
+
+class Internet(AsyncHass):
     """
     Automation to restart the modem if we don't have internet.
     """
@@ -9,60 +19,77 @@ class Internet(hass.Hass):
     internet_up: str
     internet_modem_smart_plug: str
 
-    def initialize(self):
+    async def initialize(self):
         """
         Sets up the automation.
         """
 
-        self.utils = self.get_app("utils")
         self.internet_up = self.args["internet_up"]
         self.internet_modem_smart_plug = self.args["internet_modem_smart_plug"]
         # self.internet_router_smart_plug = self.args["internet_router_smart_plug"]
+        # Smart plugs switched within 5 minutes (by a restart or by hand) aren't restarted again.
+        self.restarts = Debouncer(self, 300)
+        await self.restarts.track(self.internet_modem_smart_plug)
+        await self.restore_restarts()
 
         # Restarts modem when no internet is detected for 1.5 minutes. Ping
         # checks if we have internet access every minute, so this time
         # allows for a second check to happen and confirm that we have no
         # internet access.
-        self.listen_state(self.restart_modem, self.internet_up, new="off", duration=90)
+        await self.listen_state(self.restart_modem, self.internet_up, new="off", duration=90)
 
     """
     Restarts modem smart plug. Then, sets a callback to check if the internet
     is up in 5 minutes or restarts router.
     """
-    def restart_modem(self, entity: str, attribute: str, old: str, new: str, kwargs):
-        self.restart_entity(self.internet_modem_smart_plug)
+    async def restart_modem(self, entity: str, attribute: str, old: str, new: str, kwargs):
+        await self.restart_entity(self.internet_modem_smart_plug)
 
         # Router smart plug needs to be running a non-wifi based protocol
         # (like Zigbee) or we won't be able to turn it back on when the router
         # is off. I'm leaving this here until I get a smart plug that isn't
         # wifi based.
-        # self.run_in(self.restart_router, 330) # Restart router if internet still down in 5.5 minutes.
+        # await self.sleep(330) # Restart router if internet still down in 5.5 minutes.
+        # await self.restart_router()
 
     """
     Restarts router smart plug.
     """
-    # def restart_router(self, cb_args):
-    #     if (not self.utils.is_entity_on(self.internet_up)):
-    #         self.restart_entity(self.internet_router_smart_plug)
+    # async def restart_router(self):
+    #     if (not await self.is_entity_on(self.internet_up)):
+    #         await self.restart_entity(self.internet_router_smart_plug)
 
     """
-    Restarts input entity by turning it off and then scheduling a callback to
-    run in 15 seconds to turn the entity back on.
+    Restarts input entity by turning it off, keeping it off for `power_off_seconds` once it's
+    confirmed off, and then turning the entity back on.
     """
-    def restart_entity(self, entity: str):
-        if self.utils.recently_triggered(entity, 300):
+    async def restart_entity(self, entity: str):
+        if self.restarts.recently_triggered(entity):
             self.log("{} already manually restarted. Not restarting.".format(entity))
             return
 
         self.log("Restarting {}".format(entity))
-        self.turn_off(entity)
-        self.run_in(self.turn_on_entity, 15, entity = entity)
+        if not await self.command_and_confirm(entity, "homeassistant/turn_off", "off", 30):
+            self.log("{} didn't turn off. Not restarting.".format(entity))
+            return
+
+        await self.sleep(self.args.get("power_off_seconds", 10))  # So the modem fully powers down.
+        if not await self.command_and_confirm(entity, "homeassistant/turn_on", "on", 30):
+            self.log("{} didn't turn back on.".format(entity))
+            await self.notify_users("Failed to turn {} back on after restarting it.".format(entity), Person.Owen)
+            return
+        self.get_app("state_store").put(self.name, entity, (await self.datetime(True)).isoformat())
+        await self.notify_users("Restarted {} due to internet outage.".format(entity), Person.Owen)
 
     """
-    Turns input entity back on.
+    Restores the cooldowns of entities restarted shortly before AppDaemon restarted.
     """
-    def turn_on_entity(self, kwargs):
-        entity = kwargs["entity"]
-
-        self.turn_on(entity)
-        self.notify_owen("Restarted {} due to internet outage.".format(entity))
+    async def restore_restarts(self):
+        state_store = self.get_app("state_store")
+        now = await self.datetime(True)
+        for entity in [self.internet_modem_smart_plug]:
+            restarted_at = state_store.get(self.name, entity)
+            if restarted_at is not None:
+                # A restart "in the future" (from the clock being moved back) is treated as just now.
+                age = max(0.0, (now - datetime.fromisoformat(restarted_at)).total_seconds())
+                self.restarts.touch(entity, age)
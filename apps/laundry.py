@@ -1,13 +1,14 @@
-import appdaemon.plugins.hass.hassapi as hass
 import importlib
 
 try:
     Person = importlib.import_module("utils.person").Person
+    ProfiledHass = importlib.import_module("utils.profiling").ProfiledHass
 except ModuleNotFoundError:
     Person = importlib.import_module("person").Person
+    ProfiledHass = importlib.import_module("profiling").ProfiledHass
 
 
-class Laundry(hass.Hass):
+class Laundry(ProfiledHass):
     """
     Laundry automations.
     """
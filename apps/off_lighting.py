@@ -1,7 +1,16 @@
-import appdaemon.plugins.hass.hassapi as hass
+import importlib
 
+try:
+    ListenerGroup = importlib.import_module("utils.gates").ListenerGroup
+    PresenceChange = importlib.import_module("utils.presence").PresenceChange
+    ProfiledHass = importlib.import_module("utils.profiling").ProfiledHass
+except ModuleNotFoundError:
+    ListenerGroup = importlib.import_module("gates").ListenerGroup
+    PresenceChange = importlib.import_module("presence").PresenceChange
+    ProfiledHass = importlib.import_module("profiling").ProfiledHass
 
-class OffLighting(hass.Hass):
+
+class OffLighting(ProfiledHass):
     """
     Turning lights off automations.
     """
@@ -15,17 +24,17 @@ class OffLighting(hass.Hass):
     office_lights: str
     owen: str
     owen_computer_active: str
-    owen_phone_charger_type: str
     night_lighting: str
     upstairs_active: str
     upstairs_living_area_off: str
-    vacation_mode: str
+    away_triggers: ListenerGroup
 
     def initialize(self):
         """
         Sets up the automation.
         """
 
+        self.presence = self.get_app("presence")
         self.utils = self.get_app("utils")
         self.all_off = self.args["all_off"]
         self.all_off_dynamic = self.args["all_off_dynamic"]
@@ -36,18 +45,16 @@ class OffLighting(hass.Hass):
         self.office_lights = self.args["office_lights"]
         self.owen = self.args["owen"]
         self.owen_computer_active = self.args["owen_computer_active"]
-        self.owen_phone_charger_type = self.args["owen_phone_charger_type"]
         self.night_lighting = self.args["night_lighting"]
         self.upstairs_active = self.args["upstairs_active"]
         self.upstairs_living_area_off = self.args["upstairs_living_area_off"]
-        self.vacation_mode = self.args["vacation_mode"]
 
-        self.listen_state(self.turn_off_lights, self.allison, new="not_home",
-                          duration=300)  # When away for 5 minutes.
-        self.listen_state(self.turn_off_lights, self.owen, new="not_home",
-                          duration=300)  # When away for 5 minutes.
-        self.listen_state(self.turn_off_lights_at_night, self.owen_phone_charger_type, new="wireless",
-                          duration=10)  # When phone charging for 10 seconds.
+        # Lights aren't turned off on people leaving while there are guests.
+        self.away_triggers = ListenerGroup(self, require_off=[self.mode_guest])
+        self.away_triggers.subscribe(self.presence, self.turn_off_lights, self.allison, new="not_home",
+                                     duration=300)  # When away for 5 minutes.
+        self.away_triggers.subscribe(self.presence, self.turn_off_lights, self.owen, new="not_home",
+                                     duration=300)  # When away for 5 minutes.
         self.listen_event(self.active_night_lighting,
                           "CUSTOM_EVENT_NIGHT_LIGHTING")  # When a night lighting event is triggered.
 
@@ -56,15 +63,9 @@ class OffLighting(hass.Hass):
     If only Allison is gone and Owen is at work, turn on office lighting.
     """
 
-    def turn_off_lights(self, entity: str, attribute: str, old: str, new: str, kwargs):
+    def turn_off_lights(self, change: PresenceChange):
         self.log("Executing automation.")
-        if self.utils.is_entity_on(self.mode_guest):
-            return
-
-        owen_home = self.utils.is_entity_home(self.owen)
-        allison_home = self.utils.is_entity_home(self.allison)
-
-        if not owen_home and not allison_home:
+        if not self.presence.anyone_home():
             self.log("Everyone away. Turning off all lights.")
             self.turn_on(self.all_off)
         else:
@@ -86,20 +87,12 @@ class OffLighting(hass.Hass):
     """
 
     def turn_off_lights_based_on_state(self):
-        self.utils.set_state_conditionally(self.upstairs_active, "off",
-                                           self.upstairs_living_area_off, "on")
-        self.utils.set_state_conditionally(self.downstairs_active, "off",
-                                           self.downstairs_lights, "off")
-        self.utils.set_state_conditionally(self.owen_computer_active, "off",
-                                           self.office_lights, "off")
-
-    """
-    At night, turn off all lights in the house once people are sleeping.
-    """
-
-    def turn_off_lights_at_night(self, entity: str, attribute: str, old: str, new: str, kwargs):
-        if (not self.utils.is_entity_on(self.vacation_mode) and
-                self.utils.is_entity_home(self.owen) and
-                self.now_is_between("20:30:00", "03:00:00")):
-            self.log("Turning off all lights due to phone charging at night.")
-            self.turn_on(self.all_off)
+        with self.utils.snapshot(self.upstairs_active, self.upstairs_living_area_off, self.downstairs_active,
+                                 self.downstairs_lights, self.owen_computer_active, self.office_lights), \
+                self.utils.batch() as batch:
+            self.utils.set_state_conditionally(self.upstairs_active, "off",
+                                               self.upstairs_living_area_off, "on", batch)
+            self.utils.set_state_conditionally(self.downstairs_active, "off",
+                                               self.downstairs_lights, "off", batch)
+            self.utils.set_state_conditionally(self.owen_computer_active, "off",
+                                               self.office_lights, "off", batch)
@@ -1,8 +1,21 @@
-import appdaemon.plugins.hass.hassapi as hass
 import datetime
+import importlib
 
+try:
+    PresenceChange = importlib.import_module("utils.presence").PresenceChange
+    ProfiledHass = importlib.import_module("utils.profiling").ProfiledHass
+    thresholds = importlib.import_module("utils.thresholds")
+    TimerRegistry = importlib.import_module("utils.timers").TimerRegistry
+    TimeWindows = importlib.import_module("utils.time_windows").TimeWindows
+except ModuleNotFoundError:
+    PresenceChange = importlib.import_module("presence").PresenceChange
+    ProfiledHass = importlib.import_module("profiling").ProfiledHass
+    thresholds = importlib.import_module("thresholds")
+    TimerRegistry = importlib.import_module("timers").TimerRegistry
+    TimeWindows = importlib.import_module("time_windows").TimeWindows
 
-class OutsideLighting(hass.Hass):
+
+class OutsideLighting(ProfiledHass):
     """
     Outside lighting automations.
     """
@@ -17,13 +30,15 @@ class OutsideLighting(hass.Hass):
     proximity_owen: str
     holiday_lights: str
     holiday_mode: str
-    handle: str
+    timers: TimerRegistry
+    windows: TimeWindows
 
     def initialize(self):
         """
         Sets up the automation.
         """
 
+        self.presence = self.get_app("presence")
         self.utils = self.get_app("utils")
         self.default_time = datetime.time(22, 0, 0)
         self.allison = self.args["allison"]
@@ -35,35 +50,34 @@ class OutsideLighting(hass.Hass):
         self.proximity_owen = self.args["proximity_owen"]
         self.holiday_lights = self.args["holiday_lights"]
         self.holiday_mode = self.args["holiday_mode"]
+        self.timers = TimerRegistry(self)
+        self.windows = TimeWindows(self, self.timers)
+        self.windows.add("late", "22:00:00", "01:00:00")
 
         # Turn lights on 15 minutes before sunset.
         self.run_at_sunset(self.turn_on_front_porch, offset=datetime.timedelta(minutes=-15).total_seconds())
-        self.handle = self.run_daily(self.turn_off_front_porch_time_based,
-                                           self.utils.get_time(self.porch_off_time))
+        self.timers.daily("porch_off", self.turn_off_front_porch_time_based, self.utils.get_time(self.porch_off_time))
         # Only update the next execution time when time has been set for 30 seconds.
         self.listen_state(self.on_porch_off_time_change, self.porch_off_time, duration=30)
         # Only check if execution time needs defaulting when boolean has been off for 30 seconds.
         self.listen_state(self.on_override_boolean_turned_off, self.should_override_time, new="off", duration=30)
-        self.listen_state(self.turn_on_front_porch_location_based, self.proximity_owen,
-                                old=lambda x: float(x) > 5,
-                                new=lambda x: float(x) <= 5)  # When getting close to home.
-        self.listen_state(self.turn_on_front_porch_location_based, self.proximity_allison,
-                                old=lambda x: float(x) > 5,
-                                new=lambda x: float(x) <= 5)  # When getting close to home.
-        self.listen_state(self.turn_off_front_porch_location_based, self.allison, new="home",
+        # When getting within 5 miles of home. Crossings within 2 minutes are merged.
+        for proximity in (self.proximity_owen, self.proximity_allison):
+            thresholds.ThresholdListener(self, self.turn_on_front_porch_location_based, proximity, 5,
+                                         crossing=thresholds.Crossing.Falling, inclusive=False, window=120)
+        self.presence.subscribe(self, self.turn_off_front_porch_location_based, self.allison, new="home",
                                 duration=300)  # When home for 5 minutes.
-        self.listen_state(self.turn_off_front_porch_location_based, self.owen, new="home",
+        self.presence.subscribe(self, self.turn_off_front_porch_location_based, self.owen, new="home",
                                 duration=300)  # When home for 5 minutes.
 
     """
-    On time change, cancel the timer and re-set it up so it executes
-    at the new time. Sets override boolean if necessary.
+    On time change, move the timer so it executes at the new time.
+    Sets override boolean if necessary.
     """
 
     def on_porch_off_time_change(self, entity: str, attribute: str, old: str, new: str, kwargs):
         self.log("Setting new execution time: {}".format(new))
-        self.cancel_timer(self.handle)
-        self.handle = self.run_daily(self.turn_off_front_porch_time_based, new)
+        self.timers.reschedule("porch_off", new)
 
         # If the override time, but the boolean wasn't turned on, turn on the boolean. Only set if time wasn't set to
         # default.
@@ -122,7 +136,7 @@ class OutsideLighting(hass.Hass):
     late at night.
     """
 
-    def turn_off_front_porch_location_based(self, entity: str, attribute: str, old: str, new: str, kwargs):
+    def turn_off_front_porch_location_based(self, change: PresenceChange):
         if self.is_late() and self.utils.is_entity_on(self.front_porch_switch):
             self.log("Turning off front porch lights, due to lights being on and someone getting home late at night.")
             self.turn_off_front_porch()
@@ -161,4 +175,4 @@ class OutsideLighting(hass.Hass):
     """
 
     def is_late(self) -> bool:
-        return self.now_is_between("22:00:00", "01:00:00")
+        return self.windows.is_active("late")
@@ -1,7 +1,16 @@
-import appdaemon.plugins.hass.hassapi as hass
+import importlib
 
+try:
+    Person = importlib.import_module("utils.person").Person
+    PresenceChange = importlib.import_module("utils.presence").PresenceChange
+    ProfiledHass = importlib.import_module("utils.profiling").ProfiledHass
+except ModuleNotFoundError:
+    Person = importlib.import_module("person").Person
+    PresenceChange = importlib.import_module("presence").PresenceChange
+    ProfiledHass = importlib.import_module("profiling").ProfiledHass
 
-class OwenPhoneWifi(hass.Hass):
+
+class OwenPhoneWifi(ProfiledHass):
     """
     Automation to let Owen know when he's home, but not on Wi-Fi.
     """
@@ -14,19 +23,27 @@ class OwenPhoneWifi(hass.Hass):
         Sets up the automation.
         """
 
-        self.utils = self.get_app("utils")
+        self.notification_utils = self.get_app("notification_utils")
+        self.presence = self.get_app("presence")
         self.owen = self.args["owen"]
         self.phone_network = self.args["phone_network"]
 
-        self.listen_state(self.notify_owen, self.owen, new="home", duration=1800)  # When home for 30 minutes
+        self.presence.subscribe(self, self.on_owen_home, self.owen, new="home", duration=1800)  # When home for 30 minutes
         self.listen_state(self.notify_owen, self.phone_network, new="cellular",
                           duration=1800)  # When on cellular data for 30 minutes
 
+    """
+    When Owen has been home for 30 minutes, checks if he's on Wi-Fi.
+    """
+
+    def on_owen_home(self, change: PresenceChange):
+        self.notify_owen(change.person, None, change.old, change.new, {})
+
     """
     Notifies Owen if he's at home without Wifi on.
     """
 
     def notify_owen(self, entity: str, attribute: str, old: str, new: str, kwargs):
-        if self.utils.is_entity_home(self.owen) and self.get_state(self.phone_network) == "cellular":
+        if self.presence.is_home(self.owen) and self.get_state(self.phone_network) == "cellular":
             self.log("Notifying Owen that he's home with cellular on.")
-            self.notify("Your phone is currently connected to cellular data", name="owen")
+            self.notification_utils.notify_users("Your phone is currently connected to cellular data", Person.Owen)
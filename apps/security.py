@@ -1,13 +1,16 @@
-import appdaemon.plugins.hass.hassapi as hass
 import importlib
 
 try:
+    AsyncHass = importlib.import_module("utils.async_hass").AsyncHass
     Person = importlib.import_module("utils.person").Person
+    PresenceChange = importlib.import_module("utils.presence").PresenceChange
 except ModuleNotFoundError:
+    AsyncHass = importlib.import_module("async_hass").AsyncHass
     Person = importlib.import_module("person").Person
+    PresenceChange = importlib.import_module("presence").PresenceChange
 
 
-class Security(hass.Hass):
+class Security(AsyncHass):
     """
     Automations for security.
     """
@@ -16,59 +19,53 @@ class Security(hass.Hass):
     front_door_lock: str
     owen: str
 
-    def initialize(self) -> None:
+    async def initialize(self) -> None:
         """
         Sets up the security automations.
         """
 
-        self.notification_utils = self.get_app("notification_utils")
+        self.presence = self.get_app("presence")
         self.allison = self.args["allison"]
         self.front_door_lock = self.args["front_door_lock"]
         self.owen = self.args["owen"]
 
-        self.listen_state(self.on_people_away, self.allison, old="not_home", duration=60)
-        self.listen_state(self.on_people_away, self.owen, old="not_home", duration=60)
-        self.run_daily(self.on_night_time, "21:30:00")
+        self.presence.subscribe(self, self.on_people_away, self.allison, old="not_home", duration=60)
+        self.presence.subscribe(self, self.on_people_away, self.owen, old="not_home", duration=60)
+        await self.run_daily(self.on_night_time, "21:30:00")
 
-    def on_people_away(self, entity: str, attribute: str, old: str, new: str, args) -> None:
+    async def on_people_away(self, change: PresenceChange) -> None:
         """
         When everyone is away from home, checks if the front door is locked and lock it if it is not.
         """
 
-        if self.anyone_home(person=True):
+        if self.presence.anyone_home():
             return
 
-        self.lock_front_door()
+        await self.lock_front_door()
 
-    def on_night_time(self, args) -> None:
+    async def on_night_time(self, args) -> None:
         """
         At night, checks if the front door is locked and lock it if it is not.
         """
 
-        self.lock_front_door()
+        await self.lock_front_door()
 
-    def lock_front_door(self) -> None:
+    async def lock_front_door(self) -> None:
         """
-        Locks the front door and registers a callback to verify door is locked after 10 seconds.
+        Locks the front door and notifies everyone once it's confirmed locked (or if it isn't
+        after `lock_timeout` seconds).
         """
-        if not self.is_front_door_locked():
+        if not await self.is_front_door_locked():
             self.log("Locking front door.")
-            self.call_service("lock/lock", entity_id=self.front_door_lock)
-            self.run_in(self.verify_front_door_locked, 10)
+            locked = await self.command_and_confirm(self.front_door_lock, "lock/lock", "locked",
+                                                    self.args.get("lock_timeout", 30))
+            self.log(f"Front door locked: {locked}")
+            message = "Locked the front door." if locked else "Attempted to lock the front door but failed."
+            await self.notify_users(message, Person.All)
 
-    def verify_front_door_locked(self, args) -> None:
-        """
-        After requesting the door has been locked, verifies that the door is locked. Notifies everyone regardless.
-        """
-
-        self.log(f"Front door state: {self.get_state(self.front_door_lock)}")
-        message = "Locked the front door." \
-            if self.is_front_door_locked() else "Attempted to lock the front door but failed."
-        self.notification_utils.notify_users(message, Person.All)
-
-    def is_front_door_locked(self) -> bool:
+    async def is_front_door_locked(self) -> bool:
         """
         Returns if the front door is locked.
         """
 
-        return self.get_state(self.front_door_lock) == "locked"
+        return await self.get_state(self.front_door_lock) == "locked"
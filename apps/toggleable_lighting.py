@@ -1,7 +1,14 @@
-import appdaemon.plugins.hass.hassapi as hass
+import importlib
 
+try:
+    Debouncer = importlib.import_module("utils.debounce").Debouncer
+    ProfiledHass = importlib.import_module("utils.profiling").ProfiledHass
+except ModuleNotFoundError:
+    Debouncer = importlib.import_module("debounce").Debouncer
+    ProfiledHass = importlib.import_module("profiling").ProfiledHass
 
-class ToggleableLighting(hass.Hass):
+
+class ToggleableLighting(ProfiledHass):
     """
     Automation to toggle lights on and off due to events received.
     """
@@ -12,10 +19,15 @@ class ToggleableLighting(hass.Hass):
         """
 
         self.utils = self.get_app("utils")
+        self.zha_router = self.get_app("zha_router")
+        # Lights changed within 2 seconds (by a button or by hand) aren't toggled again.
+        self.debouncer = Debouncer(self, 2)
 
         for event in self.args["dictionary"]:
-            self.listen_event(self.toggle_light, "zha_event", device_id=event["event_device_id"],
-                                    command=event["command"], lights=event["lights"])
+            self.zha_router.subscribe(self, self.toggle_light, event["event_device_id"], event["command"],
+                                      lights=event["lights"])
+        for light in {event["lights"][0] for event in self.args["dictionary"]}:
+            self.debouncer.track(light)
 
     """
     Turns light on if currently off and turns light off if currently on.
@@ -25,7 +37,7 @@ class ToggleableLighting(hass.Hass):
 
         first_light = lights[0]
         # Prevents duplicate events from toggling the light more than once.
-        if self.utils.recently_triggered(first_light):
+        if not self.debouncer.ready(first_light):
             self.log("{} recently triggered. Not toggling.".format(lights))
             return
 
@@ -33,9 +45,10 @@ class ToggleableLighting(hass.Hass):
         current_state = self.utils.is_entity_on(first_light)
         self.log("Toggle triggered for {}. Turning light {}.".format(lights, "off" if current_state else "on"))
 
-        # Go through the lights and turn them all on/off.
-        for light in lights:
-            if current_state:
-                self.turn_off(light)
-            else:
-                self.turn_on(light)
+        # Go through the lights and turn them all on/off in one request.
+        with self.utils.batch() as batch:
+            for light in lights:
+                if current_state:
+                    batch.turn_off(light)
+                else:
+                    batch.turn_on(light)
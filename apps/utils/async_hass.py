@@ -0,0 +1,101 @@
+import asyncio
+import importlib
+
+try:
+    entity_states = importlib.import_module("utils.entity_states")
+    Person = importlib.import_module("utils.person").Person
+    ProfiledHass = importlib.import_module("utils.profiling").ProfiledHass
+except ModuleNotFoundError:
+    entity_states = importlib.import_module("entity_states")
+    Person = importlib.import_module("person").Person
+    ProfiledHass = importlib.import_module("profiling").ProfiledHass
+
+
+class AsyncHass(ProfiledHass):
+    """
+    Base class for apps that run on AppDaemon's event loop instead of a worker thread.
+    Callbacks are declared with `async def`, state reads and service calls are awaited, and
+    waits use `await self.sleep()` instead of `run_in` callback chains.
+
+    The sync helpers in `Utils` can't be used from the event loop (their HASS calls return
+    coroutines there), so this class provides awaitable versions. Both decide with the checks
+    in `entity_states`.
+    Example:
+        class Security(AsyncHass):
+            async def lock_front_door(self) -> None:
+                await self.command_and_confirm(self.front_door_lock, "lock/lock", "locked", 30)
+    """
+
+    async def is_entity_on(self, entity: str) -> bool:
+        """
+        Returns if the entity state is currently "on".
+        """
+
+        return entity_states.is_on(await self.get_state(entity))
+
+    async def is_entity_home(self, entity: str) -> bool:
+        """
+        Returns if the entity state is currently "home".
+        """
+
+        return entity_states.is_home(await self.get_state(entity))
+
+    async def sync_entities(self, correct_entity: str, entity_to_sync: str) -> None:
+        """
+        Syncs the states between two entities. `correct_entity` is the one to get state from.
+        `entity_to_sync` is the entity to set to the state of the `correct_entity`.
+        """
+
+        action = entity_states.get_sync_action(*await asyncio.gather(self.get_state(correct_entity),
+                                                                     self.get_state(entity_to_sync)))
+        if action is not None:
+            await getattr(self, action)(entity_to_sync)
+
+    async def command_and_confirm(self, entity: str, action: str, expected_state, timeout: float,
+                                  **kwargs) -> bool:
+        """
+        Calls the service and waits for the entity to change to the expected state. Returns True as
+        soon as it does (or if it's already there once the call returns), or False after `timeout`
+        seconds.
+        @param entity: The entity to watch. Also the service target, unless `entity_id` is passed.
+        @param action: The service to call, such as "lock/lock".
+        @param expected_state: The state to wait for, or a function returning if a state matches.
+        @param kwargs: Passed to the service.
+        Example:
+            locked = await self.command_and_confirm(self.front_door_lock, "lock/lock", "locked", 30)
+        """
+
+        matches = expected_state if callable(expected_state) else lambda state: state == expected_state
+        confirmed = asyncio.get_running_loop().create_future()
+
+        async def on_state_updated(entity: str, attribute: str, old: str, new: str, kwargs) -> None:
+            if not confirmed.done() and matches(new):
+                confirmed.set_result(True)
+
+        # Listens before calling, so a device responding right away isn't missed.
+        handle = await self.listen_state(on_state_updated, entity)
+        try:
+            kwargs.setdefault("entity_id", entity)
+            await self.call_service(action, **kwargs)
+            if confirmed.done() or matches(await self.get_state(entity)):
+                return True
+
+            timeout_task = asyncio.ensure_future(self.sleep(timeout))
+            await asyncio.wait({confirmed, timeout_task}, return_when=asyncio.FIRST_COMPLETED)
+            timeout_task.cancel()
+            return confirmed.done()
+        finally:
+            await self.cancel_listen_state(handle)
+
+    async def notify_users(self, message: str, person: Person, if_people_home: bool = False,
+                           group: str = None) -> None:
+        """
+        Queues the notification with `NotificationUtils`. Only touches memory, so it's safe to
+        call from the event loop and never waits on the notify service.
+        @param message: The message to send.
+        @param person: The person to notify. 'All' notifies everyone.
+        @param if_people_home: If True, the message will be sent if anyone is at home.
+        @param group: Notifications in the same group are coalesced into one digest.
+        """
+
+        self.get_app("notification_utils").notify_users(message, person, if_people_home, group)
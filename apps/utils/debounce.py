@@ -0,0 +1,101 @@
+from enum import Enum, auto
+import time
+
+# Seconds from a monotonic clock. Replaced by simulators running on a virtual clock.
+clock = time.monotonic
+
+
+class Edge(Enum):
+    """
+    When a burst of calls runs the callback.
+    """
+
+    Leading = auto()  # On the first call. Calls within the window after it are dropped.
+    Trailing = auto()  # Once the calls have stopped for the window, with the last call's arguments.
+
+
+class Debouncer:
+    """
+    Keeps the last time each key (such as a device or entity) was triggered, in memory, to drop
+    duplicate triggers within a window without reading state from HASS. Keys can also be tracked,
+    so any change to the entity's state counts as a trigger (such as a light being switched by hand).
+    Example:
+        self.debouncer = Debouncer(self, 2)
+        if not self.debouncer.ready(data["device_id"]):
+            return
+    """
+
+    def __init__(self, app, window: float, edge: Edge = Edge.Leading) -> None:
+        """
+        @param app: The app to listen (and schedule trailing calls) on.
+        @param window: Seconds that triggers of the same key are merged over.
+        """
+
+        self.app = app
+        self.window = window
+        self.edge = edge
+        self.triggered = {}  # key -> clock seconds
+        self.pending = {}  # key -> timer handle, for trailing calls
+
+    def track(self, entity: str):
+        """
+        Counts every change to the entity's state as a trigger of the entity. Returns the
+        `listen_state` handle (a coroutine, from async apps).
+        """
+
+        return self.app.listen_state(self.on_tracked_updated, entity)
+
+    def on_tracked_updated(self, entity: str, attribute: str, old: str, new: str, kwargs) -> None:
+        self.touch(entity)
+
+    def touch(self, key, age: float = 0) -> None:
+        """
+        Records the key as triggered now (or `age` seconds ago).
+        """
+
+        self.triggered[key] = clock() - age
+
+    def recently_triggered(self, key, window: float = None) -> bool:
+        """
+        Returns if the key was triggered within the window (or the debouncer's window, if not provided).
+        """
+
+        triggered = self.triggered.get(key)
+        return triggered is not None and clock() - triggered < (self.window if window is None else window)
+
+    def ready(self, key) -> bool:
+        """
+        Leading edge check. Returns False if the key was triggered within the window. Otherwise,
+        records the key as triggered and returns True.
+        """
+
+        if self.recently_triggered(key):
+            return False
+
+        self.touch(key)
+        return True
+
+    def call(self, key, callback, *args, **kwargs) -> None:
+        """
+        Calls the callback for the key, debounced on the debouncer's edge.
+        """
+
+        if self.edge == Edge.Leading:
+            if self.ready(key):
+                callback(*args, **kwargs)
+            return
+
+        self.touch(key)
+        handle = self.pending.pop(key, None)
+        if handle is not None:
+            self.app.cancel_timer(handle)
+        self.pending[key] = self.app.run_in(self.on_window_end, self.window, key=key, callback=callback,
+                                            args=args, callback_kwargs=kwargs)
+
+    def on_window_end(self, kwargs) -> None:
+        """
+        Once a key's calls have stopped for the window, runs the last one.
+        """
+
+        self.pending.pop(kwargs["key"], None)
+        kwargs["callback"](*kwargs["args"], **kwargs["callback_kwargs"])
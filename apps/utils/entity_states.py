@@ -0,0 +1,26 @@
+def is_on(state) -> bool:
+    """
+    Returns if the state is "on".
+    """
+
+    return state == "on"
+
+
+def is_home(state) -> bool:
+    """
+    Returns if the state is "home".
+    """
+
+    return state == "home"
+
+
+def get_sync_action(correct_state, state_to_sync) -> str:
+    """
+    Returns the action ("turn_on" or "turn_off") that brings an entity in `state_to_sync` in line
+    with one in `correct_state`, or None if they're already in sync. Shared by the sync helpers in
+    `Utils` and the async ones in `AsyncHass`, which each read the states their own way.
+    """
+
+    if is_on(correct_state) == is_on(state_to_sync):
+        return None
+    return "turn_on" if is_on(correct_state) else "turn_off"
@@ -0,0 +1,104 @@
+import threading
+
+
+class ListenerGroup:
+    """
+    A set of an app's listeners that only exist while its gates are open. A group is open while
+    every `require_on` entity is "on" and every `require_off` entity isn't (such as an automations boolean being
+    on and vacation mode being off). While a group is closed its listeners are unregistered, so
+    no callbacks are dispatched and no state is read for them. When it opens, every listener is
+    registered again in one step.
+    Example:
+        self.tv_triggers = ListenerGroup(self, require_on=[self.living_room_automations_on],
+                                         require_off=[self.vacation_mode], duration=30)
+        self.tv_triggers.listen_state(self.turn_on_lights, self.downstairs_tv_on, new="on", duration=15)
+    """
+
+    def __init__(self, app, require_on: list = (), require_off: list = (), duration: int = 0,
+                 on_change=None) -> None:
+        """
+        @param app: The app to listen on. Must depend on `utils`, which the gates' states are read from.
+        @param duration: Seconds a gate must hold its new state before the group opens or closes.
+        @param on_change: Called with whether the group is open, after it opens or closes.
+        """
+
+        self.app = app
+        self.require_on = list(require_on)
+        self.require_off = list(require_off)
+        self.on_change = on_change
+        self.lock = threading.Lock()
+        self.registrations = []  # [register, unregister, handle (while open)]
+
+        utils = app.get_app("utils")
+        self.states = {entity: utils.get_entity_state(entity) for entity in self.require_on + self.require_off}
+        self.is_open = self.get_is_open()
+        for entity in self.states:
+            app.listen_state(self.on_gate_updated, entity, duration=duration)
+
+    def get_is_open(self) -> bool:
+        return (all(self.states[entity] == "on" for entity in self.require_on) and
+                not any(self.states[entity] == "on" for entity in self.require_off))
+
+    def add(self, register, unregister) -> None:
+        """
+        Adds a listener to the group. `register()` sets it up and returns a handle, and
+        `unregister(handle)` removes it. It's registered right away if the group is open.
+        """
+
+        with self.lock:
+            registration = [register, unregister, register() if self.is_open else None]
+            self.registrations.append(registration)
+
+    def listen_state(self, callback, entity: str, **kwargs) -> None:
+        """
+        `listen_state` on the app while the group is open.
+        """
+
+        self.add(lambda: self.app.listen_state(callback, entity, **kwargs), self.app.cancel_listen_state)
+
+    def listen_event(self, callback, event: str, **kwargs) -> None:
+        """
+        `listen_event` on the app while the group is open.
+        """
+
+        self.add(lambda: self.app.listen_event(callback, event, **kwargs), self.app.cancel_listen_event)
+
+    def subscribe(self, source, callback, *args, **kwargs) -> None:
+        """
+        Subscribes the app to a router app with `subscribe`/`unsubscribe` (such as `presence` or
+        `zha_router`) while the group is open.
+        """
+
+        self.add(lambda: source.subscribe(self.app, callback, *args, **kwargs), source.unsubscribe)
+
+    def daily(self, timers, name: str, callback, at, **kwargs) -> None:
+        """
+        Runs a daily timer in the app's `TimerRegistry` while the group is open.
+        """
+
+        self.add(lambda: timers.daily(name, callback, at, **kwargs), lambda handle: timers.cancel(name))
+
+    def on_gate_updated(self, entity: str, attribute: str, old: str, new: str, kwargs) -> None:
+        """
+        On a gate updated, registers or unregisters every listener if the group opened or closed.
+        """
+
+        with self.lock:
+            self.states[entity] = new
+            is_open = self.get_is_open()
+            if is_open == self.is_open:
+                return
+
+            self.app.log("Gate {} is {}. {} {} listeners.".format(entity, new, "Registering" if is_open else
+                                                                   "Unregistering", len(self.registrations)))
+            for registration in self.registrations:
+                register, unregister, handle = registration
+                if is_open:
+                    registration[2] = register()
+                else:
+                    unregister(handle)
+                    registration[2] = None
+            self.is_open = is_open
+
+        if self.on_change is not None:
+            self.on_change(is_open)
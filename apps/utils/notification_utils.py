@@ -1,24 +1,168 @@
-import appdaemon.plugins.hass.hassapi as hass
-from person import Person
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import importlib
+import itertools
+import threading
+import time
 
+try:
+    Person = importlib.import_module("utils.person").Person
+    ProfiledHass = importlib.import_module("utils.profiling").ProfiledHass
+except ModuleNotFoundError:
+    Person = importlib.import_module("person").Person
+    ProfiledHass = importlib.import_module("profiling").ProfiledHass
 
-class NotificationUtils(hass.Hass):
+
+class NotificationUtils(ProfiledHass):
     """
-    Utilities used to notify users.
+    Utilities used to notify users. Notifications are queued and sent by a background
+    dispatcher, so callbacks never wait on the notify service:
+    - Each recipient is sent to concurrently.
+    - Notifications in the same `group` that arrive within `coalesce_seconds` of the first one
+      are sent as one digest (for example, several entities going unavailable at once).
+    - Each recipient is sent at most `rate_limit` notifications per `rate_period` seconds. Any
+      notifications over the limit are held and sent as one digest once the limit allows.
     """
 
-    def notify_users(self, message: str, person: Person, if_people_home: bool = False):
+    coalesce_seconds: float
+    rate_limit: int
+    rate_period: float
+
+    def initialize(self) -> None:
+        """
+        Starts the dispatcher.
         """
-        Notifies the provided user or users with the provided message.
+
+        self.presence = self.get_app("presence")
+        self.coalesce_seconds = self.args.get("coalesce_seconds", 30)
+        self.rate_limit = self.args.get("rate_limit", 5)
+        self.rate_period = self.args.get("rate_period", 300)
+
+        self.pending = {}  # (recipient, group) -> {"messages": [...], "due": monotonic seconds}
+        self.sent = {}  # recipient -> deque of the monotonic times recent notifications were sent
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.running = True
+        self.executor = ThreadPoolExecutor(max_workers=len(Person) - 1, thread_name_prefix="notify")
+        self.dispatcher = threading.Thread(target=self.dispatch, name="notification_dispatcher", daemon=True)
+        self.dispatcher.start()
+
+    def terminate(self) -> None:
+        """
+        Sends anything still queued (ignoring coalescing and rate limits) and stops the dispatcher.
+        """
+
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.dispatcher.join()
+        self.executor.shutdown(wait=True)
+
+    def notify_users(self, message: str, person: Person, if_people_home: bool = False, group: str = None):
+        """
+        Queues a notification for the provided user or users with the provided message.
         @param message: The message to send.
         @param person: The person to notify. 'All' notifies everyone.
         @param if_people_home: If True, the message will be sent if anyone is at home.
+        @param group: Notifications in the same group are coalesced into one digest.
+        """
+
+        if if_people_home and not self.presence.anyone_home():
+            return
+
+        recipients = [Person.Owen, Person.Allison] if person == Person.All else [person]
+        now = time.monotonic()
+        with self.condition:
+            for recipient in recipients:
+                key = (recipient, group if group is not None else next(self.sequence))
+                if key in self.pending:
+                    self.pending[key]["messages"].append(message)
+                else:
+                    delay = self.coalesce_seconds if group is not None else 0
+                    self.pending[key] = {"messages": [message], "due": now + delay}
+            self.condition.notify()
+
+    def dispatch(self) -> None:
+        """
+        Runs on the dispatcher thread. Waits for notifications to come due and hands them off
+        to be sent. An error is logged and the loop carries on, so one bad notification doesn't
+        stop every later one.
+        """
+
+        while True:
+            try:
+                with self.condition:
+                    if not self.running:
+                        ready = self.take_due(time.monotonic(), flush=True)
+                        break
+
+                    now = time.monotonic()
+                    ready = self.take_due(now)
+                    if not ready:
+                        next_due = min((pending["due"] for pending in self.pending.values()), default=None)
+                        self.condition.wait(None if next_due is None else max(next_due - now, 0))
+                        continue
+
+                for recipient, message in ready:
+                    self.executor.submit(self.send, recipient, message)
+            except Exception as error:
+                self.log(f"Unable to dispatch notifications: {error!r}", level="ERROR")
+                if not self.running:
+                    return
+                time.sleep(1)  # Don't spin if the error repeats.
+
+        for recipient, message in ready:
+            self.executor.submit(self.send, recipient, message)
+
+    def take_due(self, now: float, flush: bool = False) -> list:
         """
+        Removes the notifications due by `now` (or all of them, if flushing) and returns the
+        (recipient, message) pairs to send. When a recipient is over their rate limit, their due
+        notifications are held until it allows another, and are then sent as one digest. Must be
+        called holding `condition`.
+        """
+
+        due = {}
+        for key, pending in sorted(self.pending.items(), key=lambda item: item[1]["due"]):
+            if flush or pending["due"] <= now:
+                due.setdefault(key[0], []).append(key)
+
+        ready = []
+        for recipient, keys in due.items():
+            sent = self.sent.setdefault(recipient, deque())
+            while sent and sent[0] <= now - self.rate_period:
+                sent.popleft()
+
+            allowed = len(keys) if flush else self.rate_limit - len(sent)
+            if allowed <= 0:
+                for key in keys:
+                    self.pending[key]["due"] = sent[0] + self.rate_period
+                continue
 
-        send_notification = not if_people_home or self.anyone_home(person=True)
+            # Send the first notifications as they are and everything over the limit as one digest.
+            messages = [self.get_digest(self.pending.pop(key)["messages"]) for key in keys]
+            if len(messages) > allowed:
+                messages[allowed - 1:] = [self.get_digest(messages[allowed - 1:])]
+            for message in messages:
+                sent.append(now)
+                ready.append((recipient, message))
+
+        return ready
+
+    def send(self, recipient: Person, message: str) -> None:
+        """
+        Runs on a dispatch thread. Sends the notification to the recipient.
+        """
+
+        try:
+            self.notify(message, name=recipient.value)
+        except Exception as error:
+            self.log(f"Unable to notify {recipient.value}: {error}", level="WARNING")
+
+    @staticmethod
+    def get_digest(messages: list) -> str:
+        """
+        Combines the messages into one notification.
+        """
 
-        if send_notification and person == Person.All:
-            self.notify(message, name=Person.Owen.value)
-            self.notify(message, name=Person.Allison.value)
-        elif send_notification:
-            self.notify(message, name=person.value)
+        return messages[0] if len(messages) == 1 else "\n".join(messages)
@@ -0,0 +1,224 @@
+import asyncio
+from datetime import datetime
+from enum import Enum, auto
+import importlib
+import threading
+
+try:
+    ProfiledHass = importlib.import_module("utils.profiling").ProfiledHass
+except ModuleNotFoundError:
+    ProfiledHass = importlib.import_module("profiling").ProfiledHass
+
+
+class Household(Enum):
+    """
+    Who in the household is home.
+    """
+
+    Everyone = auto()
+    Someone = auto()
+    Nobody = auto()
+
+
+class PresenceChange:
+    """
+    A person's state changing, along with the household's occupancy after the change.
+    """
+
+    person: str
+    old: str
+    new: str
+    anyone_home: bool
+    household: Household
+    changed_at: datetime
+
+    def __init__(self, person: str, old: str, new: str, anyone_home: bool, household: Household,
+                 changed_at: datetime) -> None:
+        self.person = person
+        self.old = old
+        self.new = new
+        self.anyone_home = anyone_home
+        self.household = household
+        self.changed_at = changed_at
+
+    @property
+    def arrived(self) -> bool:
+        return self.new == "home"
+
+    @property
+    def left(self) -> bool:
+        return self.old == "home" and self.new != "home"
+
+
+class Presence(ProfiledHass):
+    """
+    Tracks who is home for every other app. Listens to each person once and keeps who is home,
+    when each person last arrived or left, and the household's occupancy in memory, so checks
+    don't read state from HASS. Apps subscribe to be called back (on their own thread) when a
+    person's state changes.
+    Example:
+        self.presence.subscribe(self, self.on_owen_home, self.owen, new="home", duration=300)
+    """
+
+    people: list
+    states: dict
+    changed_at: dict
+    home_count: int
+
+    def initialize(self) -> None:
+        """
+        Loads every person's state with one read and listens for changes.
+        """
+
+        self.people = self.args["people"]
+        self.subscriptions = {}
+        self.subscriptions_lock = threading.Lock()
+        self.next_handle = 0
+
+        people = self.get_state("person") or {}
+        self.states = {person: (people.get(person) or {}).get("state") for person in self.people}
+        self.changed_at = {person: self.parse_changed_at((people.get(person) or {}).get("last_changed"))
+                           for person in self.people}
+        self.home_count = sum(1 for state in self.states.values() if state == "home")
+
+        for person in self.people:
+            self.listen_state(self.on_person_state_updated, person)
+
+    def is_home(self, person: str) -> bool:
+        """
+        Returns if the person is currently home.
+        """
+
+        return self.states.get(person) == "home"
+
+    def anyone_home(self) -> bool:
+        """
+        Returns if anyone is home.
+        """
+
+        return self.home_count > 0
+
+    def everyone_home(self) -> bool:
+        """
+        Returns if everyone is home.
+        """
+
+        return self.home_count == len(self.people)
+
+    def household(self) -> Household:
+        """
+        Returns the household's current occupancy.
+        """
+
+        if self.everyone_home():
+            return Household.Everyone
+        return Household.Someone if self.anyone_home() else Household.Nobody
+
+    def seconds_since_changed(self, person: str) -> float:
+        """
+        Returns how many seconds it's been since the person last arrived or left.
+        """
+
+        changed_at = self.changed_at.get(person)
+        return (self.datetime(True) - changed_at).total_seconds() if changed_at else float("inf")
+
+    def subscribe(self, app, callback, person: str = None, new: str = None, old: str = None,
+                  duration: int = 0) -> int:
+        """
+        Calls back `callback(change: PresenceChange)` on the app's thread when the person (or anyone,
+        if not provided) changes from `old` to `new`. If `duration` is provided, only calls back if
+        the person's state hasn't changed again for that many seconds.
+        """
+
+        with self.subscriptions_lock:
+            self.next_handle += 1
+            self.subscriptions[self.next_handle] = {
+                "app": app, "callback": callback, "person": person, "new": new, "old": old,
+                "duration": duration, "timers": {},  # person -> (change, timer handle)
+            }
+            return self.next_handle
+
+    def unsubscribe(self, handle: int) -> None:
+        """
+        Stops calling back the subscription, including any pending duration callbacks.
+        """
+
+        with self.subscriptions_lock:
+            subscription = self.subscriptions.pop(handle, None)
+            pending = list(subscription["timers"].values()) if subscription else []
+            if subscription:
+                subscription["timers"].clear()
+
+        for change, timer in pending:
+            if timer is not None:
+                subscription["app"].cancel_timer(timer)
+
+    def on_person_state_updated(self, entity: str, attribute: str, old: str, new: str, kwargs) -> None:
+        """
+        On a person's state updated, updates the occupancy model and notifies subscribers.
+        """
+
+        was_home = self.states.get(entity) == "home"
+        self.states[entity] = new
+        self.changed_at[entity] = self.datetime(True)
+        self.home_count += (new == "home") - was_home
+
+        change = PresenceChange(entity, old, new, self.anyone_home(), self.household(), self.changed_at[entity])
+        with self.subscriptions_lock:
+            subscriptions = list(self.subscriptions.values())
+
+        for subscription in subscriptions:
+            if subscription["person"] not in (None, entity):
+                continue
+
+            # Like `listen_state` durations, any change cancels a pending callback.
+            with self.subscriptions_lock:
+                pending = subscription["timers"].pop(entity, None)
+            if pending is not None and pending[1] is not None:
+                subscription["app"].cancel_timer(pending[1])
+
+            if subscription["new"] not in (None, new) or subscription["old"] not in (None, old):
+                continue
+
+            is_async = asyncio.iscoroutinefunction(subscription["callback"])
+            # Marked pending before scheduling, so a callback that runs before the handle is
+            # stored still finds itself current.
+            with self.subscriptions_lock:
+                subscription["timers"][entity] = (change, None)
+            timer = subscription["app"].run_in(self.deliver_async if is_async else self.deliver,
+                                               subscription["duration"], subscription=subscription, change=change)
+            with self.subscriptions_lock:
+                if subscription["timers"].get(entity, (None,))[0] is change:
+                    subscription["timers"][entity] = (change, timer)
+
+    def take_pending(self, subscription: dict, change: PresenceChange) -> bool:
+        """
+        Removes the change from the subscription's pending callbacks. Returns False if it's no
+        longer pending, because a later change (or unsubscribing) cancelled it.
+        """
+
+        with self.subscriptions_lock:
+            if subscription["timers"].get(change.person, (None,))[0] is not change:
+                return False
+            del subscription["timers"][change.person]
+            return True
+
+    def deliver(self, kwargs) -> None:
+        """
+        Calls back the subscriber. Scheduled on the subscriber's app, so it runs on their thread.
+        """
+
+        if self.take_pending(kwargs["subscription"], kwargs["change"]):
+            kwargs["subscription"]["callback"](kwargs["change"])
+
+    async def deliver_async(self, kwargs) -> None:
+        """
+        Calls back an async subscriber on the event loop.
+        """
+
+        if self.take_pending(kwargs["subscription"], kwargs["change"]):
+            await kwargs["subscription"]["callback"](kwargs["change"])
+
+    @staticmethod
+    def parse_changed_at(last_changed: str) -> datetime:
+        return datetime.fromisoformat(last_changed) if last_changed else None
@@ -0,0 +1,53 @@
+import appdaemon.plugins.hass.hassapi as hass
+import importlib
+import json
+
+try:
+    PROFILE = importlib.import_module("utils.profiling").PROFILE
+except ModuleNotFoundError:
+    PROFILE = importlib.import_module("profiling").PROFILE
+
+
+class Profiler(hass.Hass):
+    """
+    Publishes the callback profiles collected by `ProfiledHass` apps. Per-app totals are set on a
+    sensor (which `ProfiledHass` listeners on every entity skip), and the full per-callback
+    histograms are written to a JSON file.
+    Also keeps the latest state of every entity, for the queueing delay of state callbacks that
+    don't get the full state.
+    """
+
+    sensor: str
+    path: str
+
+    def initialize(self) -> None:
+        """
+        Sets up publishing on an interval, and keeping the latest states.
+        """
+
+        self.sensor = self.args.get("sensor", "sensor.appdaemon_profile")
+        self.path = self.args.get("path")
+        PROFILE.published.add(self.sensor)
+        self.listen_state(self.on_state_updated, attribute="all")
+        self.run_every(self.publish, "now+60", int(self.args.get("interval", 60)))
+
+    async def on_state_updated(self, entity: str, attribute: str, old, new, kwargs) -> None:
+        """
+        Keeps the entity's latest state. Runs on the event loop, so it's usually kept before the
+        worker threads start the other callbacks for the same update.
+        """
+
+        PROFILE.states[entity] = new
+
+    def publish(self, kwargs) -> None:
+        """
+        Sets the sensor to the total number of profiled callback runs, with per-app totals as
+        attributes, and writes every callback's histograms to the JSON file (if configured).
+        """
+
+        apps = PROFILE.summarize_apps()
+        self.set_state(self.sensor, state=sum(app["callbacks"] for app in apps.values()), attributes=apps)
+
+        if self.path:
+            with open(self.path, "w") as file:
+                json.dump(PROFILE.summarize(), file, indent=2)
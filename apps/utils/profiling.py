@@ -0,0 +1,381 @@
+import appdaemon.plugins.hass.hassapi as hass
+import asyncio
+from contextvars import ContextVar
+from datetime import datetime, time, timedelta
+import functools
+import inspect
+import threading
+import time as wall_clock
+
+# Upper bounds (in milliseconds) of the histogram buckets.
+BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000, float("inf"))
+
+# The invocation currently running in this thread (or asyncio task), so state reads and service
+# calls made through any `ProfiledHass` app (including shared apps like `utils`) are attributed to it.
+current_invocation: ContextVar = ContextVar("current_invocation", default=None)
+# Set while a counted call is running, so calls it makes internally (e.g. `turn_on` calling
+# `call_service`) aren't counted twice.
+counted_call_running: ContextVar = ContextVar("counted_call_running", default=False)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram of durations in milliseconds.
+    """
+
+    def __init__(self) -> None:
+        self.buckets = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        """
+        Adds a duration (in milliseconds) to the histogram.
+        """
+
+        self.buckets[next(index for index, bound in enumerate(BUCKETS_MS) if value <= bound)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max, 3),
+            "buckets": {f"<={bound}": count for bound, count in zip(BUCKETS_MS, self.buckets)},
+        }
+
+
+class CallbackStats:
+    """
+    Aggregated stats for one callback.
+    """
+
+    def __init__(self) -> None:
+        self.wall_time = Histogram()
+        self.queue_delay = Histogram()
+        self.state_reads = 0
+        self.service_calls = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "wall_time": self.wall_time.to_dict(),
+            "queue_delay": self.queue_delay.to_dict(),
+            "state_reads": self.state_reads,
+            "service_calls": self.service_calls,
+        }
+
+
+class Invocation:
+    """
+    Counters for one running callback.
+    """
+
+    def __init__(self) -> None:
+        self.state_reads = 0
+        self.service_calls = 0
+
+
+class Profile:
+    """
+    Stats for every profiled callback, keyed by app and then callback name.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.callbacks = {}
+        self.published = set()  # Entities the profiler sets, which listeners on every entity skip.
+        self.states = {}  # The latest state of every entity, kept by the profiler.
+
+    def record(self, app: str, callback: str, wall_time: float, queue_delay: float, invocation: Invocation) -> None:
+        """
+        Adds one callback run. Durations are in milliseconds. `queue_delay` is None if it isn't known.
+        """
+
+        with self.lock:
+            stats = self.callbacks.setdefault(app, {}).setdefault(callback, CallbackStats())
+            stats.wall_time.add(wall_time)
+            if queue_delay is not None:
+                stats.queue_delay.add(max(0.0, queue_delay))
+            stats.state_reads += invocation.state_reads
+            stats.service_calls += invocation.service_calls
+
+    def summarize(self) -> dict:
+        """
+        Returns the histograms and counters for every app and callback.
+        """
+
+        with self.lock:
+            return {app: {callback: stats.to_dict() for callback, stats in callbacks.items()}
+                    for app, callbacks in self.callbacks.items()}
+
+    def summarize_apps(self) -> dict:
+        """
+        Returns totals for every app.
+        """
+
+        with self.lock:
+            summary = {}
+            for app, callbacks in self.callbacks.items():
+                runs = sum(stats.wall_time.count for stats in callbacks.values())
+                summary[app] = {
+                    "callbacks": runs,
+                    "mean_ms": round(sum(stats.wall_time.total for stats in callbacks.values()) / runs, 3)
+                    if runs else 0.0,
+                    "max_ms": round(max(stats.wall_time.max for stats in callbacks.values()), 3),
+                    "state_reads": sum(stats.state_reads for stats in callbacks.values()),
+                    "service_calls": sum(stats.service_calls for stats in callbacks.values()),
+                    "startup_ms": round(callbacks["initialize"].wall_time.total, 3)
+                    if "initialize" in callbacks else None,
+                }
+            return summary
+
+
+PROFILE = Profile()
+
+
+class ProfiledHass(hass.Hass):
+    """
+    Base class for apps that records, for every callback registered through `listen_state`,
+    `listen_event`, `run_daily`, `run_in`, `run_at` and `run_at_sunset`: wall time, state reads,
+    service calls and queueing delay (how late the callback started, not known for event
+    callbacks). `initialize` is recorded the same way, as the app's startup time. Results are
+    aggregated in `PROFILE` and published by the `profiler` app.
+
+    Profiling is only active when the `profiler` app is configured. Otherwise, callbacks and
+    calls pass straight through to AppDaemon.
+    """
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        """
+        Wraps each app's `initialize` so its startup is profiled like a callback.
+        """
+
+        super().__init_subclass__(**kwargs)
+        initialize = cls.__dict__.get("initialize")
+        if initialize is None:
+            return
+
+        if asyncio.iscoroutinefunction(initialize):
+            @functools.wraps(initialize)
+            async def profiled(self):
+                return await self.profile_callback(initialize.__get__(self))()
+        else:
+            @functools.wraps(initialize)
+            def profiled(self):
+                return self.profile_callback(initialize.__get__(self))()
+        cls.initialize = profiled
+
+    def is_profiling(self) -> bool:
+        """
+        Returns if the profiler app is configured.
+        """
+
+        return "profiler" in getattr(self, "app_config", {})
+
+    # Callback registration
+
+    def listen_state(self, callback, *args, **kwargs):
+        callback = self.profile_callback(callback, "state", kwargs.get("duration"))
+        if not args and "entity" not in kwargs and "entity_id" not in kwargs:
+            callback = self.skip_published(callback)
+        return super().listen_state(callback, *args, **kwargs)
+
+    def listen_event(self, callback, *args, **kwargs):
+        return super().listen_event(self.profile_callback(callback), *args, **kwargs)
+
+    def run_in(self, callback, delay, *args, **kwargs):
+        expected = wall_clock.monotonic() + float(delay)
+        return super().run_in(self.profile_callback(callback, "timer", lambda: wall_clock.monotonic() - expected),
+                              delay, *args, **kwargs)
+
+    def run_daily(self, callback, start, *args, **kwargs):
+        callback = self.profile_callback(callback, "scheduled", lambda now: self.get_daily_delay(now, start))
+        return super().run_daily(callback, start, *args, **kwargs)
+
+    def run_at(self, callback, start, *args, **kwargs):
+        callback = self.profile_callback(callback, "scheduled", lambda now: self.get_at_delay(now, start))
+        return super().run_at(callback, start, *args, **kwargs)
+
+    def run_at_sunset(self, callback, *args, **kwargs):
+        return super().run_at_sunset(self.profile_callback(callback), *args, **kwargs)
+
+    def skip_published(self, callback):
+        """
+        Wraps a listener on every entity so it isn't run for the entities the profiler publishes.
+        Otherwise each publish would run (and be profiled as) every such listener.
+        """
+
+        if not self.is_profiling():
+            return callback
+
+        if asyncio.iscoroutinefunction(callback):
+            @functools.wraps(callback)
+            async def skipping(entity, *args, **kwargs):
+                if entity not in PROFILE.published:
+                    return await callback(entity, *args, **kwargs)
+        else:
+            @functools.wraps(callback)
+            def skipping(entity, *args, **kwargs):
+                if entity not in PROFILE.published:
+                    return callback(entity, *args, **kwargs)
+        return skipping
+
+    def profile_callback(self, callback, kind: str = None, delay=None):
+        """
+        Wraps the callback so each run is recorded. `delay` is the state listener duration for
+        state callbacks, or a function returning how many seconds late a timer fired (given the
+        current AppDaemon time for `scheduled` timers). `functools.wraps` keeps the callback's
+        name and signature, which AppDaemon checks.
+        """
+
+        if not self.is_profiling():
+            return callback
+
+        app = self.name
+        name = getattr(callback, "__name__", repr(callback))
+        needs_now = ("state", "scheduled")
+
+        def get_queue_delay(args, now) -> float:
+            if kind == "timer":
+                return delay() * 1000
+            if kind == "scheduled":
+                return delay(now) * 1000
+            if kind == "state" and len(args) >= 4:
+                return self.get_state_delay(now, *args[:4], delay)
+            return None
+
+        if asyncio.iscoroutinefunction(callback):
+            @functools.wraps(callback)
+            async def profiled(*args, **kwargs):
+                queue_delay = get_queue_delay(args, await self.get_now() if kind in needs_now else None)
+                invocation = Invocation()
+                token = current_invocation.set(invocation)
+                started = wall_clock.perf_counter()
+                try:
+                    return await callback(*args, **kwargs)
+                finally:
+                    current_invocation.reset(token)
+                    PROFILE.record(app, name, (wall_clock.perf_counter() - started) * 1000, queue_delay, invocation)
+        else:
+            @functools.wraps(callback)
+            def profiled(*args, **kwargs):
+                queue_delay = get_queue_delay(args, self.get_now() if kind in needs_now else None)
+                invocation = Invocation()
+                token = current_invocation.set(invocation)
+                started = wall_clock.perf_counter()
+                try:
+                    return callback(*args, **kwargs)
+                finally:
+                    current_invocation.reset(token)
+                    PROFILE.record(app, name, (wall_clock.perf_counter() - started) * 1000, queue_delay, invocation)
+
+        return profiled
+
+    @staticmethod
+    def get_state_delay(now: datetime, entity: str, attribute: str, old, new, duration) -> float:
+        """
+        Milliseconds between the entity updating (plus any listener duration) and now, from the
+        `last_updated` of the new state. Listeners on every attribute (`attribute="all"`) get the
+        new state. For the others, it's the latest state the profiler has seen, if that's the
+        update the callback is for. Otherwise the delay isn't known.
+        """
+
+        state = new if attribute == "all" else PROFILE.states.get(entity)
+        if not isinstance(state, dict) or not state.get("last_updated"):
+            return None
+        if attribute is None and state.get("state") != new:
+            return None  # The profiler hasn't seen this update yet.
+        if attribute not in (None, "all") and state.get(attribute, state.get("attributes", {}).get(attribute)) != new:
+            return None
+
+        updated = datetime.fromisoformat(state["last_updated"]) + timedelta(seconds=float(duration or 0))
+        return (now - updated).total_seconds() * 1000
+
+    @staticmethod
+    def get_daily_delay(now: datetime, start) -> float:
+        """
+        Seconds between today's scheduled time and now.
+        """
+
+        if isinstance(start, str):
+            start = time.fromisoformat(start)
+        if not isinstance(start, time):
+            return 0.0
+
+        scheduled = now.replace(hour=start.hour, minute=start.minute, second=start.second,
+                                microsecond=start.microsecond)
+        if scheduled > now:
+            scheduled -= timedelta(days=1)
+        return (now - scheduled).total_seconds()
+
+    @staticmethod
+    def get_at_delay(now: datetime, start) -> float:
+        """
+        Seconds between the scheduled time and now.
+        """
+
+        if not isinstance(start, datetime):
+            return 0.0
+
+        if start.tzinfo is None:
+            now = now.replace(tzinfo=None)
+        return (now - start).total_seconds()
+
+    # Counted calls
+
+    def get_state(self, *args, **kwargs):
+        return self.count_call("state_reads", super().get_state, *args, **kwargs)
+
+    def anyone_home(self, *args, **kwargs):
+        return self.count_call("state_reads", super().anyone_home, *args, **kwargs)
+
+    def set_state(self, *args, **kwargs):
+        return self.count_call("service_calls", super().set_state, *args, **kwargs)
+
+    def call_service(self, *args, **kwargs):
+        return self.count_call("service_calls", super().call_service, *args, **kwargs)
+
+    def turn_on(self, *args, **kwargs):
+        return self.count_call("service_calls", super().turn_on, *args, **kwargs)
+
+    def turn_off(self, *args, **kwargs):
+        return self.count_call("service_calls", super().turn_off, *args, **kwargs)
+
+    def toggle(self, *args, **kwargs):
+        return self.count_call("service_calls", super().toggle, *args, **kwargs)
+
+    def notify(self, *args, **kwargs):
+        return self.count_call("service_calls", super().notify, *args, **kwargs)
+
+    def count_call(self, counter: str, function, *args, **kwargs):
+        """
+        Counts the call against the running callback (if any), then makes it. Calls made while
+        another counted call is running aren't counted.
+        """
+
+        invocation = current_invocation.get()
+        if invocation is None or counted_call_running.get():
+            return function(*args, **kwargs)
+
+        setattr(invocation, counter, getattr(invocation, counter) + 1)
+        token = counted_call_running.set(True)
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            counted_call_running.reset(token)
+
+        # From the event loop, AppDaemon returns a coroutine and the nested calls happen once it's awaited.
+        if inspect.iscoroutine(result):
+            return self.await_counted_call(result)
+        return result
+
+    @staticmethod
+    async def await_counted_call(coroutine):
+        token = counted_call_running.set(True)
+        try:
+            return await coroutine
+        finally:
+            counted_call_running.reset(token)
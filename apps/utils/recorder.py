@@ -0,0 +1,350 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+import importlib
+import json
+import math
+import mmap
+import os
+import threading
+
+try:
+    import numpy
+except ImportError:  # Optional. Queries return lists instead of arrays without it.
+    numpy = None
+
+try:
+    ProfiledHass = importlib.import_module("utils.profiling").ProfiledHass
+except ModuleNotFoundError:
+    ProfiledHass = importlib.import_module("profiling").ProfiledHass
+
+# Column name -> struct/array type code. Each record is one entry in every column.
+COLUMNS = {
+    "series": "H",  # Interned entity (or entity attribute) id.
+    "time": "d",  # Unix timestamp. Records are appended in time order, so this column is sorted.
+    "value": "d",  # The state as a number, or NaN if it isn't numeric.
+    "label": "i",  # Interned state string, or -1 if the state is numeric.
+}
+
+
+class Segment:
+    """
+    One day's records (or part of one, if the day outgrew a segment), as a memory-mapped file per
+    column. Files are sized for `capacity` records up front. Unused records have a time of 0,
+    so the number of records is found by searching the time column when a segment is opened.
+    """
+
+    def __init__(self, path: str, capacity: int = None) -> None:
+        """
+        Opens the segment at the path, creating it with room for `capacity` records if it doesn't exist.
+        """
+
+        self.path = path
+        self.maps = {}
+        for name, code in COLUMNS.items():
+            file_path = f"{path}.{name}"
+            if not os.path.exists(file_path):
+                with open(file_path, "wb") as file:
+                    file.truncate(capacity * array(code).itemsize)
+            with open(file_path, "r+b") as file:
+                self.maps[name] = mmap.mmap(file.fileno(), 0)
+        self.capacity = len(self.maps["time"]) // array("d").itemsize
+
+        with memoryview(self.maps["time"]).cast("d") as times:
+            low, high = 0, self.capacity
+            while low < high:  # First unused record.
+                middle = (low + high) // 2
+                if times[middle]:
+                    low = middle + 1
+                else:
+                    high = middle
+        self.count = low
+
+    @property
+    def last_time(self) -> float:
+        if not self.count:
+            return 0.0
+        with memoryview(self.maps["time"]).cast("d") as times:
+            return times[self.count - 1]
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def append(self, series: int, time: float, value: float, label: int) -> None:
+        for name, item in (("series", series), ("value", value), ("label", label), ("time", time)):
+            with memoryview(self.maps[name]).cast(COLUMNS[name]) as column:
+                column[self.count] = item
+        self.count += 1
+
+    def read(self, name: str, start: int = 0, end: int = None):
+        """
+        Returns a copy of the column's records in [start, end), as an array (or a list, without NumPy).
+        """
+
+        end = self.count if end is None else end
+        if numpy is not None:
+            return numpy.frombuffer(self.maps[name], dtype=COLUMNS[name], count=self.count)[start:end].copy()
+        with memoryview(self.maps[name]).cast(COLUMNS[name]) as column:
+            return column[start:end].tolist()
+
+    def find(self, start: float, end: float) -> tuple:
+        """
+        Returns the range of records with times in [start, end).
+        """
+
+        if numpy is not None:
+            times = numpy.frombuffer(self.maps["time"], dtype="d", count=self.count)
+            return int(times.searchsorted(start, "left")), int(times.searchsorted(end, "left"))
+        with memoryview(self.maps["time"]).cast("d") as times:
+            times = times[:self.count]
+            return bisect_left(times, start), bisect_left(times, end)
+
+    def flush(self) -> None:
+        for column in self.maps.values():
+            column.flush()
+
+    def close(self) -> None:
+        for column in self.maps.values():
+            column.close()
+
+
+class Recorder(ProfiledHass):
+    """
+    Records every change to the entities referenced in `apps.yaml` (and the attributes listed in
+    `attributes`) to local files, so apps can analyze history without querying HA's recorder.
+    Records are (series, time, value) rows appended to memory-mapped columnar segments, one
+    directory of segments per day. Queries scan the segments covering the range.
+    Example:
+        times, values = self.recorder.history("climate.main", start, attribute="current_temperature")
+        self.recorder.aggregate("sensor.bedroom_temperature_sensor_temperature", start)["mean"]
+    """
+
+    path: str
+    capacity: int
+
+    def initialize(self) -> None:
+        """
+        Loads the interned ids and listens for changes to the recorded entities.
+        """
+
+        self.path = self.args.get("path", os.path.join(os.path.dirname(os.path.abspath(__file__)), "recorder"))
+        self.capacity = int(self.args.get("segment_capacity", 262144))
+        self.attributes = self.args.get("attributes", {})
+        self.entities = self.get_app("utils").find_entities(getattr(self, "app_config", {})) | set(self.attributes)
+        self.lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+        self.strings_path = os.path.join(self.path, "strings.json")
+        strings = {"series": [], "labels": []}
+        if os.path.exists(self.strings_path):
+            with open(self.strings_path) as file:
+                strings = json.load(file)
+        self.series = {name: index for index, name in enumerate(strings["series"])}
+        self.labels = {label: index for index, label in enumerate(strings["labels"])}
+        self.label_names = list(strings["labels"])
+        self.segment = None
+        self.segment_day = None
+        self.readers = {}  # path -> Segment, for past segments
+
+        self.listen_state(self.on_state_updated, attribute="all")
+        # Records are in the page cache as soon as they're appended, so they survive AppDaemon
+        # crashing. Flushing only guards against the machine going down.
+        flush_interval = int(self.args.get("flush_interval", 600))
+        self.run_every(self.flush, f"now+{flush_interval}", flush_interval)
+
+    def terminate(self) -> None:
+        """
+        Writes every open segment to disk and closes it.
+        """
+
+        with self.lock:
+            for segment in [self.segment, *self.readers.values()]:
+                if segment is not None:
+                    segment.flush()
+                    segment.close()
+            self.segment = None
+            self.readers = {}
+
+    def flush(self, kwargs) -> None:
+        with self.lock:
+            if self.segment is not None:
+                self.segment.flush()
+
+    def on_state_updated(self, entity: str, attribute: str, old, new, kwargs) -> None:
+        """
+        On a recorded entity updated, appends its state (and recorded attributes) if they changed.
+        """
+
+        if entity not in self.entities or not new:
+            return
+
+        old = old or {}
+        time = self.get_timestamp(new)
+        with self.lock:
+            if new.get("state") != old.get("state"):
+                self.append(entity, time, new.get("state"))
+            for name in self.attributes.get(entity, []):
+                value = new.get("attributes", {}).get(name)
+                if value != old.get("attributes", {}).get(name):
+                    self.append(f"{entity}.{name}", time, value)
+
+    def get_timestamp(self, state: dict) -> float:
+        if state.get("last_updated"):
+            return datetime.fromisoformat(state["last_updated"]).timestamp()
+        return self.datetime().timestamp()
+
+    def append(self, series: str, time: float, state) -> None:
+        """
+        Appends a record to today's segment, rolling over to a new one at midnight or once it's full.
+        """
+
+        try:
+            value, label = float(state), -1
+        except (TypeError, ValueError):
+            value, label = math.nan, self.intern(self.labels, str(state))
+
+        day = datetime.fromtimestamp(time).date().isoformat()
+        if self.segment is None or self.segment_day != day or self.segment.full:
+            self.roll_over(day)
+        # Keeps the time column sorted if the clock goes backwards.
+        time = max(time, self.segment.last_time)
+        self.segment.append(self.intern(self.series, series), time, value, label)
+
+    def roll_over(self, day: str) -> None:
+        """
+        Closes the current segment and opens the next one with room for more records.
+        """
+
+        if self.segment is not None:
+            self.segment.flush()
+            self.segment.close()
+
+        directory = os.path.join(self.path, day)
+        os.makedirs(directory, exist_ok=True)
+        for index in range(1 << 16):
+            segment = Segment(os.path.join(directory, str(index)), self.capacity)
+            if not segment.full:
+                break
+            segment.close()
+        self.segment, self.segment_day = segment, day
+        self.readers.pop(segment.path, None)
+
+    def intern(self, table: dict, name: str) -> int:
+        """
+        Returns the id of the name, adding it (and saving the ids) if it's new.
+        """
+
+        if name not in table:
+            table[name] = len(table)
+            if table is self.labels:
+                self.label_names.append(name)
+            with open(self.strings_path, "w") as file:
+                json.dump({"series": list(self.series), "labels": self.label_names}, file)
+        return table[name]
+
+    def get_segments(self, start: datetime, end: datetime) -> list:
+        """
+        Returns the segments with records from the days in the range.
+        """
+
+        segments = []
+        days = sorted(day for day in os.listdir(self.path) if os.path.isdir(os.path.join(self.path, day)))
+        for day in days[bisect_left(days, start.date().isoformat()):bisect_right(days, end.date().isoformat())]:
+            directory = os.path.join(self.path, day)
+            for index in sorted(int(name.split(".")[0]) for name in os.listdir(directory) if name.endswith(".time")):
+                path = os.path.join(directory, str(index))
+                if self.segment is not None and path == self.segment.path:
+                    segments.append(self.segment)
+                else:
+                    if path not in self.readers:
+                        self.readers[path] = Segment(path)
+                    segments.append(self.readers[path])
+        return segments
+
+    def scan(self, series: str, start: datetime, end: datetime = None) -> tuple:
+        """
+        Returns the times, values and labels of the series' records in [start, end).
+        """
+
+        end = end or self.datetime()
+        times, values, labels = [], [], []
+        with self.lock:
+            series_id = self.series.get(series)
+            if series_id is None:
+                return self.to_arrays(times, values, labels)
+
+            for segment in self.get_segments(start, end):
+                first, last = segment.find(start.timestamp(), end.timestamp())
+                if first == last:
+                    continue
+                ids = segment.read("series", first, last)
+                if numpy is not None:
+                    matches = ids == series_id
+                    times.append(segment.read("time", first, last)[matches])
+                    values.append(segment.read("value", first, last)[matches])
+                    labels.append(segment.read("label", first, last)[matches])
+                else:
+                    matches = [index for index, value in enumerate(ids) if value == series_id]
+                    for column, name in ((times, "time"), (values, "value"), (labels, "label")):
+                        records = segment.read(name, first, last)
+                        column.extend(records[index] for index in matches)
+        return self.to_arrays(times, values, labels)
+
+    @staticmethod
+    def to_arrays(times: list, values: list, labels: list) -> tuple:
+        if numpy is None:
+            return times, values, labels
+        return tuple(numpy.concatenate(parts) if parts else numpy.empty(0, dtype=COLUMNS[name])
+                     for parts, name in ((times, "time"), (values, "value"), (labels, "label")))
+
+    def history(self, entity: str, start: datetime, end: datetime = None, attribute: str = None) -> tuple:
+        """
+        Returns the times and numeric values of the entity's state (or attribute) in the range.
+        Non-numeric values are NaN; use `states` for those.
+        """
+
+        times, values, labels = self.scan(self.get_series(entity, attribute), start, end)
+        return times, values
+
+    def states(self, entity: str, start: datetime, end: datetime = None, attribute: str = None) -> list:
+        """
+        Returns the (time, state) of every change to the entity's state (or attribute) in the range.
+        """
+
+        times, values, labels = self.scan(self.get_series(entity, attribute), start, end)
+        return [(float(time), self.label_names[label] if label >= 0 else float(value))
+                for time, value, label in zip(times, values, labels)]
+
+    def aggregate(self, entity: str, start: datetime, end: datetime = None, attribute: str = None) -> dict:
+        """
+        Returns the count, min, max and mean of the entity's numeric values in the range.
+        """
+
+        times, values = self.history(entity, start, end, attribute)
+        if numpy is not None:
+            values = values[~numpy.isnan(values)]
+            if not len(values):
+                return {"count": 0, "min": None, "max": None, "mean": None}
+            return {"count": int(len(values)), "min": float(values.min()), "max": float(values.max()),
+                    "mean": float(values.mean())}
+
+        values = [value for value in values if not math.isnan(value)]
+        if not values:
+            return {"count": 0, "min": None, "max": None, "mean": None}
+        return {"count": len(values), "min": min(values), "max": max(values), "mean": sum(values) / len(values)}
+
+    def time_in_state(self, entity: str, state: str, start: datetime, end: datetime = None) -> float:
+        """
+        Returns the seconds the entity spent in the state during the range, from its recorded changes.
+        Time before the first change in the range isn't counted.
+        """
+
+        end = end or self.datetime()
+        changes = self.states(entity, start, end)
+        boundaries = [time for time, value in changes] + [end.timestamp()]
+        return sum(boundaries[index + 1] - time for index, (time, value) in enumerate(changes) if value == state)
+
+    @staticmethod
+    def get_series(entity: str, attribute: str = None) -> str:
+        return entity if attribute is None else f"{entity}.{attribute}"
@@ -0,0 +1,92 @@
+from array import array
+import math
+
+
+class RollingWindow:
+    """
+    The last `capacity` samples of a numeric series (such as a temperature), kept in fixed-size
+    arrays used as a ring buffer, so memory is bounded however long the app runs. Running sums
+    are updated as each sample is added (and the oldest dropped), so the least-squares slope and
+    the mean cost O(1) per sample, and the EWMA is updated in place.
+    Example:
+        self.temperatures = RollingWindow(30, ewma_seconds=600)
+        self.temperatures.add(self.datetime().timestamp(), 71.5)
+        if self.temperatures.slope() * 3600 > 1:  # Rising more than a degree an hour.
+    """
+
+    def __init__(self, capacity: int, ewma_seconds: float = 600) -> None:
+        """
+        @param capacity: How many samples the slope and mean are calculated over.
+        @param ewma_seconds: Time constant of the EWMA. Samples this old have about a third of the weight.
+        """
+
+        self.capacity = capacity
+        self.ewma_seconds = ewma_seconds
+        self.times = array("d", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        self.count = 0
+        self.next = 0  # Index the next sample is written to.
+        self.ewma = None
+        self.last_time = None
+        # Sums for the slope, with times relative to `origin` so they stay small enough to be precise.
+        self.origin = None
+        self.sum_t = self.sum_v = self.sum_tt = self.sum_tv = 0.0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, time: float, value: float) -> None:
+        """
+        Adds a sample taken at the time (in seconds), dropping the oldest if the window is full.
+        """
+
+        if self.origin is None:
+            self.origin = time
+        if self.count == self.capacity:
+            self.update_sums(self.times[self.next], self.values[self.next], -1)
+        else:
+            self.count += 1
+        self.times[self.next] = time
+        self.values[self.next] = value
+        self.update_sums(time, value, 1)
+        self.next = (self.next + 1) % self.capacity
+        if self.next == 0:
+            self.rebase()
+
+        if self.ewma is None:
+            self.ewma = value
+        else:
+            weight = 1 - math.exp(-max(0.0, time - self.last_time) / self.ewma_seconds)
+            self.ewma += weight * (value - self.ewma)
+        self.last_time = time
+
+    def update_sums(self, time: float, value: float, sign: int) -> None:
+        time -= self.origin
+        self.sum_t += sign * time
+        self.sum_v += sign * value
+        self.sum_tt += sign * time * time
+        self.sum_tv += sign * time * value
+
+    def rebase(self) -> None:
+        """
+        Recalculates the sums relative to the oldest sample. Runs once per `capacity` samples, so
+        rounding errors from adding and removing samples don't build up.
+        """
+
+        self.origin = min(self.times[:self.count])
+        self.sum_t = self.sum_v = self.sum_tt = self.sum_tv = 0.0
+        for index in range(self.count):
+            self.update_sums(self.times[index], self.values[index], 1)
+
+    def mean(self) -> float:
+        return self.sum_v / self.count if self.count else None
+
+    def slope(self) -> float:
+        """
+        Returns the least-squares slope of the samples in units per second, or 0 with fewer than two samples.
+        """
+
+        denominator = self.count * self.sum_tt - self.sum_t * self.sum_t
+        if self.count < 2 or denominator <= 0:
+            return 0.0
+        return (self.count * self.sum_tv - self.sum_t * self.sum_v) / denominator
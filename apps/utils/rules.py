@@ -0,0 +1,204 @@
+from enum import IntEnum
+import importlib
+
+try:
+    ListenerGroup = importlib.import_module("utils.gates").ListenerGroup
+    ProfiledHass = importlib.import_module("utils.profiling").ProfiledHass
+    TimeWindows = importlib.import_module("utils.time_windows").TimeWindows
+except ModuleNotFoundError:
+    ListenerGroup = importlib.import_module("gates").ListenerGroup
+    ProfiledHass = importlib.import_module("profiling").ProfiledHass
+    TimeWindows = importlib.import_module("time_windows").TimeWindows
+
+
+class Cost(IntEnum):
+    """
+    How expensive a condition is to check. Conditions are checked cheapest first.
+    """
+
+    Window = 0  # A bit test.
+    Memory = 1  # Kept in memory, such as presence or the triggering state.
+    State = 2  # An entity's state. Every state a rule needs is read together, in one snapshot.
+
+
+class Condition:
+    """
+    A compiled condition: how much it costs and how to check it.
+    """
+
+    cost: Cost
+    entity: str
+
+    def __init__(self, cost: Cost, test, entity: str = None) -> None:
+        self.cost = cost
+        self.test = test  # state -> bool for state conditions, () -> bool otherwise.
+        self.entity = entity
+
+
+class Rule:
+    """
+    A compiled rule. Conditions are sorted cheapest first.
+    """
+
+    name: str
+    conditions: list
+    actions: list
+
+    def __init__(self, name: str, conditions: list, actions: list) -> None:
+        self.name = name
+        self.conditions = sorted(conditions, key=lambda condition: condition.cost)
+        self.actions = actions
+
+
+class Rules(ProfiledHass):
+    """
+    Automations declared in `apps.yaml` instead of Python. Each rule has triggers, conditions
+    and actions:
+        - name: dining_room_lights_at_lunch
+          gates: {require_off: [input_boolean.mode_guest]}  # Optional. See `ListenerGroup`.
+          triggers:
+            - {entity: switch.office_lights, new: "off", duration: 30}
+          conditions:
+            - {window: lunch}  # Any of the windows (declared under `windows`) is active.
+            - {person: person.owen, state: home}
+            - {entity: switch.dining_room_lights, not_state: "on"}  # Or `state:`.
+          actions:
+            - {turn_on: switch.dining_room_lights}  # Or `turn_off:`.
+    Rules are compiled at startup into an index from each trigger to its rules, so an event only
+    evaluates the rules triggered by it. Conditions are reordered cheapest first (time windows,
+    then presence and the triggering state, then state reads), so most events are rejected
+    without reading state. A rule's triggers are only listened to while its gates are open, so
+    rules switched off by a mode cost nothing.
+    """
+
+    windows: TimeWindows
+
+    def initialize(self) -> None:
+        """
+        Compiles the rules and listens for their triggers.
+        """
+
+        self.presence = self.get_app("presence")
+        self.utils = self.get_app("utils")
+        self.windows = TimeWindows(self)
+        for name, (start, end) in self.args.get("windows", {}).items():
+            self.windows.add(name, start, end)
+
+        self.index = {}  # (gates, entity, new, old, duration) -> [rule]
+        for config in self.args.get("rules", []):
+            try:
+                rule = self.compile_rule(config)
+            except ValueError as error:
+                self.log(f"Skipping rule: {error}", level="ERROR")
+                continue
+            gates = config.get("gates", {})
+            gates = (tuple(gates.get("require_on", [])), tuple(gates.get("require_off", [])),
+                     gates.get("duration", 0))
+            for trigger in config["triggers"]:
+                key = (gates, trigger["entity"], trigger.get("new"), trigger.get("old"), trigger.get("duration"))
+                self.index.setdefault(key, []).append(rule)
+
+        self.groups = {}  # gates -> ListenerGroup
+        for key in self.index:
+            (require_on, require_off, gate_duration), entity, new, old, duration = key
+            if key[0] not in self.groups:
+                self.groups[key[0]] = ListenerGroup(self, require_on=require_on, require_off=require_off,
+                                                    duration=gate_duration)
+            # Only the fields that are set are passed. AppDaemon parses any `duration` it's given.
+            kwargs = {name: value for name, value in (("new", new), ("old", old), ("duration", duration))
+                      if value is not None}
+            self.groups[key[0]].listen_state(self.on_trigger, entity, trigger=key, **kwargs)
+
+    def compile_rule(self, config: dict) -> Rule:
+        """
+        Compiles the rule's conditions and actions. Raises a `ValueError` naming the rule if it's
+        misconfigured.
+        """
+
+        for condition in config.get("conditions", []):
+            for window in self.get_windows(condition):
+                if window not in self.windows.windows:
+                    raise ValueError("Rule {} uses undeclared window {}.".format(config["name"], window))
+            if "window" in condition or "person" in condition:
+                continue
+            if "entity" not in condition or ("state" not in condition and "not_state" not in condition):
+                raise ValueError("Rule {} has condition {}, which needs an entity and a state or not_state."
+                                 .format(config["name"], condition))
+
+        return Rule(config["name"], [self.compile_condition(condition) for condition in config.get("conditions", [])],
+                    [self.compile_action(action) for action in config["actions"]])
+
+    @staticmethod
+    def get_windows(condition: dict) -> list:
+        windows = condition.get("window", [])
+        return [windows] if isinstance(windows, str) else windows
+
+    def compile_condition(self, condition: dict) -> Condition:
+        """
+        Compiles the condition into a check, along with its cost.
+        """
+
+        if "window" in condition:
+            windows = self.get_windows(condition)
+            return Condition(Cost.Window, lambda: self.windows.is_active(*windows))
+
+        if "person" in condition:
+            person, home = condition["person"], condition.get("state", "home") == "home"
+            return Condition(Cost.Memory, lambda: self.presence.is_home(person) == home)
+
+        if "state" in condition:
+            expected = str(condition["state"])
+            return Condition(Cost.State, lambda state: state == expected, condition["entity"])
+
+        unexpected = str(condition["not_state"])
+        return Condition(Cost.State, lambda state: state != unexpected, condition["entity"])
+
+    @staticmethod
+    def compile_action(action: dict) -> tuple:
+        """
+        Compiles the action into the batch method to call and the entity to call it with.
+        """
+
+        if "turn_on" in action:
+            return "turn_on", action["turn_on"]
+        return "turn_off", action["turn_off"]
+
+    def on_trigger(self, entity: str, attribute: str, old: str, new: str, kwargs) -> None:
+        """
+        On a trigger, runs the actions of every rule indexed on it whose conditions pass.
+        """
+
+        rules = [rule for rule in self.index[kwargs["trigger"]] if self.check(rule, entity, new)]
+        if not rules:
+            return
+
+        with self.utils.batch() as batch:
+            for rule in rules:
+                self.log("{} triggered by {} ({}).".format(rule.name, entity, new))
+                for method, action_entity in rule.actions:
+                    getattr(batch, method)(action_entity)
+
+    def check(self, rule: Rule, entity: str, new: str) -> bool:
+        """
+        Returns if every condition of the rule passes, checking the cheapest first. The states
+        still needed once the cheaper conditions have passed are read in one snapshot. The
+        triggering entity's state is the state it changed to, so it's never read.
+        """
+
+        for index, condition in enumerate(rule.conditions):
+            if condition.cost == Cost.State:
+                break
+            if not condition.test():
+                return False
+        else:
+            return True
+
+        conditions = rule.conditions[index:]
+        if not all(condition.test(new) for condition in conditions if condition.entity == entity):
+            return False
+
+        conditions = [condition for condition in conditions if condition.entity != entity]
+        if not conditions:
+            return True
+        with self.utils.snapshot(*{condition.entity for condition in conditions}):
+            return all(condition.test(self.utils.get_entity_state(condition.entity)) for condition in conditions)
@@ -0,0 +1,113 @@
+from collections import deque
+
+
+class SetpointWriter:
+    """
+    Coalesces writes of a thermostat's setpoint. Several paths can request a setpoint within
+    seconds of each other (such as presence changing the thermostat state, the day/night
+    schedule and zone automations). The first request opens a settle window of `settle`
+    seconds, later requests in the window replace it, and only the last one is written when the
+    window closes. Requests matching the setpoint last confirmed by the thermostat (or already
+    sent to it) aren't written at all. A write the thermostat doesn't confirm within
+    `confirm_timeout` seconds (such as one dropped by the cloud) is forgotten, so it can be sent
+    again. Every request that isn't written is kept in `suppressed` and logged.
+    Example:
+        self.setpoints = SetpointWriter(self, "climate.main", settle=5)
+        self.setpoints.request(68, "Away")
+    """
+
+    def __init__(self, app, entity: str, settle: float = 5, confirmed: float = None, history: int = 100,
+                 confirm_timeout: float = 120) -> None:
+        """
+        @param app: The app to listen (and write) on.
+        @param settle: Seconds requests are collected over before the last one is written.
+        @param confirmed: The thermostat's current setpoint.
+        @param history: How many suppressed requests to keep.
+        @param confirm_timeout: Seconds to wait for the thermostat to report a write before forgetting it.
+        """
+
+        self.app = app
+        self.entity = entity
+        self.settle = settle
+        self.confirmed = confirmed
+        self.sent = None  # Written, but not yet confirmed by the thermostat.
+        self.desired = None  # (temperature, reason) waiting on the settle window.
+        self.settle_handler = None
+        self.confirm_timeout = confirm_timeout
+        self.confirm_handler = None
+        self.suppressed = deque(maxlen=history)  # (time, temperature, reason, why)
+
+        app.listen_state(self.on_setpoint_updated, entity, attribute="temperature")
+
+    def request(self, temperature: float, reason: str = None) -> None:
+        """
+        Asks for the setpoint. It's written once the settle window closes, unless a later request replaces it.
+        """
+
+        if self.desired is not None:
+            self.suppress(*self.desired, "replaced")
+        elif temperature == self.get_expected():
+            self.suppress(temperature, reason, "unchanged")
+            return
+
+        self.desired = (temperature, reason)
+        if self.settle_handler is None:
+            self.settle_handler = self.app.run_in(self.on_settled, self.settle)
+
+    def on_settled(self, kwargs) -> None:
+        """
+        Once the settle window closes, writes the last requested setpoint if it's a change.
+        """
+
+        self.settle_handler = None
+        temperature, reason = self.desired
+        self.desired = None
+        if temperature == self.get_expected():
+            self.suppress(temperature, reason, "unchanged")
+            return
+
+        self.app.log(f"Setting {self.entity} to {temperature} ({reason}).")
+        self.sent = temperature
+        self.cancel_confirm_timeout()
+        self.confirm_handler = self.app.run_in(self.on_confirm_timeout, self.confirm_timeout)
+        self.app.call_service("climate/set_temperature", entity_id=self.entity, temperature=temperature)
+
+    def on_confirm_timeout(self, kwargs) -> None:
+        """
+        If the thermostat never reported the last write, forgets it. Requests are compared
+        against the confirmed setpoint again, so the same setpoint can be sent again.
+        """
+
+        self.confirm_handler = None
+        if self.sent is not None:
+            self.app.log(f"{self.entity} didn't confirm {self.sent} within {self.confirm_timeout} seconds.",
+                         level="WARNING")
+            self.sent = None
+
+    def cancel_confirm_timeout(self) -> None:
+        if self.confirm_handler is not None:
+            self.app.cancel_timer(self.confirm_handler)
+            self.confirm_handler = None
+
+    def on_setpoint_updated(self, entity: str, attribute: str, old: str, new: str, kwargs) -> None:
+        """
+        On the thermostat reporting its setpoint (whether from a write or changed by hand), confirms it.
+        """
+
+        try:
+            self.confirmed = float(new)
+        except (TypeError, ValueError):
+            return
+        self.sent = None
+        self.cancel_confirm_timeout()
+
+    def get_expected(self) -> float:
+        """
+        Returns the setpoint the thermostat has (or will have, once the last write is confirmed).
+        """
+
+        return self.sent if self.sent is not None else self.confirmed
+
+    def suppress(self, temperature: float, reason: str, why: str) -> None:
+        self.suppressed.append((self.app.datetime(), temperature, reason, why))
+        self.app.log(f"Not setting {self.entity} to {temperature} ({reason}): {why}.")
@@ -0,0 +1,137 @@
+import importlib
+import json
+import os
+import sqlite3
+import threading
+
+try:
+    ProfiledHass = importlib.import_module("utils.profiling").ProfiledHass
+except ModuleNotFoundError:
+    ProfiledHass = importlib.import_module("profiling").ProfiledHass
+
+
+class StateStore(ProfiledHass):
+    """
+    Persists what apps need to warm start to a local SQLite file:
+    - The last known state of the entities apps use (`track`).
+    - Values apps save for themselves (`put`), such as in-flight retries and cooldowns.
+    Reads and writes only touch memory. Changes are written to disk every `flush_interval`
+    seconds and when AppDaemon stops.
+    """
+
+    path: str
+    flush_interval: int
+
+    def initialize(self) -> None:
+        """
+        Opens the database and loads everything saved in it.
+        """
+
+        self.path = self.args.get("path", os.path.join(os.path.dirname(os.path.abspath(__file__)), "state_store.db"))
+        self.flush_interval = int(self.args.get("flush_interval", 30))
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        # Flushes are appended to the log without waiting on the disk. A power loss can lose the
+        # last flush, but never corrupts the file.
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS entities (entity TEXT PRIMARY KEY, state TEXT)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS app_values "
+                                    "(app TEXT, key TEXT, value TEXT, PRIMARY KEY (app, key))")
+
+        self.entities = {entity: json.loads(state)
+                         for entity, state in self.connection.execute("SELECT entity, state FROM entities")}
+        self.values = {(app, key): json.loads(value)
+                       for app, key, value in self.connection.execute("SELECT app, key, value FROM app_values")}
+        self.tracked = set()
+        self.dirty_entities = set()
+        self.dirty_values = set()
+
+        self.listen_state(self.on_state_updated, attribute="all")
+        self.run_every(self.flush, f"now+{self.flush_interval}", self.flush_interval)
+
+    def terminate(self) -> None:
+        """
+        Writes any pending changes and closes the database.
+        """
+
+        self.flush({})
+        self.connection.close()
+
+    def track(self, entities: set) -> None:
+        """
+        Persists the state of the entities from now on.
+        """
+
+        with self.lock:
+            self.tracked |= set(entities)
+
+    def get_entity_states(self, entities: set) -> dict:
+        """
+        Returns the last persisted state of each entity (that has one).
+        """
+
+        with self.lock:
+            return {entity: self.entities[entity] for entity in entities if entity in self.entities}
+
+    def set_entity_states(self, states: dict) -> None:
+        """
+        Updates the persisted state of the tracked entities.
+        """
+
+        with self.lock:
+            for entity in self.tracked & set(states):
+                if self.entities.get(entity) != states[entity]:
+                    self.entities[entity] = states[entity]
+                    self.dirty_entities.add(entity)
+
+    def get(self, app: str, key: str, default=None):
+        """
+        Returns the value the app saved under the key.
+        """
+
+        with self.lock:
+            return self.values.get((app, key), default)
+
+    def put(self, app: str, key: str, value) -> None:
+        """
+        Saves the value (anything JSON serializable) for the app under the key. None deletes it.
+        """
+
+        with self.lock:
+            if value is None:
+                self.values.pop((app, key), None)
+            else:
+                self.values[(app, key)] = value
+            self.dirty_values.add((app, key))
+
+    def on_state_updated(self, entity: str, attribute: str, old, new, kwargs) -> None:
+        """
+        On a tracked entity updated, marks it to be written.
+        """
+
+        if entity in self.tracked:
+            self.set_entity_states({entity: new})
+
+    def flush(self, kwargs) -> None:
+        """
+        Writes every changed entity state and value to disk in one transaction.
+        """
+
+        with self.lock:
+            entities = [(entity, json.dumps(self.entities[entity])) for entity in self.dirty_entities]
+            values = [(app, key, json.dumps(self.values[(app, key)])) for app, key in self.dirty_values
+                      if (app, key) in self.values]
+            deleted = [key for key in self.dirty_values if key not in self.values]
+            self.dirty_entities.clear()
+            self.dirty_values.clear()
+
+        if not entities and not values and not deleted:
+            return
+
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO entities (entity, state) VALUES (?, ?)", entities)
+            self.connection.executemany("INSERT OR REPLACE INTO app_values (app, key, value) VALUES (?, ?, ?)",
+                                        values)
+            self.connection.executemany("DELETE FROM app_values WHERE app = ? AND key = ?", deleted)
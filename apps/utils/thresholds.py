@@ -0,0 +1,130 @@
+from enum import Enum, auto
+
+
+class Crossing(Enum):
+    """
+    The directions a threshold can be crossed in.
+    """
+
+    Rising = auto()
+    Falling = auto()
+    Both = auto()
+
+
+class ThresholdListener:
+    """
+    Listens to a numeric state or attribute and calls back only when it crosses a threshold.
+    Each value is parsed once and the last value is kept, so high-frequency attributes (such as
+    sun elevation) cost one comparison per update. Crossings within `window` seconds of the
+    last callback are merged: if the value ends the window on the other side of the threshold
+    than last reported, the callback runs once at the end of the window.
+
+    The callback has the `listen_state` signature. `old` and `new` are the parsed values at the
+    last reported crossing and now.
+    Example:
+        ThresholdListener(self, self.set_light_level, "sun.sun", 10, attribute="elevation", window=300)
+    """
+
+    def __init__(self, app, callback, entity: str, threshold: float, attribute: str = None,
+                 crossing: Crossing = Crossing.Both, inclusive: bool = True, window: float = 0, parser=float,
+                 **kwargs) -> None:
+        """
+        @param app: The app to listen (and call back) on.
+        @param threshold: Values above (or equal to, if `inclusive`) the threshold are above it.
+        @param crossing: Which direction of crossing to call back on.
+        @param window: Seconds to merge crossings over. 0 calls back on every crossing.
+        @param parser: Converts the raw state to a number.
+        """
+
+        self.app = app
+        self.callback = callback
+        self.entity = entity
+        self.attribute = attribute
+        self.threshold = threshold
+        self.crossing = crossing
+        self.inclusive = inclusive
+        self.window = window
+        self.parser = parser
+        self.kwargs = kwargs
+        self.value = None
+        self.is_above = None
+        self.reported_value = None
+        self.reported_above = None
+        self.window_handler = None
+
+        if attribute is None:
+            self.listen_handler = app.listen_state(self.on_value_updated, entity)
+        else:
+            self.listen_handler = app.listen_state(self.on_value_updated, entity, attribute=attribute)
+
+    def cancel(self) -> None:
+        """
+        Stops listening.
+        """
+
+        self.app.cancel_listen_state(self.listen_handler)
+        if self.window_handler is not None:
+            self.app.cancel_timer(self.window_handler)
+            self.window_handler = None
+
+    def on_value_updated(self, entity: str, attribute: str, old: str, new: str, kwargs) -> None:
+        """
+        On the value updated, checks if it crossed the threshold. The first update only has the
+        previous value to compare against, so that's parsed too. Until a value has been parsed,
+        the first one that is becomes the side last reported, without calling back.
+        """
+
+        if self.is_above is None:
+            self.set_value(old)
+            self.reported_value, self.reported_above = self.value, self.is_above
+
+        was_above = self.is_above
+        if not self.set_value(new) or self.is_above == was_above:
+            return
+        if self.reported_above is None:
+            self.reported_value, self.reported_above = self.value, self.is_above
+            return
+
+        if self.window_handler is None:
+            self.report()
+
+    def on_window_end(self, kwargs) -> None:
+        """
+        At the end of the window, reports the crossing if the value ended up on the other side.
+        """
+
+        self.window_handler = None
+        self.report()
+
+    def set_value(self, raw) -> bool:
+        """
+        Parses and stores the value. Returns False if it couldn't be parsed (such as "unavailable").
+        """
+
+        try:
+            self.value = self.parser(raw)
+        except (TypeError, ValueError):
+            return False
+
+        self.is_above = self.value >= self.threshold if self.inclusive else self.value > self.threshold
+        return True
+
+    def report(self) -> None:
+        """
+        Calls back if the value is on the other side of the threshold than last reported and the
+        crossing is in a direction being listened for, then starts a new window.
+        """
+
+        if self.is_above is None or self.is_above == self.reported_above:
+            return
+
+        old = self.reported_value
+        self.reported_value, self.reported_above = self.value, self.is_above
+        if self.crossing == Crossing.Rising and not self.is_above:
+            return
+        if self.crossing == Crossing.Falling and self.is_above:
+            return
+
+        if self.window:
+            self.window_handler = self.app.run_in(self.on_window_end, self.window)
+        self.callback(self.entity, self.attribute, old, self.value, self.kwargs)
@@ -0,0 +1,70 @@
+from datetime import time
+import importlib
+
+try:
+    TimerRegistry = importlib.import_module("utils.timers").TimerRegistry
+except ModuleNotFoundError:
+    TimerRegistry = importlib.import_module("timers").TimerRegistry
+
+
+class TimeWindows:
+    """
+    Named daily time windows for an app. Each window is parsed once and given a bit in a mask of
+    the windows that are currently active. A timer at each window boundary sets or clears its bit,
+    so checking a window is a bit test, with no parsing or clock reads.
+
+    A window starts at `start` (inclusive) and ends at `end` (exclusive). If `end` is earlier
+    than `start`, the window crosses midnight. Boundary timers run before any other timer in
+    the app's `TimerRegistry` due at the same time, so a timer at a window's start sees the
+    window as active.
+    Example:
+        self.windows = TimeWindows(self)
+        self.windows.add("late", "22:00:00", "01:00:00")
+        if self.windows.is_active("late"):
+    """
+
+    def __init__(self, app, timers: TimerRegistry = None) -> None:
+        self.app = app
+        self.timers = timers or TimerRegistry(app)
+        self.windows = {}  # name -> (bit, start, end)
+        self.mask = 0
+
+    def add(self, name: str, start, end) -> None:
+        """
+        Adds the window, or moves it if it already exists. Times are `time`s or "HH:MM:SS".
+        """
+
+        bit = self.windows[name][0] if name in self.windows else 1 << len(self.windows)
+        start, end = self.timers.parse_time(start), self.timers.parse_time(end)
+        self.windows[name] = (bit, start, end)
+
+        self.set_active(bit, self.contains(start, end, self.app.time()))
+        self.timers.daily(f"{name}_start", self.on_boundary, start, priority=0, bit=bit, active=True)
+        self.timers.daily(f"{name}_end", self.on_boundary, end, priority=0, bit=bit, active=False)
+
+    def is_active(self, *names: str) -> bool:
+        """
+        Returns if any of the named windows is active.
+        """
+
+        return any(self.mask & self.windows[name][0] for name in names)
+
+    def on_boundary(self, kwargs) -> None:
+        """
+        At a window's start or end, sets or clears its bit.
+        """
+
+        self.set_active(kwargs["bit"], kwargs["active"])
+
+    def set_active(self, bit: int, active: bool) -> None:
+        self.mask = self.mask | bit if active else self.mask & ~bit
+
+    @staticmethod
+    def contains(start: time, end: time, now: time) -> bool:
+        """
+        Returns if the time is within the window.
+        """
+
+        if start <= end:
+            return start <= now < end
+        return now >= start or now < end
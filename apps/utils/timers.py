@@ -0,0 +1,136 @@
+from datetime import datetime, time, timedelta
+import heapq
+import itertools
+
+
+class TimerRegistry:
+    """
+    Daily timers for an app, keyed by name. Only the soonest timer is scheduled with AppDaemon;
+    the rest are kept in a heap of upcoming fire times. Rescheduling a timer replaces it in one
+    step (there's never a moment where it's cancelled but not re-created) and only touches
+    AppDaemon's scheduler if the soonest fire time changes.
+
+    Callbacks have the `run_daily` signature. Timers due at the same time run in `priority` order
+    (lowest first), then in the order they were scheduled.
+    Example:
+        self.timers = TimerRegistry(self)
+        self.timers.daily("day", self.on_schedule_time, "06:00:00")
+        self.timers.reschedule("day", "06:30:00")
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self.timers = {}  # name -> {"callback", "time", "kwargs", "priority", "fire_at", "version"}
+        self.heap = []  # (fire_at, priority, sequence, name, version). Stale entries are skipped when popped.
+        self.sequence = itertools.count()
+        self.handle = None
+        self.handle_fire_at = None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.timers
+
+    def daily(self, name: str, callback, at, priority: int = 1, **kwargs) -> None:
+        """
+        Runs the callback every day at the time (a `time` or "HH:MM:SS"). Replaces any existing
+        timer with the same name.
+        """
+
+        self.timers[name] = {"callback": callback, "time": self.parse_time(at), "kwargs": kwargs,
+                             "priority": priority, "version": next(self.sequence)}
+        self.push(name, self.get_next_fire_at(self.timers[name]["time"]))
+        self.arm()
+
+    def reschedule(self, name: str, at) -> None:
+        """
+        Moves the named timer to the new time of day.
+        """
+
+        timer = self.timers[name]
+        self.daily(name, timer["callback"], at, timer["priority"], **timer["kwargs"])
+
+    def cancel(self, *names: str) -> None:
+        """
+        Cancels the named timers. Names that aren't scheduled are ignored.
+        """
+
+        for name in names:
+            self.timers.pop(name, None)
+        self.arm()
+
+    def cancel_all(self) -> None:
+        """
+        Cancels every timer.
+        """
+
+        self.cancel(*list(self.timers))
+
+    def upcoming(self, count: int = 5) -> list:
+        """
+        Returns the next `count` (fire time, name) pairs, soonest first.
+        """
+
+        return heapq.nsmallest(count, [(timer["fire_at"], name) for name, timer in self.timers.items()])
+
+    def on_timer(self, kwargs) -> None:
+        """
+        Runs every timer that's due, schedules each for the next day, and schedules the next soonest.
+        A timer that raises is logged, and the rest still run.
+        """
+
+        self.handle = None
+        self.handle_fire_at = None
+        now = self.app.datetime()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            fire_at, priority, sequence, name, version = heapq.heappop(self.heap)
+            timer = self.timers.get(name)
+            if timer is None or timer["version"] != version or timer["fire_at"] != fire_at:
+                continue
+
+            due.append((name, timer))
+            self.push(name, self.get_next_fire_at(timer["time"], now))
+
+        self.arm()
+        for name, timer in due:
+            try:
+                timer["callback"](timer["kwargs"])
+            except Exception as error:
+                self.app.log(f"Timer {name} failed: {error!r}", level="ERROR")
+
+    def push(self, name: str, fire_at: datetime) -> None:
+        timer = self.timers[name]
+        timer["fire_at"] = fire_at
+        heapq.heappush(self.heap, (fire_at, timer["priority"], next(self.sequence), name, timer["version"]))
+
+    def arm(self) -> None:
+        """
+        Makes sure AppDaemon has a timer for the soonest fire time, and only that one.
+        """
+
+        while self.heap:
+            fire_at, priority, sequence, name, version = self.heap[0]
+            timer = self.timers.get(name)
+            if timer is not None and timer["version"] == version and timer["fire_at"] == fire_at:
+                break
+            heapq.heappop(self.heap)
+
+        fire_at = self.heap[0][0] if self.heap else None
+        if fire_at == self.handle_fire_at:
+            return
+
+        if self.handle is not None:
+            self.app.cancel_timer(self.handle)
+        self.handle = self.app.run_at(self.on_timer, fire_at) if fire_at is not None else None
+        self.handle_fire_at = fire_at
+
+    def get_next_fire_at(self, at: time, now: datetime = None) -> datetime:
+        """
+        Returns the next time (after now) the time of day comes around.
+        """
+
+        now = now or self.app.datetime()
+        fire_at = datetime.combine(now.date(), at)
+        return fire_at if fire_at > now else fire_at + timedelta(days=1)
+
+    def parse_time(self, at) -> time:
+        return at if isinstance(at, time) else self.app.parse_time(at)
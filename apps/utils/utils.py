@@ -1,84 +1,301 @@
-import appdaemon.plugins.hass.hassapi as hass
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import contextvars
+import importlib
+import re
+import threading
 
-from datetime import datetime, timedelta, time
+try:
+    entity_states = importlib.import_module("utils.entity_states")
+    ProfiledHass = importlib.import_module("utils.profiling").ProfiledHass
+except ModuleNotFoundError:
+    entity_states = importlib.import_module("entity_states")
+    ProfiledHass = importlib.import_module("profiling").ProfiledHass
 
+ENTITY_PATTERN = re.compile(r"^[a-z_]+\.[a-z0-9_]+$")
 
-class Utils(hass.Hass):
+
+class ServiceBatch:
+    """
+    Collects the service calls made during one callback. When flushed, calls that wouldn't
+    change anything are dropped, calls to the same service are merged into one call with a
+    list of entity ids, and the merged calls are sent concurrently.
+    Example:
+        with self.utils.batch() as batch:
+            batch.turn_on("switch.allison_living_room_lamp")
+            batch.turn_on("switch.owen_living_room_lamp")
+        # One `switch/turn_on` call with both lamps.
+    """
+
+    def __init__(self, utils) -> None:
+        self.utils = utils
+        self.service_calls = {}
+        self.states = {}
+        self.dispatched = []
+
+    def turn_on(self, entity: str, **kwargs) -> None:
+        """
+        Queues turning on the entity.
+        """
+
+        self.call_service(f"{self.get_service_domain(entity)}/turn_on", entity, "on", **kwargs)
+
+    def turn_off(self, entity: str, **kwargs) -> None:
+        """
+        Queues turning off the entity.
+        """
+
+        self.call_service(f"{self.get_service_domain(entity)}/turn_off", entity, "off", **kwargs)
+
+    def call_service(self, service: str, entity: str, expected_state: str = None, **kwargs) -> None:
+        """
+        Queues a service call for the entity. If `expected_state` is provided (and there are no
+        extra service arguments), the call is dropped if the entity is already in that state.
+        """
+
+        key = (service, tuple(sorted(kwargs.items())))
+        self.service_calls.setdefault(key, {})[entity] = None if kwargs else expected_state
+
+    def set_state(self, entity: str, state: str) -> None:
+        """
+        Queues setting the state of the entity. Dropped if the entity is already in that state.
+        """
+
+        self.states[entity] = state
+
+    def flush(self) -> list:
+        """
+        Sends every queued call that would change something. Returns the entities that were updated.
+        """
+
+        entities = {entity for calls in self.service_calls.values() for entity in calls} | set(self.states)
+        if not entities:
+            return []
+
+        requests = []
+        with self.utils.snapshot(*entities):
+            for (service, kwargs), calls in self.service_calls.items():
+                entity_ids = [entity for entity, expected_state in calls.items()
+                              if expected_state is None or self.utils.get_entity_state(entity) != expected_state]
+                if entity_ids:
+                    requests.append((entity_ids, self.utils.call_service, (service,),
+                                     dict(kwargs, entity_id=entity_ids)))
+
+            for entity, state in self.states.items():
+                if self.utils.get_entity_state(entity) != state:
+                    requests.append(([entity], self.utils.set_state, (entity,), {"state": state}))
+
+        if len(requests) == 1:
+            entity_ids, function, args, kwargs = requests[0]
+            function(*args, **kwargs)
+        elif requests:
+            # Each call runs in the caller's context so it's still attributed to the running callback.
+            futures = [self.utils.executor.submit(contextvars.copy_context().run, function, *args, **kwargs)
+                       for entity_ids, function, args, kwargs in requests]
+            for future in futures:
+                future.result()
+
+        self.dispatched = [entity for entity_ids, function, args, kwargs in requests for entity in entity_ids]
+        self.service_calls.clear()
+        self.states.clear()
+        return self.dispatched
+
+    @staticmethod
+    def get_service_domain(entity: str) -> str:
+        """
+        Gets the domain to turn the entity on or off with. Example: switch.office_lights -> switch
+        Groups don't have their own services, so they use the `homeassistant` domain.
+        """
+
+        domain = entity.split(".", 1)[0]
+        return "homeassistant" if domain == "group" else domain
+
+
+class Utils(ProfiledHass):
     """
     Utility functions to be used by other scripts.
     """
 
+    def initialize(self) -> None:
+        """
+        Sets up per-thread storage for state snapshots. Callbacks run on AppDaemon worker
+        threads, so each thread keeps its own snapshot.
+
+        Also has the state store keep the state of every entity named in any app's args.
+        """
+
+        self.local = threading.local()
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="utils_dispatch")
+        entities = self.find_entities(getattr(self, "app_config", {}))
+        state_store = self.get_app("state_store") if entities else None
+        if state_store is not None:
+            state_store.track(entities)
+
+    def terminate(self) -> None:
+        """
+        Stops the service call dispatcher.
+        """
+
+        self.executor.shutdown(wait=False)
+
+    def read_states(self, entities) -> dict:
+        """
+        Reads the full state of the entities from HA. Domains with several of the entities are
+        read in one call, and others one entity at a time, so only the entities asked for (and
+        the rest of their domains) are read and copied, instead of every entity in the namespace.
+        Entities that don't exist are left out.
+        """
+
+        domains = {}
+        for entity in entities:
+            domains.setdefault(entity.split(".", 1)[0], []).append(entity)
+
+        states = {}
+        for domain, domain_entities in domains.items():
+            if len(domain_entities) == 1:
+                domain_states = {domain_entities[0]: self.get_state(domain_entities[0], attribute="all")}
+            else:
+                domain_states = self.get_state(domain, attribute="all") or {}
+            states.update({entity: domain_states[entity] for entity in domain_entities
+                           if domain_states.get(entity) is not None})
+        return states
+
+    @staticmethod
+    def find_entities(value) -> set:
+        """
+        Finds every entity id referenced in app config.
+        """
+
+        if isinstance(value, str):
+            return {value} if ENTITY_PATTERN.match(value) else set()
+        if isinstance(value, list):
+            return set().union(*[Utils.find_entities(item) for item in value])
+        if isinstance(value, dict):
+            return set().union(*[Utils.find_entities(item) for item in value.values()])
+        return set()
+
+    @contextmanager
+    def snapshot(self, *entities: str):
+        """
+        Reads the state of every entity a callback needs up front. Until the block exits,
+        `get_entity_state` (and the helpers built on it) is served from the snapshot instead of
+        going back to HA. Entities already in an outer snapshot aren't read again. If no
+        entities are provided, every entity is kept.
+        Example:
+            with self.utils.snapshot(self.owen, self.mode_guest):
+                if self.utils.is_entity_home(self.owen) and not self.utils.is_entity_on(self.mode_guest):
+        """
+
+        previous = getattr(self.local, "states", None)
+        states = dict(previous or {})
+
+        if entities:
+            missing = [entity for entity in entities if entity not in states]
+            # Already covered by an outer snapshot, so there's nothing new to read.
+            if not missing:
+                yield
+                return
+            read = self.read_states(missing)
+            states.update({entity: read.get(entity) for entity in missing})
+        else:
+            states.update(self.get_state() or {})
+
+        self.local.states = states
+        try:
+            yield
+        finally:
+            self.local.states = previous
+
+    @contextmanager
+    def batch(self):
+        """
+        Collects the service calls made in the block and sends them, merged and deduplicated,
+        when the block exits. See `ServiceBatch`.
+        """
+
+        service_batch = ServiceBatch(self)
+        yield service_batch
+        service_batch.flush()
+
+    def get_entity_state(self, entity: str, attribute: str = None):
+        """
+        Gets the state (or attribute) of the entity. Served from the current snapshot if
+        the entity is in it, otherwise read from HA.
+        """
+
+        states = getattr(self.local, "states", None)
+        if states is not None and entity in states:
+            entity_state = states[entity]
+        else:
+            return self.get_state(entity, attribute=attribute)
+
+        if entity_state is None:
+            return None
+        if attribute is None:
+            return entity_state.get("state")
+        if attribute == "all":
+            return entity_state
+        if attribute in entity_state:
+            return entity_state[attribute]
+
+        return entity_state.get("attributes", {}).get(attribute)
+
     def is_entity_on(self, entity: str) -> bool:
         """
         Returns if the entity state is currently "on".
         """
 
-        return self.get_state(entity) == "on"
+        return entity_states.is_on(self.get_entity_state(entity))
 
     def is_entity_home(self, entity: str) -> bool:
         """
         Returns if the entity state is currently "home".
         """
 
-        return self.get_state(entity) == "home"
+        return entity_states.is_home(self.get_entity_state(entity))
 
     def get_time(self, entity: str):
         """
         Gets the time from the entity's state.
         """
 
-        return self.parse_time(self.get_state(entity))
+        return self.parse_time(self.get_entity_state(entity))
 
     def close_to_home(self, entity: str) -> bool:
         """
         Gets direction and miles away to determine if entity is close to home.
         """
 
-        state = self.get_state(entity, attribute="all")
+        state = self.get_entity_state(entity, attribute="all")
         miles_away = int(state["state"])
         direction = state["attributes"]["dir_of_travel"]
 
         return 0 < miles_away < 5 and direction == "towards"
 
-    def recently_triggered(self, entity: str, seconds: int = 2) -> bool:
-        """
-        Returns if the entity has been triggered recently (within the
-        number of seconds inputted or two seconds if not specified).
-        """
-
-        last_changed = datetime.strptime(self.get_state(entity, attribute="last_changed"),
-                                         "%Y-%m-%dT%H:%M:%S.%f%z")
-
-        return self.datetime(True) <= last_changed + timedelta(seconds=seconds)
-
     def sync_entities(self, correct_entity: str, entity_to_sync: str):
         """
         Syncs the states between two entities. `correct_entity` is the one to get state from.
         `entity_to_sync` is the entity to set to the state of the `correct_entity`.
         """
 
-        correct_entity_state = self.is_entity_on(correct_entity)
-
-        if correct_entity_state == self.is_entity_on(entity_to_sync):
-            return
-
-        if correct_entity_state:
-            self.turn_on(entity_to_sync)
-        else:
-            self.turn_off(entity_to_sync)
+        action = entity_states.get_sync_action(self.get_entity_state(correct_entity),
+                                               self.get_entity_state(entity_to_sync))
+        if action is not None:
+            getattr(self, action)(entity_to_sync)
 
-    def set_state_conditionally(self, entity_to_test: str, expected_state: str, entity_to_set: str, state_to_set: str):
+    def set_state_conditionally(self, entity_to_test: str, expected_state: str, entity_to_set: str, state_to_set: str,
+                                batch: ServiceBatch = None):
         """
         If the state of `entity_to_test` matches `expected_state`, turn on or off
-        `entity_to_set` based on `turn_on`.
+        `entity_to_set` based on `turn_on`. If `batch` is provided, the update is queued on it.
         """
 
-        current_state = self.get_state(entity_to_test)
+        current_state = self.get_entity_state(entity_to_test)
         self.log("Setting state conditionally for {}. Current state: {} Expected State: {} New State: {}",
                  entity_to_test, current_state, expected_state, state_to_set)
 
         if current_state == expected_state and current_state != state_to_set:
-            self.set_state(entity_to_set, state=state_to_set)
+            (batch or self).set_state(entity_to_set, state=state_to_set)
 
     def get_input_number_integer(self, state: str) -> int:
         """
@@ -88,13 +305,3 @@ class Utils(hass.Hass):
         """
 
         return int(float(state))
-
-    def add_seconds(self, initial_time: time, seconds: int) -> time:
-        """
-        Adds input seconds to the input time by converting it to a datetime object,
-        adding the seconds, and then converting back to a time object.
-        """
-
-        date = datetime.combine(datetime(2000, 1, 1), initial_time)
-        date - timedelta(seconds=seconds)
-        return date.time()
@@ -0,0 +1,70 @@
+import importlib
+import threading
+
+try:
+    ProfiledHass = importlib.import_module("utils.profiling").ProfiledHass
+except ModuleNotFoundError:
+    ProfiledHass = importlib.import_module("profiling").ProfiledHass
+
+
+class ZhaRouter(ProfiledHass):
+    """
+    Listens to `zha_event` once and routes each event to the handlers registered for its
+    device and command, so adding buttons doesn't add event listeners. Handlers are called back
+    on their own app's thread with the `listen_event` signature.
+    Example:
+        self.zha_router.subscribe(self, self.toggle_light, device_id, "single", lights=lights)
+    """
+
+    def initialize(self) -> None:
+        """
+        Listens for Zigbee events.
+        """
+
+        self.handlers = {}  # (device_id, command) -> {handle: subscription}
+        self.handlers_lock = threading.Lock()
+        self.next_handle = 0
+
+        self.listen_event(self.on_zha_event, "zha_event")
+
+    def subscribe(self, app, callback, device_id: str, command: str, **kwargs) -> int:
+        """
+        Calls back `callback(event_name, data, kwargs)` on the app's thread when the device sends the command.
+        """
+
+        with self.handlers_lock:
+            self.next_handle += 1
+            self.handlers.setdefault((device_id, command), {})[self.next_handle] = {
+                "app": app, "callback": callback, "kwargs": kwargs,
+            }
+            return self.next_handle
+
+    def unsubscribe(self, handle: int) -> None:
+        """
+        Stops calling back the handler.
+        """
+
+        with self.handlers_lock:
+            for key, subscriptions in list(self.handlers.items()):
+                if subscriptions.pop(handle, None) is not None and not subscriptions:
+                    del self.handlers[key]
+
+    def on_zha_event(self, event_name: str, data, kwargs) -> None:
+        """
+        On a Zigbee event, schedules the handlers registered for its device and command on their apps.
+        """
+
+        with self.handlers_lock:
+            subscriptions = list(self.handlers.get((data.get("device_id"), data.get("command")), {}).values())
+
+        for subscription in subscriptions:
+            subscription["app"].run_in(self.deliver, 0, subscription=subscription, event_name=event_name,
+                                       data=data)
+
+    def deliver(self, kwargs) -> None:
+        """
+        Calls back the handler. Scheduled on the handler's app, so it runs on their thread.
+        """
+
+        subscription = kwargs["subscription"]
+        subscription["callback"](kwargs["event_name"], kwargs["data"], subscription["kwargs"])
@@ -0,0 +1,191 @@
+"""
+Compares AppDaemon worker thread occupancy between the sync and async versions of
+`Security`, `Internet` and `HealthMonitor` under a simulated event storm.
+
+Each callback is modelled as the HASS round trips and waits it makes:
+- Sync apps run every segment of a callback on a worker thread, and each round trip
+  blocks that thread. Waits are `run_in` hops that release the thread and queue the
+  next segment.
+- Async apps run on the event loop. Round trips and waits are awaited, so no worker
+  thread is used, and calls gathered together are in flight at the same time. The loop
+  counts as busy while a callback runs between awaits.
+
+Usage: python benchmarks/async_occupancy.py [--events 300] [--workers 10] [--latency 0.02]
+"""
+
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import random
+import threading
+import time
+
+# Steps: ("call", n) = n round trips one after another, ("gather", n) = n round trips that
+# the async version sends concurrently (the sync version sends them one after another),
+# ("wait", seconds) = run_in/sleep.
+PROFILES = {
+    "Security.on_people_away": [("call", 2), ("call", 1), ("wait", 10), ("call", 1), ("gather", 2)],
+    "Internet.restart_modem": [("call", 2), ("wait", 15), ("call", 1), ("gather", 1)],
+    "HealthMonitor.on_state_updated": [("call", 1), ("wait", 60), ("gather", 2), ("call", 1)],
+}
+
+
+class Stats:
+    """
+    Thread-safe counters for worker occupancy.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.busy_workers = 0
+        self.peak_busy_workers = 0
+        self.busy_seconds = 0.0
+        self.queue_delays = []
+
+    def start(self, queued_at: float = None) -> float:
+        """
+        Marks a callback running. `queued_at` is when it was ready to run (None if it's resuming
+        from a round trip, which isn't queueing).
+        """
+
+        started_at = time.perf_counter()
+        with self.lock:
+            self.busy_workers += 1
+            self.peak_busy_workers = max(self.peak_busy_workers, self.busy_workers)
+            if queued_at is not None:
+                self.queue_delays.append(started_at - queued_at)
+        return started_at
+
+    def stop(self, started_at: float) -> None:
+        with self.lock:
+            self.busy_workers -= 1
+            self.busy_seconds += time.perf_counter() - started_at
+
+
+def split_segments(profile: list) -> list:
+    """
+    Splits a profile into the segments between waits. Returns (round trips, wait after) pairs.
+    """
+
+    segments = []
+    round_trips = 0
+    for kind, value in profile:
+        if kind == "wait":
+            segments.append((round_trips, value))
+            round_trips = 0
+        else:
+            round_trips += value
+    segments.append((round_trips, None))
+    return segments
+
+
+def run_sync(events: list, workers: int, latency: float, time_scale: float) -> dict:
+    """
+    Runs the storm on a worker pool, like AppDaemon runs sync callbacks.
+    """
+
+    stats = Stats()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    done = threading.Semaphore(0)
+
+    def run_segment(segments: list, index: int, queued_at: float) -> None:
+        started_at = stats.start(queued_at)
+        round_trips, wait = segments[index]
+        time.sleep(round_trips * latency)
+        stats.stop(started_at)
+
+        if wait is None:
+            done.release()
+        else:
+            timer = threading.Timer(wait * time_scale, lambda: executor.submit(
+                run_segment, segments, index + 1, time.perf_counter()))
+            timer.start()
+
+    started = time.perf_counter()
+    for offset, profile in events:
+        time.sleep(max(0.0, started + offset - time.perf_counter()))
+        executor.submit(run_segment, split_segments(PROFILES[profile]), 0, time.perf_counter())
+
+    for _ in events:
+        done.acquire()
+    wall = time.perf_counter() - started
+    executor.shutdown()
+
+    return summarize(stats, wall, workers)
+
+
+def run_async(events: list, workers: int, latency: float, time_scale: float) -> dict:
+    """
+    Runs the storm on the event loop, like AppDaemon runs async callbacks.
+    """
+
+    stats = Stats()
+
+    async def run_callback(profile: list, queued_at: float) -> None:
+        # Busy only between awaits, when the callback holds the event loop.
+        started_at = stats.start(queued_at)
+        for kind, value in profile:
+            stats.stop(started_at)
+            if kind == "wait":
+                queued_at = time.perf_counter() + value * time_scale
+                await asyncio.sleep(value * time_scale)
+                started_at = stats.start(queued_at)
+                continue
+
+            if kind == "gather":
+                await asyncio.gather(*[asyncio.sleep(latency) for _ in range(value)])
+            else:
+                for _ in range(value):
+                    await asyncio.sleep(latency)
+            started_at = stats.start()
+        stats.stop(started_at)
+
+    async def storm() -> float:
+        started = time.perf_counter()
+        tasks = []
+        for offset, profile in events:
+            await asyncio.sleep(max(0.0, started + offset - time.perf_counter()))
+            tasks.append(asyncio.create_task(run_callback(PROFILES[profile], time.perf_counter())))
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - started
+
+    wall = asyncio.run(storm())
+    return summarize(stats, wall, workers)
+
+
+def summarize(stats: Stats, wall: float, workers: int) -> dict:
+    delays = sorted(stats.queue_delays) or [0.0]
+    return {
+        "wall_seconds": wall,
+        "worker_busy_seconds": stats.busy_seconds,
+        "occupancy": stats.busy_seconds / (wall * workers),
+        "peak_busy_workers": stats.peak_busy_workers,
+        "p99_queue_delay_ms": delays[min(len(delays) - 1, int(len(delays) * 0.99))] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=300, help="Number of triggering events in the storm.")
+    parser.add_argument("--storm-seconds", type=float, default=1.0, help="Window the events arrive in.")
+    parser.add_argument("--workers", type=int, default=10, help="AppDaemon worker threads.")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds per HASS round trip.")
+    parser.add_argument("--time-scale", type=float, default=0.01,
+                        help="Multiplier applied to run_in/sleep waits so the benchmark finishes quickly.")
+    parser.add_argument("--seed", type=int, default=0)
+    options = parser.parse_args()
+
+    generator = random.Random(options.seed)
+    events = sorted((generator.uniform(0, options.storm_seconds), generator.choice(list(PROFILES)))
+                    for _ in range(options.events))
+
+    for name, runner in (("sync", run_sync), ("async", run_async)):
+        result = runner(events, options.workers, options.latency, options.time_scale)
+        print(f"{name:>5}: wall {result['wall_seconds']:.2f}s, "
+              f"worker busy {result['worker_busy_seconds']:.2f}s ({result['occupancy']:.0%} of pool), "
+              f"peak busy workers {result['peak_busy_workers']}, "
+              f"p99 queue delay {result['p99_queue_delay_ms']:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,674 @@
+"""
+A local, in-process stand-in for Home Assistant and AppDaemon's `hass.Hass` API.
+
+Apps are loaded against `FakeHass` instead of AppDaemon, so they can be driven by recorded
+or synthetic event streams on a virtual clock. Time only moves when the runtime is told to
+advance, and timers (`run_in`, `run_daily`, `run_at_sunset`, `listen_state` durations and
+`await self.sleep()`) fire in order as it does, so a day of events replays in seconds.
+
+Every state read, service call and callback is counted per app so benchmarks can report on
+them.
+"""
+
+import asyncio
+from collections import defaultdict, deque
+from datetime import datetime, time, timedelta, timezone
+import functools
+import heapq
+import importlib
+import itertools
+import sys
+import time as wall_clock
+import types
+
+# Filters that AppDaemon consumes itself rather than passing back to the callback.
+LISTEN_STATE_FILTERS = ("new", "old", "duration", "attribute", "immediate", "oneshot", "namespace")
+
+
+def in_event_loop() -> bool:
+    """
+    Returns if the caller is running on the event loop (i.e. inside an async callback).
+    """
+
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def hass_api(function):
+    """
+    Mirrors AppDaemon's `sync_wrapper`: API methods return their result directly when called
+    from a sync app and a coroutine when called from the event loop.
+    """
+
+    @functools.wraps(function)
+    def wrapper(self, *args, **kwargs):
+        result = function(self, *args, **kwargs)
+        if not in_event_loop():
+            return result
+
+        async def resolved():
+            return result
+
+        return resolved()
+
+    return wrapper
+
+
+def parse_time(value) -> time:
+    """
+    Parses "HH:MM:SS" (or "HH:MM") strings. `time` objects are returned as is.
+    """
+
+    if isinstance(value, time):
+        return value
+    if isinstance(value, datetime):
+        return value.time()
+
+    parts = [int(float(part)) for part in str(value).split(":")]
+    return time(*parts)
+
+
+def is_between(now: time, start: time, end: time) -> bool:
+    """
+    Returns if `now` falls between `start` and `end`, wrapping around midnight if `end` is before `start`.
+    """
+
+    if start <= end:
+        return start <= now <= end
+    return now >= start or now <= end
+
+
+class AppStats:
+    """
+    Per-app counters collected while replaying.
+    """
+
+    def __init__(self) -> None:
+        self.callbacks = 0
+        self.state_reads = 0
+        self.service_calls = 0
+        self.latencies = []
+        self.peak_timers = 0
+        self.errors = []
+
+
+class FakeHomeAssistant:
+    """
+    State store, listener registry, service handlers and virtual-clock scheduler shared by every app.
+    """
+
+    def __init__(self, start: datetime, sunset: time = time(19, 30), location=None) -> None:
+        """
+        @param sunset: The time the sun sets every day, unless there's a location.
+        @param location: A `solar.Location` to calculate each day's sunset for.
+        """
+
+        self.start = start
+        self.now = start
+        self.sunset = sunset
+        self.location = location
+        self.states = {}
+        self.apps = {}
+        self.state_listeners = {}
+        self.event_listeners = {}
+        self.timers = {}
+        self.timer_heap = []
+        self.pending = deque()
+        self.notifications = []
+        self.stats = defaultdict(AppStats)
+        self.peak_timers = 0
+        self.handles = itertools.count(1)
+        self.current_app = None
+        self.loop = asyncio.new_event_loop()
+        self.tasks = set()
+
+    def monotonic(self) -> float:
+        """
+        Seconds of virtual time since the start, for code that reads a monotonic clock.
+        """
+
+        return (self.now - self.start).total_seconds()
+
+    # State
+
+    def set_entity_state(self, entity: str, state=None, attributes: dict = None) -> dict:
+        """
+        Updates the entity and queues the state listeners that match the change.
+        """
+
+        old = self.states.get(entity)
+        new = self.copy_state(old) if old else {"entity_id": entity, "state": None, "attributes": {}}
+        timestamp = self.now.replace(tzinfo=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f%z")
+
+        if state is not None:
+            state = str(state)
+            if state != new["state"]:
+                new["last_changed"] = timestamp
+            new["state"] = state
+        if attributes:
+            new["attributes"].update(attributes)
+        new.setdefault("last_changed", timestamp)
+        new["last_updated"] = timestamp
+
+        self.states[entity] = new
+        self.notify_state_listeners(entity, old, new)
+        return new
+
+    def read_state(self, entity: str = None, attribute: str = None, default=None):
+        """
+        Reads state the same way `get_state` does.
+        """
+
+        if entity is None:
+            return {entity_id: self.copy_state(state) for entity_id, state in self.states.items()}
+        if "." not in entity:
+            return {entity_id: self.copy_state(state) for entity_id, state in self.states.items()
+                    if entity_id.startswith(f"{entity}.")}
+
+        state = self.states.get(entity)
+        if state is None:
+            return default
+        if attribute is None:
+            return state["state"]
+        if attribute == "all":
+            return self.copy_state(state)
+        if attribute in state:
+            return state[attribute]
+        return state["attributes"].get(attribute, default)
+
+    @staticmethod
+    def copy_state(state: dict) -> dict:
+        """
+        Copies the state and its attributes. Stored states are replaced rather than changed, so
+        nothing deeper needs copying.
+        """
+
+        return {**state, "attributes": dict(state["attributes"])}
+
+    # Listeners
+
+    def notify_state_listeners(self, entity: str, old: dict, new: dict) -> None:
+        for handle, listener in list(self.state_listeners.items()):
+            watched = listener["entity"]
+            if watched is not None and watched != entity and f"{watched}." != entity[:len(watched) + 1]:
+                continue
+
+            attribute = listener["attribute"]
+            old_value = self.get_value(old, attribute)
+            new_value = self.get_value(new, attribute)
+            if old_value == new_value:
+                continue
+
+            pending_duration = listener["duration_timers"].pop(entity, None)
+            if pending_duration is not None:
+                self.cancel_timer(pending_duration)
+
+            if not self.matches(listener["old"], old_value) or not self.matches(listener["new"], new_value):
+                continue
+
+            args = (entity, attribute, old_value, new_value)
+            if listener["duration"]:
+                listener["duration_timers"][entity] = self.schedule(
+                    listener["app"], self.now + timedelta(seconds=float(listener["duration"])),
+                    self.fire_duration, {"handle": handle, "entity": entity, "args": args}, internal=True)
+            else:
+                self.dispatch(listener["app"], listener["callback"], "state", args, listener["kwargs"])
+
+    def fire_duration(self, kwargs: dict) -> None:
+        listener = self.state_listeners.get(kwargs["handle"])
+        if listener is None:
+            return
+
+        listener["duration_timers"].pop(kwargs["entity"], None)
+        self.dispatch(listener["app"], listener["callback"], "state", kwargs["args"], listener["kwargs"])
+
+    def fire_event(self, event: str, data: dict) -> None:
+        """
+        Queues every event listener whose filters match the event data.
+        """
+
+        for listener in list(self.event_listeners.values()):
+            if listener["event"] is not None and listener["event"] != event:
+                continue
+            if any(key in data and data[key] != value for key, value in listener["kwargs"].items()):
+                continue
+
+            self.dispatch(listener["app"], listener["callback"], "event", (event, data), listener["kwargs"])
+
+    @staticmethod
+    def get_value(state: dict, attribute: str):
+        if state is None:
+            return None
+        if attribute is None:
+            return state["state"]
+        if attribute == "all":
+            return state
+        return state["attributes"].get(attribute)
+
+    @staticmethod
+    def matches(expected, value) -> bool:
+        if expected is None:
+            return True
+        if callable(expected):
+            try:
+                return bool(expected(value))
+            except (TypeError, ValueError):
+                return False
+        return expected == value
+
+    # Services
+
+    def call_service(self, app: str, service: str, **kwargs) -> None:
+        """
+        Applies the effect of the service call to the state store.
+        """
+
+        self.count(app, "service_calls")
+        domain, action = service.split("/", 1)
+        entity_ids = kwargs.pop("entity_id", None)
+        if isinstance(entity_ids, str):
+            entity_ids = [entity_ids]
+
+        if domain == "notify":
+            self.notifications.append((self.now, action, kwargs.get("message")))
+            return
+
+        for entity in entity_ids or []:
+            current = self.read_state(entity)
+            if action == "turn_on":
+                attributes = {key: value for key, value in kwargs.items() if key != "transition"}
+                self.set_entity_state(entity, "on", attributes)
+            elif action == "turn_off":
+                self.set_entity_state(entity, "off")
+            elif action == "toggle":
+                self.set_entity_state(entity, "off" if current == "on" else "on")
+            elif action in ("lock", "unlock"):
+                self.set_entity_state(entity, f"{action}ed")
+            elif service == "climate/set_temperature":
+                self.set_entity_state(entity, attributes={"temperature": kwargs["temperature"]})
+            elif service == "button/press":
+                self.set_entity_state(entity, self.now.isoformat())
+
+    # Scheduler
+
+    def schedule(self, app: str, fire_at: datetime, callback, kwargs: dict, interval: timedelta = None,
+                 internal: bool = False, direct: bool = None, handle: str = None) -> str:
+        """
+        Adds a timer to the virtual clock. Internal timers (durations, sleeps) aren't counted as app
+        timers. Direct timers call `callback(kwargs)` from the scheduler instead of dispatching it as
+        an app callback.
+        """
+
+        handle = handle or f"timer_{next(self.handles)}"
+        self.timers[handle] = {"app": app, "fire_at": fire_at, "callback": callback, "kwargs": kwargs,
+                               "interval": interval, "internal": internal,
+                               "direct": internal if direct is None else direct}
+        heapq.heappush(self.timer_heap, (fire_at, handle))
+
+        if not internal:
+            app_timers = sum(1 for timer in self.timers.values() if timer["app"] == app and not timer["internal"])
+            self.stats[app].peak_timers = max(self.stats[app].peak_timers, app_timers)
+            self.peak_timers = max(self.peak_timers, sum(1 for timer in self.timers.values()
+                                                         if not timer["internal"]))
+        return handle
+
+    def cancel_timer(self, handle: str) -> None:
+        self.timers.pop(handle, None)
+
+    def advance(self, until: datetime) -> None:
+        """
+        Moves the virtual clock forward, firing every timer due on the way.
+        """
+
+        self.run_pending()
+        while self.timer_heap and self.timer_heap[0][0] <= until:
+            fire_at, handle = heapq.heappop(self.timer_heap)
+            timer = self.timers.pop(handle, None)
+            if timer is None or timer["fire_at"] != fire_at:
+                continue
+
+            self.now = max(self.now, fire_at)
+            if timer["interval"] is not None:
+                timer["fire_at"] = fire_at + timer["interval"]
+                self.timers[handle] = timer
+                heapq.heappush(self.timer_heap, (timer["fire_at"], handle))
+
+            if timer["direct"]:
+                timer["callback"](timer["kwargs"])
+            else:
+                self.dispatch(timer["app"], timer["callback"], "timer", (), timer["kwargs"])
+            self.run_pending()
+
+        self.now = max(self.now, until)
+
+    def next_sunset(self, offset: float = 0) -> datetime:
+        """
+        Returns the next sunset (plus offset seconds) after the current time.
+        """
+
+        if self.location is not None:
+            return self.location.next_sunset(self.now, offset)
+        fire_at = datetime.combine(self.now.date(), self.sunset) + timedelta(seconds=offset)
+        return fire_at if fire_at > self.now else fire_at + timedelta(days=1)
+
+    # Callback dispatch
+
+    def dispatch(self, app: str, callback, kind: str, args: tuple, kwargs: dict) -> None:
+        self.pending.append((app, callback, kind, args, kwargs))
+
+    def run_pending(self) -> None:
+        """
+        Runs every queued callback, including the ones queued by callbacks as they run.
+        """
+
+        while self.pending:
+            app, callback, kind, args, kwargs = self.pending.popleft()
+            self.run_callback(app, callback, kind, args, kwargs)
+
+    def run_callback(self, app: str, callback, kind: str, args: tuple, kwargs: dict) -> None:
+        instance = self.apps[app]
+        kwargs = {key: value for key, value in kwargs.items() if key not in LISTEN_STATE_FILTERS}
+        if kind == "state":
+            call = functools.partial(callback, *args)
+        elif kind == "event":
+            call = functools.partial(callback, *args)
+        else:
+            call = callback
+
+        if instance.args.get("use_dictionary_unpacking"):
+            call = functools.partial(call, **kwargs)
+        else:
+            call = functools.partial(call, kwargs)
+
+        self.count(app, "callbacks")
+        previous_app, self.current_app = self.current_app, app
+        started = wall_clock.perf_counter()
+        try:
+            if asyncio.iscoroutinefunction(callback):
+                self.run_task(call())
+            else:
+                call()
+        except Exception as error:
+            self.stats[app].errors.append(error)
+        finally:
+            self.stats[app].latencies.append(wall_clock.perf_counter() - started)
+            self.current_app = previous_app
+
+    def run_task(self, coroutine) -> None:
+        """
+        Starts the coroutine on the event loop and runs the loop until every task has finished
+        or is waiting on the virtual clock.
+        """
+
+        task = self.loop.create_task(coroutine)
+        task.app = self.current_app
+        self.tasks.add(task)
+        task.add_done_callback(self.on_task_done)
+        self.drain_loop()
+
+    def on_task_done(self, task) -> None:
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.stats[task.app].errors.append(task.exception())
+
+    def drain_loop(self) -> None:
+        previous = None
+        while True:
+            self.loop.run_until_complete(asyncio.sleep(0))
+            current = (len(self.tasks), sum(1 for timer in self.timers.values() if timer["internal"]))
+            if current == previous:
+                break
+            previous = current
+
+    def sleep(self, seconds: float):
+        """
+        Returns a future resolved once the virtual clock has moved `seconds` forward.
+        """
+
+        future = self.loop.create_future()
+
+        def resolve(kwargs):
+            if not future.done():
+                future.set_result(None)
+            self.drain_loop()
+
+        self.schedule(self.current_app, self.now + timedelta(seconds=seconds), resolve, {}, internal=True)
+        return future
+
+    def count(self, app: str, counter: str) -> None:
+        stats = self.stats[self.current_app or app]
+        setattr(stats, counter, getattr(stats, counter) + 1)
+
+
+class FakeHass:
+    """
+    Drop-in replacement for `appdaemon.plugins.hass.hassapi.Hass`, backed by `FakeHomeAssistant`.
+    """
+
+    def __init__(self, runtime: FakeHomeAssistant, name: str, args: dict, app_config: dict = None) -> None:
+        self.runtime = runtime
+        self.name = name
+        self.args = args
+        self.app_config = app_config or {}
+
+    # App helpers
+
+    def get_app(self, name: str):
+        return self.runtime.apps[name]
+
+    def log(self, message, *args, level: str = "INFO", **kwargs) -> None:
+        pass
+
+    def error(self, message, *args, **kwargs) -> None:
+        pass
+
+    # State
+
+    @hass_api
+    def get_state(self, entity: str = None, attribute: str = None, default=None, **kwargs):
+        self.runtime.count(self.name, "state_reads")
+        return self.runtime.read_state(entity, attribute, default)
+
+    @hass_api
+    def set_state(self, entity: str, state=None, attributes: dict = None, **kwargs):
+        self.runtime.count(self.name, "service_calls")
+        return self.runtime.set_entity_state(entity, state, attributes)
+
+    @hass_api
+    def anyone_home(self, person: bool = True, **kwargs) -> bool:
+        self.runtime.count(self.name, "state_reads")
+        return any(state["state"] == "home" for entity, state in self.runtime.states.items()
+                   if entity.startswith("person." if person else "device_tracker."))
+
+    # Services
+
+    @hass_api
+    def call_service(self, service: str, **kwargs):
+        return self.runtime.call_service(self.name, service, **kwargs)
+
+    def turn_on(self, entity_id: str, **kwargs):
+        return self.call_service(f"{self.service_domain(entity_id)}/turn_on", entity_id=entity_id, **kwargs)
+
+    def turn_off(self, entity_id: str, **kwargs):
+        return self.call_service(f"{self.service_domain(entity_id)}/turn_off", entity_id=entity_id, **kwargs)
+
+    def toggle(self, entity_id: str, **kwargs):
+        return self.call_service(f"{self.service_domain(entity_id)}/toggle", entity_id=entity_id, **kwargs)
+
+    def notify(self, message: str, name: str = None, **kwargs):
+        return self.call_service(f"notify/{name}", message=message, **kwargs)
+
+    @staticmethod
+    def service_domain(entity_id) -> str:
+        entity = entity_id[0] if isinstance(entity_id, list) else entity_id
+        domain = entity.split(".", 1)[0]
+        return "homeassistant" if domain == "group" else domain
+
+    # Listeners
+
+    @hass_api
+    def listen_state(self, callback, entity: str = None, attribute: str = None, new=None, old=None,
+                     duration: float = None, **kwargs) -> str:
+        handle = f"state_{next(self.runtime.handles)}"
+        self.runtime.state_listeners[handle] = {
+            "app": self.name, "callback": callback, "entity": entity, "attribute": attribute, "new": new,
+            "old": old, "duration": duration, "kwargs": kwargs, "duration_timers": {},
+        }
+        return handle
+
+    def create_task(self, coroutine, callback=None, **kwargs):
+        task = self.runtime.loop.create_task(coroutine)
+        task.app = self.name
+        self.runtime.tasks.add(task)
+        task.add_done_callback(self.runtime.on_task_done)
+        return task
+
+    @hass_api
+    def cancel_listen_state(self, handle: str) -> None:
+        listener = self.runtime.state_listeners.pop(handle, None)
+        for timer in (listener or {}).get("duration_timers", {}).values():
+            self.runtime.cancel_timer(timer)
+
+    @hass_api
+    def listen_event(self, callback, event: str = None, **kwargs) -> str:
+        handle = f"event_{next(self.runtime.handles)}"
+        self.runtime.event_listeners[handle] = {"app": self.name, "callback": callback, "event": event,
+                                                "kwargs": kwargs}
+        return handle
+
+    @hass_api
+    def cancel_listen_event(self, handle: str) -> None:
+        self.runtime.event_listeners.pop(handle, None)
+
+    @hass_api
+    def fire_event(self, event: str, **kwargs) -> None:
+        self.runtime.fire_event(event, kwargs)
+
+    # Scheduler
+
+    @hass_api
+    def run_in(self, callback, delay: float, **kwargs) -> str:
+        return self.runtime.schedule(self.name, self.runtime.now + timedelta(seconds=float(delay)), callback,
+                                     kwargs)
+
+    @hass_api
+    def run_at(self, callback, start: datetime, **kwargs) -> str:
+        return self.runtime.schedule(self.name, start, callback, kwargs)
+
+    @hass_api
+    def run_daily(self, callback, start, **kwargs) -> str:
+        fire_at = datetime.combine(self.runtime.now.date(), parse_time(start))
+        if fire_at <= self.runtime.now:
+            fire_at += timedelta(days=1)
+        return self.runtime.schedule(self.name, fire_at, callback, kwargs, interval=timedelta(days=1))
+
+    @hass_api
+    def run_every(self, callback, start, interval: float, **kwargs) -> str:
+        if isinstance(start, str) and start.startswith("now"):
+            fire_at = self.runtime.now + timedelta(seconds=float(start[4:] or 0))
+        else:
+            fire_at = start
+        return self.runtime.schedule(self.name, fire_at, callback, kwargs, interval=timedelta(seconds=interval))
+
+    @hass_api
+    def run_at_sunset(self, callback, offset: float = 0, **kwargs) -> str:
+        handle = f"sunset_{next(self.runtime.handles)}"
+
+        def fire(timer_kwargs: dict) -> None:
+            self.runtime.dispatch(self.name, callback, "timer", (), kwargs)
+            self.runtime.schedule(self.name, self.runtime.next_sunset(offset), fire, {}, direct=True,
+                                  handle=handle)
+
+        return self.runtime.schedule(self.name, self.runtime.next_sunset(offset), fire, {}, direct=True,
+                                     handle=handle)
+
+    @hass_api
+    def cancel_timer(self, handle: str) -> None:
+        self.runtime.cancel_timer(handle)
+
+    @hass_api
+    def timer_running(self, handle: str) -> bool:
+        return handle in self.runtime.timers
+
+    def sleep(self, seconds: float):
+        return self.runtime.sleep(seconds)
+
+    # Time
+
+    def parse_time(self, value, **kwargs) -> time:
+        return parse_time(value)
+
+    @hass_api
+    def datetime(self, aware: bool = False) -> datetime:
+        return self.runtime.now.replace(tzinfo=timezone.utc) if aware else self.runtime.now
+
+    @hass_api
+    def get_now(self) -> datetime:
+        return self.runtime.now.replace(tzinfo=timezone.utc)
+
+    @hass_api
+    def time(self) -> time:
+        return self.runtime.now.time()
+
+    @hass_api
+    def now_is_between(self, start: str, end: str) -> bool:
+        return is_between(self.runtime.now.time(), parse_time(start), parse_time(end))
+
+
+def install() -> None:
+    """
+    Registers `FakeHass` as `appdaemon.plugins.hass.hassapi.Hass` so apps import it instead of AppDaemon.
+    """
+
+    path = ["appdaemon", "appdaemon.plugins", "appdaemon.plugins.hass", "appdaemon.plugins.hass.hassapi"]
+    for name in path:
+        sys.modules[name] = types.ModuleType(name)
+    for parent, child in zip(path, path[1:]):
+        setattr(sys.modules[parent], child.rsplit(".", 1)[1], sys.modules[child])
+    sys.modules["appdaemon.plugins.hass.hassapi"].Hass = FakeHass
+
+
+def load_app(runtime: FakeHomeAssistant, name: str, config: dict, app_config: dict = None) -> FakeHass:
+    """
+    Imports the app's module, creates the app and runs `initialize`.
+    """
+
+    app_class = getattr(importlib.import_module(config["module"]), config["class"])
+    app = app_class.__new__(app_class)
+    FakeHass.__init__(app, runtime, name, config, app_config)
+    runtime.apps[name] = app
+
+    initialize = getattr(app, "initialize", None)
+    if initialize is not None:
+        runtime.current_app = name
+        try:
+            if asyncio.iscoroutinefunction(initialize):
+                runtime.run_task(initialize())
+            else:
+                initialize()
+        finally:
+            runtime.current_app = None
+    return app
+
+
+def unload_apps(runtime: FakeHomeAssistant) -> None:
+    """
+    Runs `terminate` for every app, in the reverse of the order they were loaded.
+    """
+
+    for name, app in reversed(list(runtime.apps.items())):
+        terminate = getattr(app, "terminate", None)
+        if terminate is None:
+            continue
+
+        runtime.current_app = name
+        try:
+            if asyncio.iscoroutinefunction(terminate):
+                runtime.run_task(terminate())
+            else:
+                terminate()
+        finally:
+            runtime.current_app = None
@@ -0,0 +1,382 @@
+"""
+Replays a recorded or synthetic Home Assistant event stream through every app in `apps.yaml`
+against the local fake in `fake_hass.py`, then reports how the apps behaved under it.
+
+Streams are JSON lines in the format of Home Assistant's websocket events:
+    {"event_type": "state_changed", "time_fired": "2024-01-15T07:30:00",
+     "data": {"entity_id": "person.allison", "new_state": {"state": "not_home", "attributes": {}}}}
+    {"event_type": "zha_event", "time_fired": "2024-01-15T18:00:00",
+     "data": {"device_id": "...", "command": "single"}}
+
+Without `--stream`, a synthetic day is generated covering presence, TVs, lighting, buttons, sun
+elevation and thermostat/bedroom temperature drift.
+
+Usage: python benchmarks/replay.py [--stream events.jsonl] [--days 1] [--sensor-interval 60] [--json]
+"""
+
+import argparse
+from datetime import datetime, time, timedelta
+import importlib
+import json
+import math
+import os
+import random
+import re
+import sys
+import tempfile
+import time as wall_clock
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fake_hass  # noqa: E402
+
+APPS_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "apps")
+ENTITY_PATTERN = re.compile(r"^[a-z_]+\.[a-z0-9_]+$")
+
+DOMAIN_DEFAULTS = {
+    "binary_sensor": "off",
+    "button": "2024-01-01T00:00:00",
+    "group": "off",
+    "input_boolean": "off",
+    "input_datetime": "00:00:00",
+    "input_number": "0.0",
+    "light": "off",
+    "lock": "locked",
+    "person": "home",
+    "scene": "2024-01-01T00:00:00",
+    "sensor": "0",
+    "switch": "off",
+    "zone": "2",
+}
+
+ENTITY_DEFAULTS = {
+    "binary_sensor.internet_up": ("on", {}),
+    "binary_sensor.workday_sensor": ("on", {}),
+    "climate.main": ("heat", {"temperature": 70, "current_temperature": 70}),
+    "input_boolean.climate_notify_location_based": ("on", {}),
+    "input_boolean.lights_living_room_automations": ("on", {}),
+    "input_datetime.climate_day_start": ("06:30:00", {}),
+    "input_datetime.climate_night_start": ("21:30:00", {}),
+    "input_datetime.light_front_porch_off_time": ("22:00:00", {}),
+    "input_number.climate_away_minutes": ("30.0", {}),
+    "input_number.climate_away_offset": ("3.0", {}),
+    "input_number.climate_day_temp": ("70.0", {}),
+    "input_number.climate_gone_offset": ("6.0", {}),
+    "input_number.climate_night_offset": ("4.0", {}),
+    "input_select.thermostat_state": ("Home", {}),
+    "light.downstairs_lights": ("off", {"brightness": None}),
+    "sensor.allison_distance_miles": ("0", {"dir_of_travel": "stationary"}),
+    "sensor.bedroom_temperature_sensor_temperature": ("70.0", {}),
+    "sensor.dryer_dryer_machine_state": ("stop", {}),
+    "sensor.owen_distance_miles": ("0", {"dir_of_travel": "stationary"}),
+    "sensor.owen_phone_charger_type": ("none", {}),
+    "sensor.owen_phone_network_type": ("wifi", {}),
+    "sensor.washer_washer_machine_state": ("stop", {}),
+    "sun.sun": ("below_horizon", {"elevation": -20}),
+}
+
+
+class SecretLoader(yaml.SafeLoader):
+    """
+    Loads `apps.yaml`, replacing `!secret name` with the placeholder "secret:name".
+    """
+
+
+SecretLoader.add_constructor("!secret", lambda loader, node: f"secret:{loader.construct_scalar(node)}")
+
+
+def load_apps_config(path: str) -> dict:
+    with open(path) as file:
+        return yaml.load(file, Loader=SecretLoader)
+
+
+def find_entities(value) -> set:
+    """
+    Finds every entity id referenced in an app's args.
+    """
+
+    if isinstance(value, str):
+        return {value} if ENTITY_PATTERN.match(value) else set()
+    if isinstance(value, list):
+        return set().union(*[find_entities(item) for item in value]) if value else set()
+    if isinstance(value, dict):
+        return set().union(*[find_entities(item) for item in value.values()]) if value else set()
+    return set()
+
+
+def isolate_data(config: dict, directory: str) -> dict:
+    """
+    Returns the config with recorded history and persisted state kept in the directory, so runs
+    don't see each other's (or the source tree's) data.
+    """
+
+    return dict(config, recorder=dict(config["recorder"], path=os.path.join(directory, "recorder")),
+                state_store=dict(config["state_store"], path=os.path.join(directory, "state_store.db")))
+
+
+def get_app_order(config: dict) -> list:
+    """
+    Orders apps so every app comes after its dependencies. Global modules aren't apps, so they're skipped.
+    """
+
+    apps = {name: app for name, app in config.items() if isinstance(app, dict) and "class" in app}
+    ordered = []
+
+    def visit(name: str, path: tuple) -> None:
+        if name in ordered or name not in apps:
+            return
+        if name in path:
+            raise ValueError(f"Dependency cycle: {' -> '.join(path + (name,))}")
+
+        dependencies = apps[name].get("dependencies", [])
+        for dependency in [dependencies] if isinstance(dependencies, str) else dependencies:
+            visit(dependency, path + (name,))
+        ordered.append(name)
+
+    for name in apps:
+        visit(name, ())
+    return ordered
+
+
+def state_changed(at: datetime, entity: str, state, attributes: dict = None) -> dict:
+    return {"event_type": "state_changed", "time_fired": at.isoformat(),
+            "data": {"entity_id": entity, "new_state": {"state": state, "attributes": attributes or {}}}}
+
+
+def zha_event(at: datetime, device_id: str, command: str) -> dict:
+    return {"event_type": "zha_event", "time_fired": at.isoformat(),
+            "data": {"device_id": device_id, "command": command}}
+
+
+def generate_day(day: datetime, generator: random.Random, sensor_interval: int, elevation=None) -> list:
+    """
+    Generates a synthetic day of household activity.
+    @param elevation: Returns the sun's elevation at a time. Without it, the sun follows a fixed curve.
+    """
+
+    def at(clock: str, jitter: int = 600) -> datetime:
+        return datetime.combine(day.date(), time.fromisoformat(clock)) + timedelta(
+            seconds=generator.randint(-jitter, jitter))
+
+    events = []
+    # Presence, including the proximity sensors counting down on the way home.
+    for person, leave, arrive in (("allison", "07:30:00", "17:30:00"), ("owen", "14:00:00", "15:30:00")):
+        leave_at, arrive_at = at(leave), at(arrive)
+        events.append(state_changed(leave_at, f"person.{person}", "not_home"))
+        for miles in range(12, -1, -2):
+            events.append(state_changed(arrive_at - timedelta(minutes=miles * 2), f"sensor.{person}_distance_miles",
+                                        str(miles), {"dir_of_travel": "towards" if miles else "arrived"}))
+        events.append(state_changed(arrive_at, f"person.{person}", "home"))
+
+    # Work, lunch and TVs.
+    workday = day.weekday() < 5
+    events.append(state_changed(day, "binary_sensor.workday_sensor", "on" if workday else "off"))
+    if workday:
+        for clock, state in (("08:00:00", "on"), ("11:45:00", "off"), ("12:45:00", "on"), ("17:00:00", "off")):
+            events.append(state_changed(at(clock, 300), "switch.office_lights", state))
+            events.append(state_changed(at(clock, 300), "binary_sensor.owen_computer_active", state))
+    for clock, state in (("12:00:00", "on"), ("12:40:00", "off")):
+        events.append(state_changed(at(clock, 300), "binary_sensor.downstairs_tv_on", state))
+    for clock, state in (("19:00:00", "on"), ("22:30:00", "off")):
+        events.append(state_changed(at(clock, 300), "binary_sensor.upstairs_tv_on", state))
+    for clock, state in (("06:45:00", "on"), ("09:00:00", "off"), ("18:00:00", "on"), ("22:40:00", "off")):
+        events.append(state_changed(at(clock, 300), "binary_sensor.upstairs_active", state))
+        events.append(state_changed(at(clock, 300), "binary_sensor.downstairs_active", state))
+
+    # Buttons, including the duplicate Zigbee press the debouncing guards against.
+    for clock, device_id, command in (("18:10:00", "secret:dining_room_button_id", "single"),
+                                      ("19:05:00", "secret:allison_living_room_button_id", "on"),
+                                      ("22:35:00", "secret:owen_living_room_button_id", "on"),
+                                      ("22:50:00", "secret:bedroom_lamp_button_id", "single")):
+        pressed_at = at(clock, 300)
+        events.append(zha_event(pressed_at, device_id, command))
+        events.append(zha_event(pressed_at + timedelta(milliseconds=400), device_id, command))
+
+    # Bedroom, bedtime and laundry.
+    events.append(state_changed(at("21:05:00", 300), "switch.bedroom_lights", "on"))
+    events.append(state_changed(at("22:45:00", 300), "switch.bedroom_lights", "off"))
+    events.append(state_changed(at("23:00:00", 300), "sensor.owen_phone_charger_type", "wireless"))
+    for appliance, start in (("washer", "09:00:00"), ("dryer", "10:30:00")):
+        started_at = at(start)
+        events.append(state_changed(started_at, f"sensor.{appliance}_{appliance}_machine_state", "run"))
+        events.append(state_changed(started_at + timedelta(minutes=55), f"sensor.{appliance}_{appliance}_machine_state",
+                                    "stop"))
+
+    # An internet outage and a plug dropping off the network.
+    outage_at = at("03:00:00")
+    events.append(state_changed(outage_at, "binary_sensor.internet_up", "off"))
+    events.append(state_changed(outage_at + timedelta(minutes=4), "binary_sensor.internet_up", "on"))
+    unavailable_at = at("04:00:00")
+    events.append(state_changed(unavailable_at, "switch.owen_living_room_lamp", "unavailable"))
+    events.append(state_changed(unavailable_at + timedelta(seconds=3), "switch.owen_living_room_lamp", "off"))
+
+    # A Zigbee outage: several devices dropping off together and coming back half an hour later.
+    zigbee_outage_at = at("05:00:00")
+    for index, entity in enumerate(("switch.garage_lights", "switch.kitchen_lights", "switch.upstairs_tv_smart_plug")):
+        events.append(state_changed(zigbee_outage_at + timedelta(seconds=index), entity, "unavailable"))
+        events.append(state_changed(zigbee_outage_at + timedelta(minutes=30, seconds=index), entity, "off"))
+
+    # High-frequency attributes: sun elevation and temperatures.
+    current_temperature = 70.0
+    bedroom_temperature = 70.0
+    for second in range(0, 24 * 60 * 60, sensor_interval):
+        sampled_at = day + timedelta(seconds=second)
+        if elevation is None:
+            sun_elevation = round(60 * math.sin(math.pi * (second / 3600 - 6.5) / 13.5), 2)
+        else:
+            sun_elevation = round(elevation(sampled_at), 2)
+        events.append(state_changed(sampled_at, "sun.sun", "above_horizon" if sun_elevation > 0 else "below_horizon",
+                                    {"elevation": sun_elevation}))
+        current_temperature = min(76.0, max(64.0, current_temperature + generator.uniform(-0.3, 0.3)))
+        events.append(state_changed(sampled_at, "climate.main", None,
+                                    {"current_temperature": round(current_temperature, 1)}))
+        bedroom_temperature = min(78.0, max(64.0, bedroom_temperature + generator.uniform(-0.3, 0.3)))
+        events.append(state_changed(sampled_at, "sensor.bedroom_temperature_sensor_temperature",
+                                    str(round(bedroom_temperature, 1))))
+
+    return events
+
+
+def load_stream(path: str) -> list:
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def apply_event(runtime: fake_hass.FakeHomeAssistant, event: dict) -> None:
+    """
+    Applies one stream event to the fake.
+    """
+
+    if event["event_type"] == "state_changed":
+        new_state = event["data"]["new_state"] or {}
+        runtime.set_entity_state(event["data"]["entity_id"], new_state.get("state"), new_state.get("attributes"))
+    else:
+        runtime.fire_event(event["event_type"], dict(event["data"]))
+    runtime.run_pending()
+
+
+def create_runtime(config: dict, start: datetime, location=None) -> fake_hass.FakeHomeAssistant:
+    """
+    Creates the fake with default states for every referenced entity.
+    @param location: A `solar.Location` for sunsets. Without it, the sun sets at 19:30 every day.
+    """
+
+    fake_hass.install()
+    for directory in (APPS_DIRECTORY, os.path.join(APPS_DIRECTORY, "utils")):
+        if directory not in sys.path:
+            sys.path.insert(0, directory)
+
+    runtime = fake_hass.FakeHomeAssistant(start, location=location)
+    importlib.import_module("debounce").clock = runtime.monotonic
+    for entity in sorted(set().union(*[find_entities(app) for app in config.values() if isinstance(app, dict)])):
+        domain = entity.split(".", 1)[0]
+        state, attributes = ENTITY_DEFAULTS.get(entity, (DOMAIN_DEFAULTS.get(domain, "unknown"), {}))
+        runtime.set_entity_state(entity, state, attributes)
+    return runtime
+
+
+def set_up(config: dict, start: datetime, location=None) -> fake_hass.FakeHomeAssistant:
+    """
+    Creates the fake and loads every app in dependency order.
+    """
+
+    runtime = create_runtime(config, start, location)
+    for name in get_app_order(config):
+        fake_hass.load_app(runtime, name, config[name], config)
+    runtime.run_pending()
+    return runtime
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def build_report(runtime: fake_hass.FakeHomeAssistant, events: int, wall: float) -> dict:
+    latencies = [latency for stats in runtime.stats.values() for latency in stats.latencies]
+    return {
+        "events": events,
+        "wall_seconds": wall,
+        "callbacks": len(latencies),
+        "callbacks_per_second": len(latencies) / wall if wall else 0.0,
+        "p50_latency_ms": percentile(latencies, 0.5) * 1000,
+        "p99_latency_ms": percentile(latencies, 0.99) * 1000,
+        "peak_timers": runtime.peak_timers,
+        "notifications": len(runtime.notifications),
+        "apps": {
+            app: {
+                "callbacks": stats.callbacks,
+                "p50_latency_ms": percentile(stats.latencies, 0.5) * 1000,
+                "p99_latency_ms": percentile(stats.latencies, 0.99) * 1000,
+                "state_reads": stats.state_reads,
+                "service_calls": stats.service_calls,
+                "peak_timers": stats.peak_timers,
+                "errors": [repr(error) for error in stats.errors],
+            } for app, stats in sorted(runtime.stats.items())
+        },
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"{report['events']} events, {report['callbacks']} callbacks in {report['wall_seconds']:.2f}s "
+          f"({report['callbacks_per_second']:.0f} callbacks/s), p50 {report['p50_latency_ms']:.3f}ms, "
+          f"p99 {report['p99_latency_ms']:.3f}ms, peak timers {report['peak_timers']}, "
+          f"{report['notifications']} notifications")
+    print(f"{'app':<26}{'callbacks':>10}{'p50 ms':>9}{'p99 ms':>9}{'reads':>8}{'calls':>8}{'timers':>8}{'errors':>8}")
+    for app, stats in report["apps"].items():
+        print(f"{app:<26}{stats['callbacks']:>10}{stats['p50_latency_ms']:>9.3f}{stats['p99_latency_ms']:>9.3f}"
+              f"{stats['state_reads']:>8}{stats['service_calls']:>8}{stats['peak_timers']:>8}"
+              f"{len(stats['errors']):>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", default=os.path.join(APPS_DIRECTORY, "apps.yaml"))
+    parser.add_argument("--stream", help="JSON lines event stream to replay. Generated if not provided.")
+    parser.add_argument("--write-stream", help="Writes the replayed stream to this path.")
+    parser.add_argument("--start", default="2024-01-15", help="Date the synthetic stream starts on.")
+    parser.add_argument("--days", type=int, default=1, help="Days of synthetic events to generate.")
+    parser.add_argument("--sensor-interval", type=int, default=60,
+                        help="Seconds between synthetic sun/temperature samples.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Prints the report as JSON.")
+    options = parser.parse_args()
+
+    if options.stream:
+        events = load_stream(options.stream)
+        start = datetime.fromisoformat(events[0]["time_fired"]).replace(hour=0, minute=0, second=0, microsecond=0)
+    else:
+        start = datetime.fromisoformat(options.start)
+        generator = random.Random(options.seed)
+        events = [event for day in range(options.days)
+                  for event in generate_day(start + timedelta(days=day), generator, options.sensor_interval)]
+    events.sort(key=lambda event: event["time_fired"])
+
+    if options.write_stream:
+        with open(options.write_stream, "w") as file:
+            file.writelines(json.dumps(event) + "\n" for event in events)
+
+    with tempfile.TemporaryDirectory() as data_directory:
+        config = load_apps_config(options.apps)
+        config = isolate_data(config, data_directory)
+        runtime = set_up(config, start)
+        started = wall_clock.perf_counter()
+        for event in events:
+            runtime.advance(datetime.fromisoformat(event["time_fired"]))
+            apply_event(runtime, event)
+        runtime.advance(start + timedelta(days=options.days))
+        fake_hass.unload_apps(runtime)
+        wall = wall_clock.perf_counter() - started
+
+    report = build_report(runtime, len(events), wall)
+    if options.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Simulates days of household activity through every app in `apps.yaml` on the fake's virtual
+clock, with the sun following the local solar model in `solar.py` for the location in
+`appdaemon.yaml`.
+
+The clock jumps straight from one event or timer (`run_daily`, `run_at_sunset`, `run_in`,
+`listen_state` durations, `await self.sleep()`) to the next, so a week runs in seconds. Runs are
+deterministic for a seed: activity, jitter and backoff are all drawn from it, and apps start with
+empty persisted state and history.
+
+The location is read from `appdaemon.yaml`, resolving `!secret` values from its `secrets` file
+when it exists. Otherwise (or for values given on the command line) the arguments are used.
+
+Usage: python benchmarks/simulate.py [--days 7] [--start 2024-01-15] [--seed 0] [--json]
+"""
+
+import argparse
+from datetime import datetime, timedelta
+import json
+import os
+import random
+import sys
+import tempfile
+import time as wall_clock
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fake_hass  # noqa: E402
+import replay  # noqa: E402
+import solar  # noqa: E402
+
+APPDAEMON_CONFIG = os.path.join(os.path.dirname(replay.APPS_DIRECTORY), "appdaemon.yaml")
+DEFAULT_LOCATION = {"latitude": 45.0, "longitude": -93.0, "time_zone": "America/Chicago"}
+
+
+def load_location(path: str, overrides: dict) -> solar.Location:
+    """
+    Returns the location from `appdaemon.yaml`. Values that are overridden, missing or secrets that
+    can't be resolved fall back to the overrides, then the defaults.
+    """
+
+    with open(path) as file:
+        config = yaml.load(file, Loader=replay.SecretLoader)
+    secrets = {}
+    if config.get("secrets") and os.path.exists(config["secrets"]):
+        with open(config["secrets"]) as file:
+            secrets = yaml.safe_load(file) or {}
+
+    location = {}
+    for key, default in DEFAULT_LOCATION.items():
+        value = overrides.get(key)
+        if value is None:
+            value = config.get("appdaemon", {}).get(key)
+        if isinstance(value, str) and value.startswith("secret:"):
+            value = secrets.get(value[len("secret:"):])
+        location[key] = default if value is None else value
+    return solar.Location(**location)
+
+
+def simulate(config: dict, location: solar.Location, start: datetime, days: int, seed: int,
+             sensor_interval: int) -> dict:
+    """
+    Runs the apps through the days and returns the replay report, with a summary of each day.
+    """
+
+    random.seed(seed)  # Apps' own jitter, such as ping backoff.
+    generator = random.Random(seed)
+    with tempfile.TemporaryDirectory() as data_directory:
+        runtime = replay.set_up(replay.isolate_data(config, data_directory), start, location)
+
+        started = wall_clock.perf_counter()
+        summaries = []
+        total_events = 0
+        for day in range(days):
+            day_start = start + timedelta(days=day)
+            events = sorted(replay.generate_day(day_start, generator, sensor_interval, location.elevation),
+                            key=lambda event: event["time_fired"])
+            callbacks = sum(stats.callbacks for stats in runtime.stats.values())
+            notifications = len(runtime.notifications)
+            day_started = wall_clock.perf_counter()
+            for event in events:
+                runtime.advance(datetime.fromisoformat(event["time_fired"]))
+                replay.apply_event(runtime, event)
+            runtime.advance(day_start + timedelta(days=1))
+
+            sunset = location.sunset(day_start.date())
+            summaries.append({
+                "date": day_start.date().isoformat(),
+                "sunset": sunset.time().isoformat() if sunset else None,
+                "events": len(events),
+                "callbacks": sum(stats.callbacks for stats in runtime.stats.values()) - callbacks,
+                "notifications": len(runtime.notifications) - notifications,
+                "wall_seconds": wall_clock.perf_counter() - day_started,
+            })
+            total_events += len(events)
+
+        fake_hass.unload_apps(runtime)
+        wall = wall_clock.perf_counter() - started
+
+    report = replay.build_report(runtime, total_events, wall)
+    report["location"] = {"latitude": location.latitude, "longitude": location.longitude,
+                          "time_zone": str(location.time_zone)}
+    report["days"] = summaries
+    return report
+
+
+def print_days(report: dict) -> None:
+    location = report["location"]
+    print(f"Location {location['latitude']}, {location['longitude']} ({location['time_zone']})")
+    print(f"{'date':<12}{'sunset':>10}{'events':>8}{'callbacks':>11}{'notify':>8}{'wall s':>8}")
+    for day in report["days"]:
+        print(f"{day['date']:<12}{day['sunset'] or '-':>10}{day['events']:>8}{day['callbacks']:>11}"
+              f"{day['notifications']:>8}{day['wall_seconds']:>8.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", default=os.path.join(replay.APPS_DIRECTORY, "apps.yaml"))
+    parser.add_argument("--appdaemon", default=APPDAEMON_CONFIG, help="`appdaemon.yaml` to read the location from.")
+    parser.add_argument("--latitude", type=float)
+    parser.add_argument("--longitude", type=float)
+    parser.add_argument("--time-zone")
+    parser.add_argument("--start", default="2024-01-15", help="Date the simulation starts on.")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--sensor-interval", type=int, default=60,
+                        help="Seconds between sun/temperature samples.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Prints the report as JSON.")
+    options = parser.parse_args()
+
+    location = load_location(options.appdaemon, {"latitude": options.latitude, "longitude": options.longitude,
+                                                 "time_zone": options.time_zone})
+    report = simulate(replay.load_apps_config(options.apps), location, datetime.fromisoformat(options.start),
+                      options.days, options.seed, options.sensor_interval)
+    if options.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_days(report)
+        replay.print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+A local solar model (NOAA's solar calculator equations), so simulations get the sun's elevation
+and sunset for a location without a network or Home Assistant.
+
+Accurate to about a minute for sunset and a few tenths of a degree for elevation between the
+polar circles. Elevation is geometric (no atmospheric refraction); sunset uses the standard
+-0.833 degree altitude, which accounts for refraction and the sun's radius.
+
+Times are naive local datetimes in the location's time zone, as the fake's virtual clock uses.
+"""
+
+from datetime import date, datetime, time, timedelta, timezone
+import math
+from zoneinfo import ZoneInfo
+
+SUNSET_ALTITUDE = -0.833  # Degrees. The sun's upper edge on the horizon, with refraction.
+
+
+class Location:
+    """
+    Where the sun is calculated for.
+    """
+
+    latitude: float
+    longitude: float
+    time_zone: ZoneInfo
+
+    def __init__(self, latitude: float, longitude: float, time_zone: str) -> None:
+        self.latitude = float(latitude)
+        self.longitude = float(longitude)
+        self.time_zone = ZoneInfo(time_zone)
+
+    def to_utc(self, at: datetime) -> datetime:
+        return at.replace(tzinfo=self.time_zone).astimezone(timezone.utc)
+
+    def to_local(self, at: datetime) -> datetime:
+        return at.astimezone(self.time_zone).replace(tzinfo=None)
+
+    def elevation(self, at: datetime) -> float:
+        """
+        Returns the sun's elevation in degrees at the local time.
+        """
+
+        at = self.to_utc(at)
+        declination, equation_of_time = get_sun(at)
+        minutes = at.hour * 60 + at.minute + at.second / 60
+        hour_angle = math.radians((minutes + equation_of_time + 4 * self.longitude) / 4 - 180)
+        latitude = math.radians(self.latitude)
+        cos_zenith = (math.sin(latitude) * math.sin(declination) +
+                      math.cos(latitude) * math.cos(declination) * math.cos(hour_angle))
+        return 90 - math.degrees(math.acos(max(-1.0, min(1.0, cos_zenith))))
+
+    def sunset(self, day: date) -> datetime:
+        """
+        Returns the local time of sunset on the day, or None if the sun doesn't set (or rise) that day.
+        """
+
+        # Solved at noon, then again at the first estimate, since the sun moves during the day.
+        estimate = datetime.combine(day, time(12)) - timedelta(hours=self.longitude / 15)
+        estimate = estimate.replace(tzinfo=timezone.utc)
+        for _ in range(2):
+            declination, equation_of_time = get_sun(estimate)
+            latitude = math.radians(self.latitude)
+            cos_hour_angle = ((math.sin(math.radians(SUNSET_ALTITUDE)) -
+                               math.sin(latitude) * math.sin(declination)) /
+                              (math.cos(latitude) * math.cos(declination)))
+            if not -1 <= cos_hour_angle <= 1:
+                return None
+            minutes = 720 - 4 * self.longitude - equation_of_time + 4 * math.degrees(math.acos(cos_hour_angle))
+            estimate = datetime.combine(day, time(), timezone.utc) + timedelta(minutes=minutes)
+
+        # The UTC day can differ from the local one, so the sunset is moved onto the local day.
+        local = self.to_local(estimate).replace(microsecond=0)
+        return local + timedelta(days=(day - local.date()).days)
+
+    def next_sunset(self, after: datetime, offset: float = 0) -> datetime:
+        """
+        Returns the first sunset (plus offset seconds) after the local time.
+        """
+
+        for days in range(-1, 367):
+            sunset = self.sunset(after.date() + timedelta(days=days))
+            if sunset is not None and sunset + timedelta(seconds=offset) > after:
+                return sunset + timedelta(seconds=offset)
+        raise ValueError(f"The sun doesn't set at latitude {self.latitude}.")
+
+
+def get_sun(at: datetime) -> tuple:
+    """
+    Returns the sun's declination (in radians) and the equation of time (in minutes) at the UTC time.
+    """
+
+    julian_day = (at - datetime(2000, 1, 1, 12, tzinfo=timezone.utc)).total_seconds() / 86400 + 2451545
+    century = (julian_day - 2451545) / 36525
+
+    mean_longitude = math.radians((280.46646 + century * (36000.76983 + century * 0.0003032)) % 360)
+    mean_anomaly = math.radians(357.52911 + century * (35999.05029 - 0.0001537 * century))
+    eccentricity = 0.016708634 - century * (0.000042037 + 0.0000001267 * century)
+    center = math.radians(math.sin(mean_anomaly) * (1.914602 - century * (0.004817 + 0.000014 * century)) +
+                          math.sin(2 * mean_anomaly) * (0.019993 - 0.000101 * century) +
+                          math.sin(3 * mean_anomaly) * 0.000289)
+    omega = math.radians(125.04 - 1934.136 * century)
+    apparent_longitude = mean_longitude + center - math.radians(0.00569 + 0.00478 * math.sin(omega))
+    mean_obliquity = 23 + (26 + (21.448 - century * (46.815 + century * (0.00059 - century * 0.001813))) / 60) / 60
+    obliquity = math.radians(mean_obliquity + 0.00256 * math.cos(omega))
+
+    declination = math.asin(math.sin(obliquity) * math.sin(apparent_longitude))
+    y = math.tan(obliquity / 2) ** 2
+    equation_of_time = 4 * math.degrees(
+        y * math.sin(2 * mean_longitude) - 2 * eccentricity * math.sin(mean_anomaly) +
+        4 * eccentricity * y * math.sin(mean_anomaly) * math.cos(2 * mean_longitude) -
+        0.5 * y * y * math.sin(4 * mean_longitude) - 1.25 * eccentricity ** 2 * math.sin(2 * mean_anomaly))
+    return declination, equation_of_time
@@ -0,0 +1,84 @@
+"""
+Measures app startup: loads every app in `apps.yaml` against the local fake in `fake_hass.py`
+and reports each app's `initialize` wall time, state reads and service calls.
+
+HASS round trips are instant in the fake, so startup time against a real HASS is estimated as
+wall time plus `--latency-ms` per round trip. Apps are initialized one after another, as
+AppDaemon does, so the total is the sum over every app.
+
+Usage: python benchmarks/startup.py [--latency-ms 5] [--json]
+"""
+
+import argparse
+from datetime import datetime
+import json
+import os
+import sys
+import tempfile
+import time as wall_clock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import fake_hass  # noqa: E402
+import replay  # noqa: E402
+
+
+def measure_startup(config: dict, start: datetime, latency_ms: float) -> dict:
+    """
+    Loads every app in dependency order and records what each `initialize` did.
+    """
+
+    runtime = replay.create_runtime(config, start)
+    apps = {}
+    for name in replay.get_app_order(config):
+        stats = runtime.stats[name]
+        reads, calls = stats.state_reads, stats.service_calls
+        started = wall_clock.perf_counter()
+        fake_hass.load_app(runtime, name, config[name], config)
+        wall_ms = (wall_clock.perf_counter() - started) * 1000
+        reads, calls = stats.state_reads - reads, stats.service_calls - calls
+        apps[name] = {
+            "wall_ms": wall_ms,
+            "state_reads": reads,
+            "service_calls": calls,
+            "estimated_ms": wall_ms + (reads + calls) * latency_ms,
+        }
+
+    runtime.run_pending()
+    fake_hass.unload_apps(runtime)
+
+    return {
+        "apps": apps,
+        "total_ms": sum(app["estimated_ms"] for app in apps.values()),
+        "state_reads": sum(app["state_reads"] for app in apps.values()),
+        "service_calls": sum(app["service_calls"] for app in apps.values()),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", default=os.path.join(replay.APPS_DIRECTORY, "apps.yaml"))
+    parser.add_argument("--start", default="2024-01-15T12:00:00", help="Time the apps start at.")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Milliseconds per HASS round trip.")
+    parser.add_argument("--json", action="store_true", help="Prints the report as JSON.")
+    options = parser.parse_args()
+
+    config = replay.load_apps_config(options.apps)
+    start = datetime.fromisoformat(options.start)
+    with tempfile.TemporaryDirectory() as data_directory:
+        config = replay.isolate_data(config, data_directory)
+        report = measure_startup(config, start, options.latency_ms)
+
+    if options.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'app':<26}{'wall ms':>9}{'reads':>7}{'calls':>7}{'est ms':>9}")
+    for app, stats in report["apps"].items():
+        print(f"{app:<26}{stats['wall_ms']:>9.2f}{stats['state_reads']:>7}"
+              f"{stats['service_calls']:>7}{stats['estimated_ms']:>9.1f}")
+    print(f"Total: {report['state_reads']} state reads, {report['service_calls']} service calls, "
+          f"{report['total_ms']:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
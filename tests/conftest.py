@@ -0,0 +1,5 @@
+import os
+import sys
+
+# AppDaemon puts the apps directory on the path, which the apps' `utils.X` imports rely on.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "apps"))
@@ -0,0 +1,73 @@
+import math
+from datetime import datetime, time
+from unittest import mock
+from apps.climate import Climate, RecoveryModel
+
+def test_recovery_model_defaults():
+    model = RecoveryModel()
+
+    assert model.get_hours(4) == 2
+    assert model.get_hours(-1) == 0  # Already past the target.
+
+def test_recovery_model_fits_rate():
+    model = RecoveryModel()
+
+    model.add(3, 2)  # 1.5 degrees an hour. The first recovery replaces the default.
+    assert math.isclose(model.rate, 1.5)
+
+    model.add(2, 0.5)  # 4 degrees an hour.
+    assert math.isclose(model.rate, 2.75)
+    assert model.to_dict() == {"rate": model.rate, "samples": 2}
+
+def test_recovery_model_follows_recent_recoveries():
+    model = RecoveryModel(rate = 1, samples = 100, window = 4)
+
+    for _ in range(20):
+        model.add(3, 1)
+
+    assert math.isclose(model.rate, 3, rel_tol = 0.01)
+
+def test_recovery_model_restored():
+    model = RecoveryModel(**RecoveryModel(rate = 1.25, samples = 7).to_dict())
+
+    assert model.rate == 1.25
+    assert model.samples == 7
+
+def test_precondition_time_wraps_past_midnight():
+    climate = mock.Mock(precondition_seconds = 2 * 60 * 60)
+    climate.state.day_time = time(6, 30)
+    climate.state.night_time = time(1, 0)
+
+    assert Climate.get_precondition_time(climate, True) == time(4, 30)
+    assert Climate.get_precondition_time(climate, False) == time(23, 0)
+
+def test_away_minutes_falls_back_to_configured():
+    climate = mock.Mock(args = {"away_minutes": 45})
+    climate.state.away_minutes = None
+
+    assert Climate.get_away_minutes(climate) == 45
+    assert climate.log.call_args.kwargs == {"level": "WARNING"}
+
+    climate.state.away_minutes = 20
+    assert Climate.get_away_minutes(climate) == 20
+
+def test_precondition_check_can_be_cancelled():
+    climate = mock.Mock(precondition_seconds = 2 * 60 * 60, precondition_handlers = {},
+                        recovery_models = {"heat": RecoveryModel(rate = 4)})
+    climate.state.day_time = time(6, 30)
+    climate.state.set_temperature = 66
+    climate.state.current_temperature = 66
+    climate.timers.get_next_fire_at.return_value = datetime(2024, 1, 15, 6, 30)
+    climate.datetime.return_value = datetime(2024, 1, 15, 4, 30)
+    climate.get_new_temperature.return_value = 70
+    climate.get_mode.return_value = "heat"
+    climate.get_degrees_to.return_value = 4  # An hour at 4 degrees an hour, so checked again in an hour.
+    climate.run_in.return_value = "check"
+
+    Climate.on_precondition_time(climate, {"is_day": True})
+    climate.run_in.assert_called_once_with(climate.on_precondition_check, 3600, is_day = True)
+    assert climate.precondition_handlers == {True: "check"}
+
+    Climate.cancel_precondition_check(climate, True)
+    climate.cancel_timer.assert_called_once_with("check")
+    assert climate.precondition_handlers == {}
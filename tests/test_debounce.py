@@ -0,0 +1,53 @@
+from unittest import mock
+from apps.utils import debounce
+from apps.utils.debounce import Debouncer, Edge
+
+def test_leading_edge():
+    debouncer = Debouncer(mock.Mock(), 2)
+
+    with mock.patch.object(debounce, "clock", return_value = 100):
+        assert debouncer.ready("light.office_lights")
+        assert not debouncer.ready("light.office_lights")
+        assert debouncer.ready("light.downstairs_lights")
+    with mock.patch.object(debounce, "clock", return_value = 101.9):
+        assert not debouncer.ready("light.office_lights")
+    with mock.patch.object(debounce, "clock", return_value = 102):
+        assert debouncer.ready("light.office_lights")
+
+def test_leading_edge_call():
+    debouncer = Debouncer(mock.Mock(), 2)
+    callback = mock.Mock()
+
+    with mock.patch.object(debounce, "clock", return_value = 100):
+        debouncer.call("light.office_lights", callback, "first")
+        debouncer.call("light.office_lights", callback, "second")
+
+    callback.assert_called_once_with("first")
+
+def test_trailing_edge_call():
+    app = mock.Mock()
+    app.run_in.side_effect = ["timer_1", "timer_2"]
+    debouncer = Debouncer(app, 2, Edge.Trailing)
+    callback = mock.Mock()
+
+    debouncer.call("light.office_lights", callback, "first")
+    debouncer.call("light.office_lights", callback, "second", brightness = 128)
+
+    # Each call replaces the pending one, so only the last runs once the calls stop.
+    app.cancel_timer.assert_called_once_with("timer_1")
+    assert callback.call_count == 0
+    debouncer.on_window_end(app.run_in.call_args.kwargs)
+    callback.assert_called_once_with("second", brightness = 128)
+    assert debouncer.pending == {}
+
+def test_tracked_entity():
+    app = mock.Mock()
+    debouncer = Debouncer(app, 2)
+
+    debouncer.track("light.office_lights")
+    app.listen_state.assert_called_once_with(debouncer.on_tracked_updated, "light.office_lights")
+
+    with mock.patch.object(debounce, "clock", return_value = 100):
+        debouncer.on_tracked_updated("light.office_lights", "state", "off", "on", {})
+        assert debouncer.recently_triggered("light.office_lights")
+        assert not debouncer.ready("light.office_lights")
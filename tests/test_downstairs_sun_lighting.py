@@ -17,8 +17,8 @@ def test_light_on_no_brightness_attribute(hass_driver, downstairs_sun_lighting:
         "light.downstairs_lights",
         attribute = "brightness"
     )
-    set_state = hass_driver.get_mock("set_state")
-    assert set_state.call_count == 0
+    turn_on = hass_driver.get_mock("turn_on")
+    assert turn_on.call_count == 0
 
 def test_light_on_night(hass_driver, downstairs_sun_lighting: DownstairsSunLighting):
     with hass_driver.setup():
@@ -27,12 +27,12 @@ def test_light_on_night(hass_driver, downstairs_sun_lighting: DownstairsSunLight
 
     hass_driver.set_state("light.downstairs_lights", "on")
 
-    set_state = hass_driver.get_mock("set_state")
-    assert set_state.call_count == 1
-    set_state.assert_called_once_with(
+    turn_on = hass_driver.get_mock("turn_on")
+    assert turn_on.call_count == 1
+    turn_on.assert_called_once_with(
         "light.downstairs_lights",
-        state = "on",
-        attributes = {"brightness": "128"}
+        brightness = 164,
+        color_temp_kelvin = 3100
     )
 
 def test_light_on_day(hass_driver, downstairs_sun_lighting: DownstairsSunLighting):
@@ -42,14 +42,42 @@ def test_light_on_day(hass_driver, downstairs_sun_lighting: DownstairsSunLightin
 
     hass_driver.set_state("light.downstairs_lights", "on")
 
-    set_state = hass_driver.get_mock("set_state")
-    assert set_state.call_count == 1
-    set_state.assert_called_once_with(
+    turn_on = hass_driver.get_mock("turn_on")
+    assert turn_on.call_count == 1
+    turn_on.assert_called_once_with(
         "light.downstairs_lights",
-        state = "on",
-        attributes = {"brightness": "255"}
+        brightness = 214,
+        color_temp_kelvin = 3750
     )
 
+def test_sun_elevation_changes(hass_driver, downstairs_sun_lighting: DownstairsSunLighting):
+    with hass_driver.setup():
+        hass_driver.set_state("light.downstairs_lights", "on")
+        hass_driver.set_state("light.downstairs_lights", 255, attribute_name="brightness")
+        hass_driver.set_state("sun.sun", 15, attribute_name="elevation")
+
+    hass_driver.set_state("sun.sun", 12, attribute_name="elevation")
+    # Within the brightness and color temperature deltas (and the rate limit) of the last update.
+    hass_driver.set_state("sun.sun", 9, attribute_name="elevation")
+
+    turn_on = hass_driver.get_mock("turn_on")
+    assert turn_on.call_count == 1
+    turn_on.assert_called_once_with(
+        "light.downstairs_lights",
+        brightness = 206,
+        color_temp_kelvin = 3600
+    )
+
+def test_light_off(hass_driver, downstairs_sun_lighting: DownstairsSunLighting):
+    with hass_driver.setup():
+        hass_driver.set_state("light.downstairs_lights", "off")
+        hass_driver.set_state("sun.sun", 15, attribute_name="elevation")
+
+    hass_driver.set_state("sun.sun", 5, attribute_name="elevation")
+
+    turn_on = hass_driver.get_mock("turn_on")
+    assert turn_on.call_count == 0
+
 
 @automation_fixture(
     DownstairsSunLighting,
@@ -0,0 +1,69 @@
+from unittest import mock
+from appdaemon_testing.pytest import automation_fixture
+from apps.utils.gates import ListenerGroup
+from apps.utils.utils import Utils
+
+AUTOMATIONS = "input_boolean.lights_living_room_automations"
+VACATION = "input_boolean.mode_vacation"
+
+def create_group(utils: Utils, on_change = None) -> ListenerGroup:
+    utils.get_app = lambda name: utils
+    utils.cancel_listen_state = mock.Mock()
+    with utils.snapshot(AUTOMATIONS, VACATION):
+        group = ListenerGroup(utils, require_on = [AUTOMATIONS], require_off = [VACATION], on_change = on_change)
+    group.listen_state(mock.Mock(), "binary_sensor.upstairs_tv_on", new = "on")
+    return group
+
+def get_trigger_registrations(hass_driver) -> list:
+    listen_state = hass_driver.get_mock("listen_state")
+    return [call for call in listen_state.call_args_list if call.args[1] == "binary_sensor.upstairs_tv_on"]
+
+def test_open_group_registers(hass_driver, utils: Utils):
+    with hass_driver.setup():
+        hass_driver.set_state(AUTOMATIONS, "on")
+        hass_driver.set_state(VACATION, "off")
+
+    group = create_group(utils)
+
+    assert group.is_open
+    assert len(get_trigger_registrations(hass_driver)) == 1
+
+def test_closed_group_does_not_register(hass_driver, utils: Utils):
+    with hass_driver.setup():
+        hass_driver.set_state(AUTOMATIONS, "on")
+        hass_driver.set_state(VACATION, "on")
+
+    group = create_group(utils)
+
+    assert not group.is_open
+    assert len(get_trigger_registrations(hass_driver)) == 0
+
+def test_gates_close_and_open(hass_driver, utils: Utils):
+    with hass_driver.setup():
+        hass_driver.set_state(AUTOMATIONS, "on")
+        hass_driver.set_state(VACATION, "off")
+    on_change = mock.Mock()
+    group = create_group(utils, on_change)
+
+    hass_driver.set_state(VACATION, "on")
+
+    assert not group.is_open
+    assert utils.cancel_listen_state.call_count == 1
+    on_change.assert_called_once_with(False)
+
+    # Still closed, since vacation mode is on.
+    hass_driver.set_state(AUTOMATIONS, "off")
+    hass_driver.set_state(VACATION, "off")
+    assert len(get_trigger_registrations(hass_driver)) == 1
+
+    hass_driver.set_state(AUTOMATIONS, "on")
+
+    assert group.is_open
+    assert len(get_trigger_registrations(hass_driver)) == 2
+    on_change.assert_called_with(True)
+
+
+@automation_fixture(Utils)
+
+def utils() -> Utils:
+    pass
@@ -0,0 +1,160 @@
+import asyncio
+from unittest import mock
+from appdaemon_testing.pytest import automation_fixture
+from apps.health_monitor import HealthMonitor
+
+def run(coroutine):
+    """
+    Runs the coroutine on a new event loop. Not `asyncio.run`, which leaves the thread without an
+    event loop, and AppDaemon's sync API (used by the other tests) needs one.
+    """
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+def set_up(health_monitor: HealthMonitor, states: dict) -> asyncio.Event:
+    """
+    Replaces HASS with mocks. Returns an event that ends the outage window when set.
+    """
+
+    outage_window_over = asyncio.Event()
+
+    async def sleep(seconds: float) -> None:
+        if seconds == health_monitor.outage_window:
+            await outage_window_over.wait()
+
+    state_store = mock.Mock()
+    state_store.get.return_value = None
+    health_monitor.get_app = lambda name: state_store
+    health_monitor.get_state = mock.AsyncMock(return_value = {entity: {"state": state} for entity, state in states.items()})
+    health_monitor.listen_state = mock.AsyncMock()
+    health_monitor.set_state = mock.AsyncMock()
+    health_monitor.sleep = sleep
+    health_monitor.notify_users = mock.AsyncMock()
+    health_monitor.command_and_confirm = mock.AsyncMock(return_value = False)  # Pings go unanswered.
+    health_monitor.create_task = asyncio.ensure_future
+    return outage_window_over
+
+async def go_unavailable(health_monitor: HealthMonitor, *entities: str) -> None:
+    for entity in entities:
+        await health_monitor.on_state_updated(entity, "state", "on", "unavailable", {})
+    await asyncio.gather(*[health_monitor.watched[entity].task for entity in entities])
+
+def test_backoff(health_monitor: HealthMonitor):
+    set_up(health_monitor, {})
+    run(health_monitor.initialize())
+
+    with mock.patch("random.uniform", return_value = 1) as uniform:
+        assert health_monitor.get_backoff(1) == 60
+        assert health_monitor.get_backoff(2) == 120
+        assert health_monitor.get_backoff(5) == 900  # Capped at backoff_max.
+    uniform.assert_called_with(0.8, 1.2)
+
+def test_backoff_jitter(health_monitor: HealthMonitor):
+    set_up(health_monitor, {})
+    run(health_monitor.initialize())
+
+    with mock.patch("random.uniform", return_value = 1.2):
+        assert health_monitor.get_backoff(3) == 288
+
+def test_pings_back_off(health_monitor: HealthMonitor):
+    async def test():
+        outage_window_over = set_up(health_monitor, {"light.office_lights": "on", "switch.office_fan": "on"})
+        await health_monitor.initialize()
+        with mock.patch("random.uniform", return_value = 1):
+            await go_unavailable(health_monitor, "switch.office_fan")
+        outage_window_over.set()
+        await health_monitor.outage["task"]
+
+    run(test())
+
+    timeouts = [call.args[3] for call in health_monitor.command_and_confirm.call_args_list]
+    assert timeouts == [60, 120, 240, 480]
+    assert health_monitor.command_and_confirm.call_args.kwargs == {"entity_id": "button.office_fan_ping"}
+    assert health_monitor.down == {"switch.office_fan"}
+
+def test_outage_is_coalesced(health_monitor: HealthMonitor):
+    async def test():
+        outage_window_over = set_up(health_monitor, {"light.office_lights": "on", "switch.office_fan": "on"})
+        await health_monitor.initialize()
+
+        await go_unavailable(health_monitor, "light.office_lights")
+        await go_unavailable(health_monitor, "switch.office_fan")
+        assert health_monitor.down == {"light.office_lights", "switch.office_fan"}
+        outage_window_over.set()
+        await health_monitor.outage["task"]
+
+    run(test())
+
+    health_monitor.notify_users.assert_called_once()
+    message, person = health_monitor.notify_users.call_args.args
+    assert message == "2 entities are unavailable: light.office_lights, switch.office_fan."
+    assert person.name == "Owen"
+
+def test_outage_ends_before_alert(health_monitor: HealthMonitor):
+    async def test():
+        set_up(health_monitor, {"light.office_lights": "on", "switch.office_fan": "on"})
+        await health_monitor.initialize()
+
+        await go_unavailable(health_monitor, "light.office_lights")
+        task = health_monitor.outage["task"]
+        await health_monitor.on_state_updated("light.office_lights", "state", "unavailable", "on", {})
+        await asyncio.gather(task, return_exceptions = True)
+        return task
+
+    task = run(test())
+
+    assert task.cancelled()
+    assert health_monitor.outage is None
+    assert health_monitor.get_health()["unavailable"] == []
+    assert health_monitor.notify_users.call_count == 0
+
+def test_outage_after_alert_is_alerted(health_monitor: HealthMonitor):
+    async def test():
+        outage_window_over = set_up(health_monitor, {"light.office_lights": "on", "switch.office_fan": "on"})
+        await health_monitor.initialize()
+
+        await go_unavailable(health_monitor, "light.office_lights")
+        outage_window_over.set()
+        await health_monitor.outage["task"]
+        assert health_monitor.outage is None
+
+        await go_unavailable(health_monitor, "switch.office_fan")  # The window is over, so alerted while pinging.
+        assert health_monitor.outage is None
+
+    run(test())
+
+    messages = [call.args[0] for call in health_monitor.notify_users.call_args_list]
+    assert messages == ["light.office_lights is unavailable.", "switch.office_fan is unavailable."]
+    assert health_monitor.down == {"light.office_lights", "switch.office_fan"}
+
+def test_already_unavailable_at_startup(health_monitor: HealthMonitor):
+    async def test():
+        outage_window_over = set_up(health_monitor, {"light.office_lights": "unavailable", "switch.office_fan": "on"})
+        await health_monitor.initialize()
+        assert health_monitor.get_health()["unavailable"] == ["light.office_lights"]
+        await health_monitor.watched["light.office_lights"].task
+        outage_window_over.set()
+        await health_monitor.outage["task"]
+
+    run(test())
+
+    assert health_monitor.down == {"light.office_lights"}
+
+
+@automation_fixture(
+    HealthMonitor,
+    args={
+        "entities": ["light.office_lights", {"entity": "switch.office_fan", "ping": "button.office_fan_ping"}],
+        "backoff": 60,
+        "backoff_max": 900,
+        "jitter": 0.2
+    },
+    initialize=False
+)
+
+def health_monitor() -> HealthMonitor:
+    pass
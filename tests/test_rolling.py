@@ -0,0 +1,48 @@
+import math
+from apps.utils.rolling import RollingWindow
+
+def test_empty_window():
+    window = RollingWindow(5)
+
+    assert len(window) == 0
+    assert window.mean() is None
+    assert window.slope() == 0.0
+    assert window.ewma is None
+
+def test_slope_and_mean():
+    window = RollingWindow(10)
+    for minute in range(5):
+        window.add(1_700_000_000 + minute * 60, 70 + minute * 0.5)  # Half a degree a minute.
+
+    assert math.isclose(window.slope() * 60, 0.5)
+    assert math.isclose(window.mean(), 71)
+
+def test_oldest_samples_are_dropped():
+    window = RollingWindow(3)
+    for minute, temperature in enumerate([80, 80, 70, 71, 72]):
+        window.add(minute * 60, temperature)
+
+    assert len(window) == 3
+    assert math.isclose(window.mean(), 71)
+    assert math.isclose(window.slope() * 60, 1)
+
+def test_rebase_keeps_sums_precise():
+    window = RollingWindow(4)
+    for second in range(0, 10_000, 10):
+        window.add(1_700_000_000 + second, 70 - second / 1000)
+
+    # The window wrapped 250 times, so it's been rebased on its oldest sample each time.
+    assert window.origin == 1_700_000_000 + 9_960
+    assert math.isclose(window.slope(), -0.001, rel_tol = 1e-9)
+    assert math.isclose(window.mean(), 70 - 9.975, rel_tol = 1e-12)
+
+def test_ewma():
+    window = RollingWindow(10, ewma_seconds = 600)
+    window.add(0, 70)
+    assert window.ewma == 70
+
+    window.add(600, 80)  # One time constant later, the new sample has 1 - 1/e of the weight.
+    assert math.isclose(window.ewma, 70 + 10 * (1 - math.exp(-1)))
+
+    window.add(600, 60)  # No time passed, so it doesn't move.
+    assert math.isclose(window.ewma, 70 + 10 * (1 - math.exp(-1)))
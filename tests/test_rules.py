@@ -0,0 +1,113 @@
+from unittest import mock
+from appdaemon_testing.pytest import automation_fixture
+from apps.utils.rules import Cost, Rules
+from apps.utils.utils import Utils
+
+def get_rule(rules: Rules, name: str):
+    return next(rule for index_rules in rules.index.values() for rule in index_rules if rule.name == name)
+
+def test_conditions_are_ordered_cheapest_first(hass_driver, rules: Rules):
+    rule = get_rule(rules, "dining_room_lights_at_lunch")
+
+    assert [condition.cost for condition in rule.conditions] == [Cost.Memory, Cost.State, Cost.State]
+
+def test_trigger_fields_are_only_passed_when_set(hass_driver, rules: Rules):
+    listen_state = hass_driver.get_mock("listen_state")
+    registered = {call.args[1]: call.kwargs for call in listen_state.call_args_list}
+
+    assert set(registered["switch.office_lights"]) == {"new", "trigger"}
+    assert registered["switch.office_lights"]["new"] == "off"
+    assert set(registered["switch.office_fan"]) == {"new", "duration", "trigger"}
+    assert registered["switch.office_fan"]["duration"] == 30
+
+def test_conditions_pass(hass_driver, rules: Rules, utils: Utils):
+    with hass_driver.setup():
+        hass_driver.set_state("switch.office_lights", "on")
+        hass_driver.set_state("switch.dining_room_lights", "off")
+    rules.utils = utils
+    rules.presence = mock.Mock()
+    rules.presence.is_home.return_value = True
+
+    hass_driver.set_state("switch.office_lights", "off")
+
+    # The triggering entity's state is the state it changed to, so only the other entity is read.
+    get_state = hass_driver.get_mock("get_state")
+    assert {call.args[0] for call in get_state.call_args_list} == {"switch.dining_room_lights"}
+    call_service = hass_driver.get_mock("call_service")
+    call_service.assert_called_once_with("switch/turn_on", entity_id = ["switch.dining_room_lights"])
+
+def test_cheap_condition_fails(hass_driver, rules: Rules, utils: Utils):
+    with hass_driver.setup():
+        hass_driver.set_state("switch.office_lights", "on")
+        hass_driver.set_state("switch.dining_room_lights", "off")
+    rules.utils = utils
+    rules.presence = mock.Mock()
+    rules.presence.is_home.return_value = False
+
+    hass_driver.set_state("switch.office_lights", "off")
+
+    # Rejected by presence before any state is read.
+    get_state = hass_driver.get_mock("get_state")
+    assert get_state.call_count == 0
+    call_service = hass_driver.get_mock("call_service")
+    assert call_service.call_count == 0
+
+def test_state_condition_fails(hass_driver, rules: Rules, utils: Utils):
+    with hass_driver.setup():
+        hass_driver.set_state("switch.office_lights", "on")
+        hass_driver.set_state("switch.dining_room_lights", "on")
+    rules.utils = utils
+    rules.presence = mock.Mock()
+    rules.presence.is_home.return_value = True
+
+    hass_driver.set_state("switch.office_lights", "off")
+
+    call_service = hass_driver.get_mock("call_service")
+    assert call_service.call_count == 0
+
+def test_condition_without_state_is_skipped(hass_driver, rules: Rules):
+    assert all(rule.name != "fan_without_state" for index_rules in rules.index.values() for rule in index_rules)
+
+    log = hass_driver.get_mock("log")
+    errors = [call for call in log.call_args_list if call.kwargs.get("level") == "ERROR"]
+    assert len(errors) == 1
+    assert "fan_without_state" in errors[0].args[0]
+
+
+@automation_fixture(
+    Rules,
+    args={
+        "rules": [
+            {
+                "name": "dining_room_lights_at_lunch",
+                "triggers": [{"entity": "switch.office_lights", "new": "off"}],
+                "conditions": [
+                    {"entity": "switch.dining_room_lights", "not_state": "on"},
+                    {"person": "person.owen", "state": "home"},
+                    {"entity": "switch.office_lights", "state": "off"}
+                ],
+                "actions": [{"turn_on": "switch.dining_room_lights"}]
+            },
+            {
+                "name": "fan_off_after_a_while",
+                "triggers": [{"entity": "switch.office_fan", "new": "on", "duration": 30}],
+                "actions": [{"turn_off": "switch.office_fan"}]
+            },
+            {
+                "name": "fan_without_state",
+                "triggers": [{"entity": "switch.office_lights", "new": "on"}],
+                "conditions": [{"entity": "switch.office_fan"}],
+                "actions": [{"turn_on": "switch.office_fan"}]
+            }
+        ]
+    }
+)
+
+def rules() -> Rules:
+    pass
+
+
+@automation_fixture(Utils)
+
+def utils() -> Utils:
+    pass
@@ -0,0 +1,90 @@
+from unittest import mock
+from apps.utils.setpoints import SetpointWriter
+
+def create_writer(confirmed: float = 68) -> SetpointWriter:
+    app = mock.Mock()
+    app.run_in.return_value = "settle_timer"
+    return SetpointWriter(app, "climate.main", settle = 5, confirmed = confirmed)
+
+def test_listens_for_setpoint():
+    writer = create_writer()
+
+    writer.app.listen_state.assert_called_once_with(writer.on_setpoint_updated, "climate.main", attribute = "temperature")
+
+def test_requests_in_settle_window_are_coalesced():
+    writer = create_writer()
+
+    writer.request(64, "Away")
+    writer.request(70, "Home")
+    writer.app.run_in.assert_called_once_with(writer.on_settled, 5)
+    assert writer.app.call_service.call_count == 0
+
+    writer.on_settled({})
+
+    writer.app.call_service.assert_called_once_with("climate/set_temperature", entity_id = "climate.main", temperature = 70)
+    assert [(temperature, reason, why) for time, temperature, reason, why in writer.suppressed] == [(64, "Away", "replaced")]
+
+def test_unchanged_request_is_suppressed():
+    writer = create_writer()
+
+    writer.request(68, "schedule")
+
+    assert writer.app.run_in.call_count == 0
+    assert [(temperature, why) for time, temperature, reason, why in writer.suppressed] == [(68, "unchanged")]
+
+def test_settling_back_to_setpoint_is_suppressed():
+    writer = create_writer()
+
+    writer.request(70, "Home")
+    writer.request(68, "schedule")
+    writer.on_settled({})
+
+    assert writer.app.call_service.call_count == 0
+    assert [why for time, temperature, reason, why in writer.suppressed] == ["replaced", "unchanged"]
+
+def test_sent_setpoint_is_expected_until_confirmed():
+    writer = create_writer()
+
+    writer.request(70, "Home")
+    writer.on_settled({})
+    assert writer.get_expected() == 70
+
+    # Already sent, so not sent again while waiting for the thermostat.
+    writer.request(70, "Home")
+    assert writer.app.call_service.call_count == 1
+
+    writer.on_setpoint_updated("climate.main", "temperature", "68", "71", {})  # Changed by hand.
+    assert writer.get_expected() == 71
+    assert writer.sent is None
+
+def test_unconfirmed_write_is_forgotten():
+    writer = create_writer()
+
+    writer.request(70, "Home")
+    writer.on_settled({})
+    writer.app.run_in.assert_called_with(writer.on_confirm_timeout, 120)
+
+    # The thermostat never reports the write, so once it times out the setpoint can be sent again.
+    writer.on_confirm_timeout({})
+    assert writer.get_expected() == 68
+    writer.request(70, "Home")
+    writer.on_settled({})
+    assert writer.app.call_service.call_count == 2
+
+def test_confirmed_write_cancels_timeout():
+    writer = create_writer()
+    writer.app.run_in.side_effect = ["settle_timer", "confirm_timer"]
+
+    writer.request(70, "Home")
+    writer.on_settled({})
+    writer.on_setpoint_updated("climate.main", "temperature", "68", "70", {})
+
+    writer.app.cancel_timer.assert_called_once_with("confirm_timer")
+    assert writer.get_expected() == 70
+
+def test_unparseable_setpoint_is_ignored():
+    writer = create_writer()
+
+    writer.on_setpoint_updated("climate.main", "temperature", "68", None, {})
+
+    assert writer.get_expected() == 68
@@ -0,0 +1,74 @@
+from appdaemon_testing.pytest import automation_fixture
+from apps.utils.utils import Utils
+
+def test_snapshot_reads_only_requested_entities(hass_driver, utils: Utils):
+    with hass_driver.setup():
+        hass_driver.set_state("light.office_lights", "on")
+        hass_driver.set_state("switch.office_fan", "off")
+
+    with utils.snapshot("light.office_lights"):
+        assert utils.is_entity_on("light.office_lights")
+        assert utils.is_entity_on("light.office_lights")
+
+    get_state = hass_driver.get_mock("get_state")
+    get_state.assert_called_once_with("light.office_lights", attribute = "all")
+
+def test_nested_snapshot(hass_driver, utils: Utils):
+    with hass_driver.setup():
+        hass_driver.set_state("light.office_lights", "on")
+        hass_driver.set_state("switch.office_fan", "off")
+
+    get_state = hass_driver.get_mock("get_state")
+    with utils.snapshot("light.office_lights"):
+        # Only the entity the outer snapshot doesn't have is read.
+        with utils.snapshot("light.office_lights", "switch.office_fan"):
+            assert not utils.is_entity_on("switch.office_fan")
+        assert get_state.call_count == 2
+        get_state.assert_called_with("switch.office_fan", attribute = "all")
+
+        # Covered by the outer snapshot, so nothing is read.
+        with utils.snapshot("light.office_lights"):
+            assert utils.is_entity_on("light.office_lights")
+        assert get_state.call_count == 2
+
+        # The inner snapshot is gone once it exits.
+        utils.is_entity_on("switch.office_fan")
+        assert get_state.call_count == 3
+
+def test_batch_merges_calls(hass_driver, utils: Utils):
+    with hass_driver.setup():
+        hass_driver.set_state("switch.allison_living_room_lamp", "off")
+        hass_driver.set_state("switch.owen_living_room_lamp", "off")
+        hass_driver.set_state("switch.office_fan", "on")
+
+    with utils.batch() as batch:
+        batch.turn_on("switch.allison_living_room_lamp")
+        batch.turn_on("switch.owen_living_room_lamp")
+        batch.turn_on("switch.office_fan")  # Already on, so dropped.
+
+    call_service = hass_driver.get_mock("call_service")
+    call_service.assert_called_once_with(
+        "switch/turn_on",
+        entity_id = ["switch.allison_living_room_lamp", "switch.owen_living_room_lamp"]
+    )
+    assert batch.dispatched == ["switch.allison_living_room_lamp", "switch.owen_living_room_lamp"]
+
+def test_batch_without_changes(hass_driver, utils: Utils):
+    with hass_driver.setup():
+        hass_driver.set_state("switch.office_fan", "on")
+
+    with utils.batch() as batch:
+        batch.turn_on("switch.office_fan")
+        batch.set_state("switch.office_fan", "on")
+
+    call_service = hass_driver.get_mock("call_service")
+    set_state = hass_driver.get_mock("set_state")
+    assert call_service.call_count == 0
+    assert set_state.call_count == 0
+    assert batch.dispatched == []
+
+
+@automation_fixture(Utils)
+
+def utils() -> Utils:
+    pass